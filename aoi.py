@@ -0,0 +1,287 @@
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+
+"""
+-----------------------------------------------------------------------------------------
+AOI-Engine:
+Definition of Areas of Interest (AOI) per stimulus, hit-testing of fixations and AOI metrics
+"""
+# AOI file layout (JSON):
+# {"Antwerpen_S1": {"color": [{"name": "Legend", "type": "rect", "x0": 0, "y0": 0, "x1": 300, "y1": 200},
+#                             {"name": "Centraal", "type": "polygon", "points": [[410, 380], [520, 380], [470, 460]]}],
+#                   "grey": [...]}}
+aoi_path = 'assets/aoi_definitions.json'
+
+
+def load_aoi_file(path=aoi_path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        raw = json.load(file)
+    return {(city_map, description): [normalize_aoi(aoi) for aoi in aois]
+            for city_map, variants in raw.items()
+            for description, aois in variants.items()}
+
+
+def save_aoi_file(definitions, path=aoi_path):
+    # Written to a temporary file and renamed, so a crash while saving never leaves a truncated AOI file
+    raw = {}
+    for (city_map, description), aois in sorted(definitions.items()):
+        raw.setdefault(city_map, {})[description] = aois
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(raw, file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def normalize_aoi(aoi):
+    # Rectangles are kept as bounds (fast path), everything else as closed polygon:
+    if aoi.get('type', 'rect') == 'rect':
+        x0, x1 = sorted([float(aoi['x0']), float(aoi['x1'])])
+        y0, y1 = sorted([float(aoi['y0']), float(aoi['y1'])])
+        return {'name': aoi.get('name'), 'type': 'rect', 'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1}
+    points = [[float(x), float(y)] for x, y in aoi['points']]
+    return {'name': aoi.get('name'), 'type': 'polygon', 'points': points}
+
+
+# Conversion between plotly shapes (drawn on the gaze plot) and AOIs:
+def shape_to_aoi(shape, name=None):
+    name = name or shape.get('name')
+    if shape.get('type') == 'rect':
+        return normalize_aoi({'name': name, 'type': 'rect',
+                              'x0': shape['x0'], 'y0': shape['y0'], 'x1': shape['x1'], 'y1': shape['y1']})
+    if shape.get('type') == 'path':
+        numbers = [float(n) for n in re.findall(r'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?', shape['path'])]
+        points = list(zip(numbers[0::2], numbers[1::2]))
+        return normalize_aoi({'name': name, 'type': 'polygon', 'points': points})
+    return None
+
+
+def aoi_to_shape(aoi, line_color='red'):
+    shape = dict(name=aoi['name'], editable=True, xref='x', yref='y',
+                 line=dict(color=line_color, width=2), fillcolor='rgba(255, 0, 0, 0.1)')
+    if aoi['type'] == 'rect':
+        shape.update(type='rect', x0=aoi['x0'], y0=aoi['y0'], x1=aoi['x1'], y1=aoi['y1'])
+    else:
+        path = 'M' + 'L'.join(f'{x},{y}' for x, y in aoi['points']) + 'Z'
+        shape.update(type='path', path=path)
+    return shape
+
+
+def points_in_aoi(x, y, aoi):
+    # Vectorized hit-test of all points against one AOI (even-odd ray casting for polygons):
+    if aoi['type'] == 'rect':
+        return (x >= aoi['x0']) & (x <= aoi['x1']) & (y >= aoi['y0']) & (y <= aoi['y1'])
+
+    polygon = np.asarray(aoi['points'], dtype=float)
+    inside = np.zeros(len(x), dtype=bool)
+    if len(polygon) < 3:
+        return inside
+    xi, yi = polygon[:, 0], polygon[:, 1]
+    xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in range(len(polygon)):
+            crosses = (yi[k] > y) != (yj[k] > y)
+            x_cross = (xj[k] - xi[k]) * (y - yi[k]) / (yj[k] - yi[k]) + xi[k]
+            inside ^= crosses & (x < x_cross)
+    return inside
+
+
+class AOIEngine:
+    # Keeps the AOI definitions and the cached hit-matrix (fixations x AOIs) per stimulus.
+    # Editing one AOI only recomputes its own column of the affected stimulus.
+    def __init__(self, dataset, definitions=None, x_col='MappedFixationPointX', y_col='MappedFixationPointY'):
+        self.dataset = dataset
+        self.x_col = x_col
+        self.y_col = y_col
+        self.definitions = {key: list(aois) for key, aois in (definitions or {}).items()}
+        self.version = 0
+        self._cache = {}
+
+    def derive(self, dataset, stimuli=None):
+        # Engine for an updated dataset (the engine itself is left unchanged for readers of the old data).
+        # The definitions dict is shared (edits replace it, see below); cache entries are carried over except for the
+        # given stimuli (None = all).
+        engine = AOIEngine(dataset, x_col=self.x_col, y_col=self.y_col)
+        engine.definitions = self.definitions
+        engine.version = self.version + 1
+        if stimuli is not None:
+            engine._cache = {key: entry for key, entry in self._cache.items() if key not in stimuli}
+        return engine
+
+    def copy(self):
+        # Engine of the same data and AOIs to be edited (see SnapshotStore.edit), with its own cache dict
+        engine = AOIEngine(self.dataset, x_col=self.x_col, y_col=self.y_col)
+        engine.definitions = self.definitions
+        engine.version = self.version
+        engine._cache = dict(self._cache)
+        return engine
+
+    def aois(self, city_map, description):
+        return self.definitions.get((city_map, description), [])
+
+    def _entry(self, city_map, description):
+        key = (city_map, description)
+        entry = self._cache.get(key)
+        if entry is None:
+            # Fixations of the stimulus ordered by user and FixationIndex (see Dataset.stimulus_arrays)
+            arrays = self.dataset.stimulus_arrays(city_map, description, [self.x_col, self.y_col])
+            x = np.asarray(arrays[self.x_col], dtype=float)
+            y = np.asarray(arrays[self.y_col], dtype=float)
+            hits = np.zeros((len(x), len(self.aois(city_map, description))), dtype=bool)
+            for k, aoi in enumerate(self.aois(city_map, description)):
+                hits[:, k] = points_in_aoi(x, y, aoi)
+            entry = {'x': x, 'y': y, 'hits': hits, 'codes': None}
+            self._cache[key] = entry
+        return entry
+
+    # Edits are copy-on-write: the definitions dict, the AOI list, the cache dict and the cache entry of the stimulus
+    # are replaced, never changed in place, so engines sharing them (see derive and copy) keep a consistent state.
+    def set_aois(self, city_map, description, aois):
+        key = (city_map, description)
+        self.definitions = {**self.definitions, key: [normalize_aoi(aoi) for aoi in aois]}
+        self._cache = {other: entry for other, entry in self._cache.items() if other != key}
+        self.version += 1
+
+    def update_aoi(self, city_map, description, position, aoi):
+        # Incremental edit: re-test only the edited (or appended) AOI of this stimulus
+        aoi = normalize_aoi(aoi)
+        key = (city_map, description)
+        aois = list(self.definitions.get(key, []))
+        entry = self._cache.get(key)
+        hits = entry['hits'] if entry is not None else None
+        if position >= len(aois):
+            position = len(aois)
+            aois.append(aoi)
+            if entry is not None:
+                hits = np.column_stack([hits, np.zeros(len(entry['x']), dtype=bool)])
+        else:
+            aois[position] = aoi
+            if entry is not None:
+                hits = hits.copy()
+        self.definitions = {**self.definitions, key: aois}
+        if entry is not None:
+            hits[:, position] = points_in_aoi(entry['x'], entry['y'], aoi)
+            self._cache = {**self._cache, key: {'x': entry['x'], 'y': entry['y'], 'hits': hits, 'codes': None}}
+        self.version += 1
+
+    def remove_aoi(self, city_map, description, position):
+        key = (city_map, description)
+        aois = self.definitions.get(key, [])
+        if position < len(aois):
+            self.definitions = {**self.definitions, key: aois[:position] + aois[position + 1:]}
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache = {**self._cache, key: {'x': entry['x'], 'y': entry['y'],
+                                                    'hits': np.delete(entry['hits'], position, axis=1), 'codes': None}}
+            self.version += 1
+
+    def assignment(self, city_map, description):
+        # Returns the AOI code per fixation of the stimulus, in the order of Dataset.stimulus_arrays (-1 = no AOI).
+        # Overlapping AOIs are resolved by definition order (first AOI wins).
+        entry = self._entry(city_map, description)
+        if entry['codes'] is None:
+            hits = entry['hits']
+            if hits.shape[1]:
+                entry['codes'] = np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+            else:
+                entry['codes'] = np.full(len(entry['x']), -1)
+        return entry['codes']
+
+    def metrics(self, city_map, description):
+        # Batch AOI metrics per AOI, averaged over all sessions (users) of the stimulus
+        aois = self.aois(city_map, description)
+        columns = ['AOI', 'description', 'DwellTime', 'FixationCount', 'TimeToFirstFixation', 'Revisits', 'Sessions']
+        codes = self.assignment(city_map, description)
+        if not aois or not len(codes):
+            return pd.DataFrame(columns=columns)
+
+        arrays = self.dataset.stimulus_arrays(city_map, description, ['user', 'FixationDuration', 'Timestamp'])
+        users = arrays['user']
+        durations = np.asarray(arrays['FixationDuration'], dtype=float) / 1000
+        timestamps = np.asarray(arrays['Timestamp'], dtype=float) / 1000
+        session_codes, session_index = np.unique(users, return_inverse=True)
+        n_sessions = len(session_codes)
+
+        # Start time of each fixation within its session (rows are ordered by user and FixationIndex): recording time
+        # since the first fixation of the session, so the saccades between the fixations count as well. Fixations
+        # without Timestamp fall back to the summed durations of the previous fixations.
+        first_rows = np.r_[0, np.flatnonzero(np.diff(session_index)) + 1]
+        cumulative = np.cumsum(durations)
+        duration_time = cumulative - durations - np.r_[0, cumulative][first_rows][session_index]
+        start_time = timestamps - timestamps[first_rows][session_index]
+        start_time = np.where(np.isnan(start_time), duration_time, start_time)
+
+        # A visit starts when the AOI differs from the previous fixation of the same session:
+        new_session = np.r_[True, session_index[1:] != session_index[:-1]]
+        visit_start = new_session | np.r_[True, codes[1:] != codes[:-1]]
+
+        in_aoi = codes >= 0
+        key = session_index[in_aoi] * len(aois) + codes[in_aoi]
+        size = n_sessions * len(aois)
+        dwell = np.bincount(key, weights=durations[in_aoi], minlength=size).reshape(n_sessions, len(aois))
+        count = np.bincount(key, minlength=size).reshape(n_sessions, len(aois))
+        visits = np.bincount(key, weights=visit_start[in_aoi], minlength=size).reshape(n_sessions, len(aois))
+        first = np.full(size, np.inf)
+        np.minimum.at(first, key, start_time[in_aoi])
+        first = first.reshape(n_sessions, len(aois))
+
+        hit = count > 0
+        with np.errstate(invalid='ignore'):
+            result = pd.DataFrame({
+                'AOI': [aoi['name'] or f'AOI {k + 1}' for k, aoi in enumerate(aois)],
+                'description': description,
+                'DwellTime': dwell.mean(axis=0),
+                'FixationCount': count.mean(axis=0),
+                'TimeToFirstFixation': np.where(hit, first, 0).sum(axis=0) / hit.sum(axis=0),
+                'Revisits': np.where(hit, visits - 1, 0).sum(axis=0) / hit.sum(axis=0),
+                'Sessions': hit.sum(axis=0)})
+        return result[columns]
+
+    def batch_metrics(self, city_maps=None):
+        # AOI metrics for color vs. grey of all (or the given) City Maps in one table
+        keys = sorted(self.definitions) if city_maps is None else \
+            [key for key in sorted(self.definitions) if key[0] in city_maps]
+        tables = [self.metrics(city_map, description).assign(CityMap=city_map) for city_map, description in keys]
+        tables = [table for table in tables if not table.empty]
+        if not tables:
+            return pd.DataFrame(columns=['CityMap', 'AOI', 'description', 'DwellTime', 'FixationCount',
+                                         'TimeToFirstFixation', 'Revisits', 'Sessions'])
+        combined = pd.concat(tables, ignore_index=True)
+        return combined[['CityMap'] + [c for c in combined.columns if c != 'CityMap']]
+
+    def apply_shapes(self, city_map, description, shapes):
+        # Sync with the full shape list of a gaze plot; only new or changed AOIs are re-tested
+        current = self.aois(city_map, description)
+        drawn = [shape_to_aoi(shape, name=shape.get('name') or f'AOI {k + 1}') for k, shape in enumerate(shapes)]
+        drawn = [aoi for aoi in drawn if aoi is not None]
+        for position in range(len(current) - 1, len(drawn) - 1, -1):
+            self.remove_aoi(city_map, description, position)
+        for position, aoi in enumerate(drawn):
+            if position >= len(current) or current[position] != aoi:
+                self.update_aoi(city_map, description, position, aoi)
+
+    def apply_relayout(self, city_map, description, relayout_data):
+        # Handles the relayoutData of a gaze plot: a full shape list (draw/erase) or single shape edits
+        if not relayout_data:
+            return False
+        version = self.version
+        if 'shapes' in relayout_data:
+            self.apply_shapes(city_map, description, relayout_data['shapes'])
+            return self.version != version
+
+        edits = {}
+        for key, value in relayout_data.items():
+            match = re.match(r'shapes\[(\d+)\]\.(\w+)', key)
+            if match:
+                edits.setdefault(int(match.group(1)), {})[match.group(2)] = value
+        aois = self.aois(city_map, description)
+        for position, changes in edits.items():
+            if position < len(aois):
+                shape = aoi_to_shape(aois[position])
+                shape.update(changes)
+                self.update_aoi(city_map, description, position, shape_to_aoi(shape))
+        return self.version != version
@@ -1,11 +1,29 @@
-from dash import Dash, dash_table, dcc, html, Input, Output, State, callback_context
+from dash import Dash, dash_table, dcc, html, Input, Output, State, callback_context, ClientsideFunction, Patch, \
+    no_update
 from dash_iconify import DashIconify
-from PIL import Image
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import glob
-import plotly.graph_objects as go
+from flask import request, jsonify, abort, send_file
+import copy
+import hmac
+import os
+from catalog import StudyCatalog
+from dataset import (PartitionCache, kpi_values, select_density, duration_schemes, duration_edges, duration_labels,
+                     duration_categories, select_sessions, session_rows)
+from ingest import incoming_dir, partition_dir, saccade_feature_columns
+from quality import quality_values, visible
+from aoi import aoi_to_shape, save_aoi_file
+from client_bundle import stimulus_bundle
+from figure_encoding import binary_figures, encode_figure
+from compression import enable_compression
+from callback_fanout import count_callbacks
+from figure_builder import (layout, axis, title, message_figure, layout_image, stimulus_layout, gaze_traces,
+                            density_trace, box_trace, histogram_trace, matrix_trace, colorbar)
+from scanpath_similarity import similarity_cache_dir, similarity_methods, mean_similarity, cluster_order
+from stimulus_registry import frame_background, reference_image
+from tile_pyramid import TilePyramids, visible_tiles
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, '/assets/custom.css'])
 
@@ -16,26 +34,60 @@ Data Import and Preparation
 """
 # Data reading:
 data_path = 'assets/all_fixation_data_cleaned_up.csv'
-df = pd.read_csv(data_path, sep=';')
-
-# Add "Task Duration in sec" (per User and Stimulus) to df:
-task_duration = df.groupby(['user', 'CityMap', 'description'])['FixationDuration'].sum().reset_index()
-task_duration['FixationDuration'] = task_duration['FixationDuration'] / 1000
-df = pd.merge(df, task_duration, on=['user', 'CityMap', 'description'], suffixes=('', '_aggregated'))
-
-# Add "Average Fixation Duration in sec" (per User and Stimulus) to df:
-avg_fix_duration = df.groupby(['user', 'CityMap', 'description'])['FixationDuration'].mean().reset_index()
-avg_fix_duration['FixationDuration'] = avg_fix_duration['FixationDuration'] / 1000
-df = pd.merge(df, avg_fix_duration, on=['user', 'CityMap', 'description'], suffixes=('', '_avg'))
-
-# Add Category for Task Duration:
-df['TaskDurationCategory'] = pd.cut(df['FixationDuration_aggregated'], bins=[0, 10, float('inf')],
-                                    labels=['<10 sec.', '>=10 sec.'])
-#print('task_duration:')
-#print(df['FixationDuration_aggregated'])
-#print(df['FixationDuration_aggregated'].min)
-#print(df['FixationDuration_aggregated'].max)
-#print(df)
+
+# Memory-budgeted mode for small hosts (e.g. DASHBOARD_MEMORY_BUDGET_MB=400): the fixations stay in one partition
+# file per stimulus and are loaded when a City Map is selected; least recently used partitions are evicted
+# while the memory (RSS) of the process exceeds the budget.
+memory_budget_mb = os.environ.get('DASHBOARD_MEMORY_BUDGET_MB')
+partition_cache = PartitionCache(int(memory_budget_mb) * 2 ** 20) if memory_budget_mb else None
+
+# Clientside filter mode (DASHBOARD_CLIENTSIDE_FILTERS=1): on city selection the fixations and density grids of the
+# stimulus are sent once to the browser; user and task duration filters of the gaze plots and heat maps then run in
+# clientside callbacks (assets/clientside_filters.js) without a request to the server.
+clientside_filters = os.environ.get('DASHBOARD_CLIENTSIDE_FILTERS', '0') == '1'
+
+# Study catalog: the City Map study of this repository plus one manifest per further study in 'studies'.
+# Per study, on first access: stimulus images (path and size), calibration of the fixation coordinates to the
+# image size, common coordinate frame per City (S2 fixations mapped into the S1 frame) and the prepared dataset
+# (enriched df, session table, partition index, KPI store, density grids) including the sessions appended earlier.
+# Studies not used for DASHBOARD_STUDY_IDLE_MINUTES are evicted.
+catalog = StudyCatalog.load({'name': 'City Maps (FHGR)', 'data_path': data_path, 'assets_dir': 'assets',
+                             'incoming_dir': incoming_dir, 'partition_dir': partition_dir,
+                             'similarity_cache_dir': similarity_cache_dir},
+                            partition_cache=partition_cache,
+                            idle_timeout=float(os.environ.get('DASHBOARD_STUDY_IDLE_MINUTES', 30)) * 60)
+
+# Deep-zoom tiles of the stimulus images (cache/tiles, by content hash): built in a background process pool on the
+# first view of a stimulus; until then the gaze plots and heat maps show the full image.
+tile_pyramids = TilePyramids()
+
+# Published snapshot of the data and its caches (AOI hit-tests, transitions, similarity matrices) per study.
+# Every callback reads one snapshot per request:
+def study_snapshot(study_id):
+    return catalog.store(study_id).current()
+
+# Server callbacks of the filtered gaze plots and heat maps; in the clientside filter mode they are not registered
+# (the functions still build the base figures of the data bundles, see 4.15)
+def server_filter_callback(*args, **kwargs):
+    if clientside_filters:
+        return lambda function: function
+    return app.callback(*args, **kwargs)
+
+# Saccade features (precomputed per fixation when the data is prepared) for the correlation view (y-axis)
+# and the saccade distribution view:
+correlation_features = ['SaccadeLength', 'SaccadeAmplitude', 'SaccadeVelocity', 'InterFixationTime']
+distribution_features = ['SaccadeAmplitude', 'SaccadeAngle', 'InterFixationTime', 'SaccadeVelocity']
+
+def feature_label(feature):
+    name, unit = saccade_feature_columns.get(feature, ('Saccade Length', None))
+    return f'{name} [{unit}]' if unit else name
+
+# Custom task duration edges in sec. as typed in the correlation view (e.g. '5, 10, 20'); invalid input is ignored
+def parse_duration_edges(text):
+    try:
+        return [float(value) for value in str(text or '').replace(';', ',').split(',') if value.strip()]
+    except ValueError:
+        return []
 
 """
 -----------------------------------------------------------------------------------------
@@ -58,7 +110,17 @@ app.layout = html.Div([
             clearable=False,
             className='theme_dropdown',
         ),
+        # Study selector (only shown if the catalog contains more than one study):
+        dcc.Dropdown(
+            id='study_dropdown',
+            options=catalog.options(),
+            value=catalog.default_id,
+            clearable=False,
+            className='theme_dropdown',
+            style={'display': 'none'} if len(catalog) < 2 else None,
+        ),
         dcc.Store(id='current_theme', data='light'),
+        dcc.Store(id='aoi_store', data=0),
     ], className='first_container'),
 
     html.Div([
@@ -76,9 +138,17 @@ app.layout = html.Div([
                         html.Button('Heat Map', id='heat_map', n_clicks=0, className='viz_button'),
                         html.Button('Gazeplot', id='gaze_plot', n_clicks=0, className='viz_button'),
                         html.Button('Correlation', id='scatter_plot', n_clicks=0, className='viz_button'),
+                        html.Button('AOI', id='aoi_view', n_clicks=0, className='viz_button'),
+                        html.Button('Similarity', id='similarity_view', n_clicks=0, className='viz_button'),
+                        html.Button('Saccades', id='saccade_view', n_clicks=0, className='viz_button'),
                     ], id='button_viz_type', className='button_viz_type'),
                     dcc.Store(id='active-button', data='default_viz'),
-                    html.Div(id='output-section'),
+                    html.Div([
+                        dcc.Dropdown(id='similarity_method', value='grid', clearable=False),
+                        dcc.Dropdown(id='saccade_feature', value='SaccadeLength', clearable=False),
+                        dcc.Dropdown(id='duration_scheme', value='threshold', clearable=False),
+                        dcc.Input(id='duration_edges', type='text', value='')
+                    ], id='output-section'),
                 ], className='third_container'),
             ], className='input_container'),
 
@@ -89,7 +159,7 @@ app.layout = html.Div([
                         'Choose a City to explore in detail']),
                     dcc.Dropdown(
                         id='city_dropdown',
-                        options=[{'label': city, 'value': city} for city in sorted(df['CityMap'].unique())],
+                        options=[{'label': city, 'value': city} for city in sorted(study_snapshot(catalog.default_id).sessions['CityMap'].unique())],
                         placeholder='Select a City Map...',
                         value=None,
                         clearable=True,
@@ -119,11 +189,18 @@ app.layout = html.Div([
                     id='city_image_color'),
                 dcc.Graph(id='gaze_plot_color'),
                 dcc.Graph(id='heat_map_color'),
+                # Data bundle of the selected stimulus (clientside filter mode only, mounted with the views of the
+                # gaze plots and heat maps):
+                dcc.Store(id='filter_bundle_color'),
                 dcc.Dropdown(id='dropdown_user_color', multi=True),
                 dcc.RangeSlider(id='range_slider_color', min=1, max=50, step=1, value=[1, 50],
                                 marks={i: f'{i}' for i in range(0, 51, 5)}),
                 dcc.Graph(id='box_task_duration'),
-                dcc.Graph(id='scatter_correlation_color')
+                dcc.Graph(id='scatter_correlation_color'),
+                html.Div(id='aoi_table_color'),
+                dcc.Graph(id='transition_matrix_color'),
+                dcc.Graph(id='similarity_matrix_color'),
+                dcc.Graph(id='saccade_distribution_color')
             ], id='color_plot_area', className='fifth_container'),
         ], className='second_column'),
 
@@ -135,11 +212,18 @@ app.layout = html.Div([
                     id='city_image_grey'),
                 dcc.Graph(id='gaze_plot_grey'),
                 dcc.Graph(id='heat_map_grey'),
+                # Data bundle of the selected stimulus (clientside filter mode only, mounted with the views of the
+                # gaze plots and heat maps):
+                dcc.Store(id='filter_bundle_grey'),
                 dcc.Dropdown(id='dropdown_user_grey', multi=True),
                 dcc.RangeSlider(id='range_slider_grey', min=1, max=50, step=1, value=[1, 50],
                                 marks = {i: f'{i}' for i in range(0, 51, 5)}),
                 dcc.Graph(id='box_avg_fix_duration'),
-                dcc.Graph(id='scatter_correlation_grey')
+                dcc.Graph(id='scatter_correlation_grey'),
+                html.Div(id='aoi_table_grey'),
+                dcc.Graph(id='transition_matrix_grey'),
+                dcc.Graph(id='similarity_matrix_grey'),
+                dcc.Graph(id='saccade_distribution_grey')
             ],  id='grey_plot_area', className='sixth_container'),
         ], className='third_column'),
     ], className='dash_container'),
@@ -156,29 +240,43 @@ Definition of Interaction Elements
      Output('heat_map', 'className'),
      Output('gaze_plot', 'className'),
      Output('scatter_plot', 'className'),
+     Output('aoi_view', 'className'),
+     Output('similarity_view', 'className'),
+     Output('saccade_view', 'className'),
      Output('active-button', 'data')],
     [Input('default_viz', 'n_clicks'),
      Input('heat_map', 'n_clicks'),
      Input('gaze_plot', 'n_clicks'),
-     Input('scatter_plot', 'n_clicks')],
-    [State('active-button', 'data')]
+     Input('scatter_plot', 'n_clicks'),
+     Input('aoi_view', 'n_clicks'),
+     Input('similarity_view', 'n_clicks'),
+     Input('saccade_view', 'n_clicks')],
+    [State('active-button', 'data')],
+    prevent_initial_call=True
 )
 
-def update_active_button(btn1, btn2, btn3, btn4, active_btn):
+def update_active_button(btn1, btn2, btn3, btn4, btn5, btn6, btn7, active_btn):
     ctx = callback_context
     button_id = ctx.triggered[0]['prop_id'].split('.')[0] if ctx.triggered else 'default_viz'
+    # A click on the active button does not rebuild the plot area:
+    if button_id == active_btn:
+        return [no_update] * 8
     return [
         'viz_button active' if button_id == 'default_viz' else 'viz_button',
         'viz_button active' if button_id == 'heat_map' else 'viz_button',
         'viz_button active' if button_id == 'gaze_plot' else 'viz_button',
         'viz_button active' if button_id == 'scatter_plot' else 'viz_button',
+        'viz_button active' if button_id == 'aoi_view' else 'viz_button',
+        'viz_button active' if button_id == 'similarity_view' else 'viz_button',
+        'viz_button active' if button_id == 'saccade_view' else 'viz_button',
         button_id
     ]
 
 # 3.2 - Update Output Section and Plot Area based on active button, part I:
 @app.callback(
     Output('output-section', 'children'),
-    Input('active-button', 'data')
+    Input('active-button', 'data'),
+    prevent_initial_call=True
 )
 def update_output(active_button):
     if active_button == 'default_viz':
@@ -188,35 +286,115 @@ def update_output(active_button):
     elif active_button == 'gaze_plot':
         return ''
     elif active_button == 'scatter_plot':
-        return ''
+        # Y-axis feature and task duration categories (scheme or custom edges in sec.)
+        return [
+            dcc.Dropdown(
+                id='saccade_feature',
+                options=[{'label': feature_label(feature), 'value': feature} for feature in correlation_features],
+                value='SaccadeLength',
+                clearable=False,
+                className='dropdown'),
+            dcc.Dropdown(
+                id='duration_scheme',
+                options=[{'label': label, 'value': scheme} for scheme, (label, _, _) in duration_schemes.items()],
+                value='threshold',
+                clearable=False,
+                className='dropdown'),
+            dcc.Input(
+                id='duration_edges',
+                type='text',
+                value='',
+                debounce=True,
+                placeholder='Custom Task Duration Categories, e.g. 5, 10, 20 (sec.)',
+                className='dropdown')]
+    elif active_button == 'saccade_view':
+        return dcc.Dropdown(
+            id='saccade_feature',
+            options=[{'label': feature_label(feature), 'value': feature} for feature in distribution_features],
+            value='SaccadeAmplitude',
+            clearable=False,
+            className='dropdown')
+    elif active_button == 'similarity_view':
+        return dcc.Dropdown(
+            id='similarity_method',
+            options=[{'label': label, 'value': method} for method, label in similarity_methods.items()],
+            value='grid',
+            clearable=False,
+            className='dropdown')
     else:
         return ''
 
-# 3.3 - Update Output Section and Plot Area based on active button, part II:
+# Data bundle of the gaze plots and heat maps in the clientside filter mode: mounted with these views only, so the
+# bundles are not built while another view is shown (see 3.3.1 and 4.15)
+def filter_bundle_store(description):
+    return [dcc.Store(id=f'filter_bundle_{description}')] if clientside_filters else []
+
+# 3.3 - Update Output Section and Plot Area based on active button, part II (rebuilt on a change of the view only;
+# City Map and study set the initial slider range, later changes are applied by 3.5.3):
 @app.callback(
     [Output('color_plot_area', 'children'),
      Output('grey_plot_area', 'children')],
-    [Input('active-button', 'data'),
-     Input('city_dropdown', 'value')]
+    [Input('active-button', 'data')],
+    [State('city_dropdown', 'value'),
+     State('study_dropdown', 'value')],
+    prevent_initial_call=True
 )
-def update_plot_area(visualization_type, selected_city):
+def update_plot_area(visualization_type, selected_city, study_id):
+    snapshot = study_snapshot(study_id)
     if visualization_type in ['gaze_plot', 'heat_map']:
-        min_val_color, max_val_color, value_range_color, marks_color = update_range_slider_color(selected_city)
-        min_val_grey, max_val_grey, value_range_grey, marks_grey = update_range_slider_grey(selected_city)
+        min_val_color, max_val_color, value_range_color, marks_color = update_range_slider_color(snapshot, selected_city)
+        min_val_grey, max_val_grey, value_range_grey, marks_grey = update_range_slider_grey(snapshot, selected_city)
 
         return [
             dcc.Graph(id=f'{visualization_type}_color'),
+            *filter_bundle_store('color'),
             dcc.Dropdown(id='dropdown_user_color', value=None, multi=True, placeholder='filter by User(s)...'),
             html.P('filter by Task Duration:'),
             dcc.RangeSlider(id='range_slider_color',
                             min=min_val_color, max=max_val_color, value=value_range_color, marks=marks_color)
         ], [
             dcc.Graph(id=f'{visualization_type}_grey'),
+            *filter_bundle_store('grey'),
             dcc.Dropdown(id='dropdown_user_grey', value=None, multi=True, placeholder='filter by User(s)...'),
             html.P('filter by Task Duration:'),
             dcc.RangeSlider(id='range_slider_grey',
                             min=min_val_grey, max=max_val_grey, value=value_range_grey, marks=marks_grey)
         ]
+    elif visualization_type == 'aoi_view':
+        min_val_color, max_val_color, value_range_color, marks_color = update_range_slider_color(snapshot, selected_city)
+        min_val_grey, max_val_grey, value_range_grey, marks_grey = update_range_slider_grey(snapshot, selected_city)
+        # AOIs are drawn (rectangle or closed path) and edited directly on the gaze plots:
+        draw_config = {'modeBarButtonsToAdd': ['drawrect', 'drawclosedpath', 'eraseshape']}
+
+        return [
+            dcc.Graph(id='gaze_plot_color', config=draw_config),
+            *filter_bundle_store('color'),
+            dcc.Dropdown(id='dropdown_user_color', value=None, multi=True, placeholder='filter by User(s)...'),
+            dcc.RangeSlider(id='range_slider_color',
+                            min=min_val_color, max=max_val_color, value=value_range_color, marks=marks_color),
+            html.Div(id='aoi_table_color'),
+            dcc.Graph(id='transition_matrix_color')
+        ], [
+            dcc.Graph(id='gaze_plot_grey', config=draw_config),
+            *filter_bundle_store('grey'),
+            dcc.Dropdown(id='dropdown_user_grey', value=None, multi=True, placeholder='filter by User(s)...'),
+            dcc.RangeSlider(id='range_slider_grey',
+                            min=min_val_grey, max=max_val_grey, value=value_range_grey, marks=marks_grey),
+            html.Div(id='aoi_table_grey'),
+            dcc.Graph(id='transition_matrix_grey')
+        ]
+    elif visualization_type == 'similarity_view':
+        return [
+            dcc.Graph(id='similarity_matrix_color')
+        ], [
+            dcc.Graph(id='similarity_matrix_grey')
+        ]
+    elif visualization_type == 'saccade_view':
+        return [
+            dcc.Graph(id='saccade_distribution_color')
+        ], [
+            dcc.Graph(id='saccade_distribution_grey')
+        ]
     elif visualization_type == 'scatter_plot':
         return [
             dcc.Graph(id='scatter_correlation_color')
@@ -230,17 +408,30 @@ def update_plot_area(visualization_type, selected_city):
             dcc.Graph(id='box_avg_fix_duration')
         ]
 
+# 3.3.1 - Visibility gating: the layout of Section 2 (components of all views) only validates the callbacks. The page
+# is served with the output section and plot area of the default view; the other views are mounted by 3.2/3.3 when
+# their button is pressed. Callbacks whose outputs are not mounted are not triggered by the browser, so the views not
+# shown do no work on page load or on City Map, theme and study changes.
+app.validation_layout = app.layout
+app.layout = copy.deepcopy(app.validation_layout)
+app.layout['default_viz'].className = 'viz_button active'
+app.layout['output-section'].children = update_output('default_viz')
+app.layout['color_plot_area'].children, app.layout['grey_plot_area'].children = \
+    update_plot_area('default_viz', None, catalog.default_id)
+
 # 3.4 - Update Dropdown-Filters in plot area, based on selected city:
 @app.callback(
     [Output('dropdown_user_color', 'options'),
      Output('dropdown_user_grey', 'options')],
-    [Input('city_dropdown', 'value')]
+    [Input('city_dropdown', 'value'),
+     Input('study_dropdown', 'value')]
 )
-def update_user_dropdowns(selected_city):
+def update_user_dropdowns(selected_city, study_id):
+    filters = study_snapshot(study_id).filters
     if selected_city:
-        # Filter users based on the selected city and description
-        filtered_users_color = df[(df['CityMap'] == selected_city) & (df['description'] == 'color')]['user'].unique()
-        filtered_users_grey = df[(df['CityMap'] == selected_city) & (df['description'] == 'grey')]['user'].unique()
+        # Filter users based on the selected city and description (filter index of the session table)
+        filtered_users_color = filters.selected_users(city_map=selected_city, description='color')
+        filtered_users_grey = filters.selected_users(city_map=selected_city, description='grey')
 
         # Convert filtered users to dropdown options
         color_options = [{'label': user, 'value': user} for user in filtered_users_color]
@@ -250,16 +441,28 @@ def update_user_dropdowns(selected_city):
 
     return [[], []]
 
+# 3.4.1 - Update City-Dropdown, based on selected study:
+@app.callback(
+    [Output('city_dropdown', 'options'),
+     Output('city_dropdown', 'value')],
+    [Input('study_dropdown', 'value')]
+)
+def update_city_dropdown(study_id):
+    sessions = study_snapshot(study_id).sessions
+    return [{'label': city, 'value': city} for city in sorted(sessions['CityMap'].unique())], None
+
 # 3.5 - Update Range-Slider in plot area, based on selected city and viz-type:
 def to_int(value):
     return int(value) if not pd.isna(value) else 0
 
-def update_range_slider(selected_city, description, buffer=5):
+def update_range_slider(snapshot, selected_city, description, buffer=5):
+    # Task durations from the session table (one row per user and stimulus)
+    sessions = snapshot.sessions
     if selected_city:
-        filtered_df = df[(df['CityMap'] == selected_city) & (df['description'] == description)]
+        filtered_df = sessions[(sessions['CityMap'] == selected_city) & (sessions['description'] == description)]
         if not filtered_df.empty:
-            min_value = to_int(filtered_df['FixationDuration_aggregated'].min())
-            max_value = to_int(filtered_df['FixationDuration_aggregated'].max())
+            min_value = to_int(filtered_df['TaskDuration'].min())
+            max_value = to_int(filtered_df['TaskDuration'].max())
             # Fester Wert von 2 zur Max-Grenze hinzufügen
             max_value_with_buffer = max_value + buffer
             marks = {i: f'{i}' for i in range(min_value, max_value_with_buffer + 1, max(1, (max_value_with_buffer - min_value) // 5))}
@@ -267,20 +470,20 @@ def update_range_slider(selected_city, description, buffer=5):
         else:
             return 0, 0, [0, 0], {0: '0'}
     else:
-        global_min = to_int(df['FixationDuration_aggregated'].min())
-        global_max = to_int(df['FixationDuration_aggregated'].max())
+        global_min = to_int(sessions['TaskDuration'].min())
+        global_max = to_int(sessions['TaskDuration'].max())
         # Fester Wert von 2 zur globalen Max-Grenze hinzufügen
         global_max_with_buffer = global_max + buffer
         marks = {i: f'{i}' for i in range(global_min, global_max_with_buffer + 1, max(1, (global_max_with_buffer - global_min) // 5))}
         return global_min, global_max_with_buffer, [global_min, global_max_with_buffer], marks
 
 # 3.5.1 - Update color Slider:
-def update_range_slider_color(selected_city):
-    return update_range_slider(selected_city, 'color')
+def update_range_slider_color(snapshot, selected_city):
+    return update_range_slider(snapshot, selected_city, 'color')
 
 # 3.5.2 - Update grey Slider:
-def update_range_slider_grey(selected_city):
-    return update_range_slider(selected_city, 'grey')
+def update_range_slider_grey(snapshot, selected_city):
+    return update_range_slider(snapshot, selected_city, 'grey')
 
 # 3.5.3 - Callback for both Slider:
 @app.callback(
@@ -292,11 +495,13 @@ def update_range_slider_grey(selected_city):
      Output('range_slider_grey', 'max'),
      Output('range_slider_grey', 'value'),
      Output('range_slider_grey', 'marks')],
-    [Input('city_dropdown', 'value')]
+    [Input('city_dropdown', 'value'),
+     Input('study_dropdown', 'value')]
 )
-def update_range_sliders(selected_city):
-    min_color, max_color, value_color, marks_color = update_range_slider_color(selected_city)
-    min_grey, max_grey, value_grey, marks_grey = update_range_slider_grey(selected_city)
+def update_range_sliders(selected_city, study_id):
+    snapshot = study_snapshot(study_id)
+    min_color, max_color, value_color, marks_color = update_range_slider_color(snapshot, selected_city)
+    min_grey, max_grey, value_grey, marks_grey = update_range_slider_grey(snapshot, selected_city)
     return min_color, max_color, value_color, marks_color, min_grey, max_grey, value_grey, marks_grey
 
 # 3.6 - Update Theme-Mode based on selected theme:
@@ -322,6 +527,35 @@ def update_dropdown_classname(current_theme):
     else:
         return 'dropdown dark_theme_dropdown'
 
+# 3.8 - Update AOI definitions drawn or edited on the gaze plots:
+@app.callback(
+    Output('aoi_store', 'data'),
+    [Input('gaze_plot_color', 'relayoutData'),
+     Input('gaze_plot_grey', 'relayoutData')],
+    [State('city_dropdown', 'value'),
+     State('study_dropdown', 'value')]
+)
+def update_aoi_definitions(relayout_color, relayout_grey, selected_city, study_id):
+    ctx = callback_context
+    # Without an AOI change the store is not updated, so the relayout events of zooming and of the first rendering
+    # do not redraw the gaze plots
+    if not selected_city or not ctx.triggered:
+        return no_update
+    description = 'color' if ctx.triggered[0]['prop_id'].startswith('gaze_plot_color') else 'grey'
+    relayout_data = relayout_color if description == 'color' else relayout_grey
+    study = catalog.study(study_id) or catalog.study(None)
+
+    # AOI edits are serialized with appends and reloads; they apply to a copy of the AOIs of the current snapshot and
+    # publish a new snapshot. Changed definitions are saved to the AOI file of the study, so they are kept over a restart
+    def apply_edit(aoi_engine):
+        changed = aoi_engine.apply_relayout(selected_city, description, relayout_data)
+        if changed:
+            save_aoi_file(aoi_engine.definitions, study.aoi_path)
+        return changed, aoi_engine.version
+
+    changed, version = catalog.store(study.study_id).edit(apply_edit)
+    return version if changed else no_update
+
 """
 -----------------------------------------------------------------------------------------
 Section 4:
@@ -329,35 +563,47 @@ Section 4:
 """
 @app.callback(
     Output('table_container', 'children'),
-    [Input('city_dropdown', 'value')]
+    [Input('city_dropdown', 'value'),
+     Input('study_dropdown', 'value')]
 )
-def update_table_container(selected_city):
-    # Filter data based on the selected city
-    if selected_city:
-        filtered_df = df[df['CityMap'] == selected_city]
-        unique_users_df = filtered_df.drop_duplicates(subset=['user', 'FixationDuration_aggregated'], keep='first')
-    # No city is selected
-    else:
-        filtered_df = df
-        unique_users_df = df.drop_duplicates(subset=['user', 'CityMap', 'FixationDuration_aggregated'], keep='first')
+def update_table_container(selected_city, study_id):
+    # KPIs from the precomputed KPI store (per stimulus, summed for all cities if no city is selected):
+    kpis = kpi_values(study_snapshot(study_id).dataset.kpis, selected_city)
 
     # 1. Average Task Duration (seconds):
     # Sum of FixationDuration per Color / Number of Users per Color
-    avg_task_color = unique_users_df[unique_users_df['description'] == 'color']['FixationDuration_aggregated'].mean()
-    avg_task_grey = unique_users_df[unique_users_df['description'] == 'grey']['FixationDuration_aggregated'].mean()
+    avg_task_color = kpis['color']['AvgTaskDuration']
+    avg_task_grey = kpis['grey']['AvgTaskDuration']
 
     # 2. Number of Fixation-Points (without unit):
-    fixation_points_color = filtered_df[filtered_df['description'] == 'color'].shape[0]
-    fixation_points_grey = filtered_df[filtered_df['description'] == 'grey'].shape[0]
+    fixation_points_color = kpis['color']['FixationCount']
+    fixation_points_grey = kpis['grey']['FixationCount']
 
     # 3. Average Saccade Length (without unit):
     # Lenght of the movement between two fixation points
-    avg_saccade_color = filtered_df[filtered_df['description'] == 'color']['SaccadeLength'].mean()
-    avg_saccade_grey = filtered_df[filtered_df['description'] == 'grey']['SaccadeLength'].mean()
+    avg_saccade_color = kpis['color']['AvgSaccadeLength']
+    avg_saccade_grey = kpis['grey']['AvgSaccadeLength']
 
     # 4. Average Fixation Duration (seconds):
-    avg_fixation_duration_color = unique_users_df[unique_users_df['description'] == 'color']['FixationDuration_avg'].mean()
-    avg_fixation_duration_grey = unique_users_df[unique_users_df['description'] == 'grey']['FixationDuration_avg'].mean()
+    avg_fixation_duration_color = kpis['color']['AvgFixationDuration']
+    avg_fixation_duration_grey = kpis['grey']['AvgFixationDuration']
+
+    # 5. Data Quality (from the quality summary of the ingest, see quality.py):
+    # Fixation-Points shown in the plots and number of points per data issue
+    quality = quality_values(study_snapshot(study_id).dataset.quality, selected_city)
+    quality_rows = [{"KPI": "Shown Fixation-Points",
+                     **{column: f"{quality[description]['Visible']:,}".replace(',', "'") +
+                        (f" ({quality[description]['Visible'] / quality[description]['Fixations']:.1%})"
+                         if quality[description]['Fixations'] else "")
+                        for column, description in [('color', 'color'), ('greyscale', 'grey')]}}]
+    for flag, label in [('OutOfBounds', 'Points outside the Map'),
+                        ('NonPositiveDuration', 'Points without Duration'),
+                        ('DuplicateIndex', 'Duplicate Fixation-Indexes'),
+                        ('MissingSaccade', 'Missing Saccade Lengths'),
+                        ('MissingVariant', 'Points without other Map Variant')]:
+        quality_rows.append({"KPI": label,
+                             "color": f"{quality['color'][flag]:,}".replace(',', "'"),
+                             "greyscale": f"{quality['grey'][flag]:,}".replace(',', "'")})
 
     return dash_table.DataTable(
         id='kpi_table',
@@ -379,7 +625,7 @@ def update_table_container(selected_city):
             {"KPI": "Avgerage Fixation Duration",
                 "color": f"{avg_fixation_duration_color:.2f} sec.",
                 "greyscale": f"{avg_fixation_duration_grey:.2f} sec."}
-        ],
+        ] + quality_rows,
         style_cell={
             'textAlign': 'left',
             'padding': '4px',
@@ -422,174 +668,113 @@ def update_table_container(selected_city):
 Section 4:
 4.2 - Definition of Scatter-Plot Color (Gaze-Plot)
 """
-def get_image_path_color(selected_city):
-    file_pattern_color = f'assets/*_{selected_city}_Color.jpg'
-    matching_files = glob.glob(file_pattern_color)
-    if matching_files:
-        image_path = matching_files[0]
-        img = Image.open(image_path)
-        width, height = img.size
-        return 'http://127.0.0.1:8050/' + image_path, width, height
+# The figures of sections 4.2 - 4.10, 4.12 and 4.13 are assembled as dicts with figure_builder.py (shared light/dark
+# templates, no plotly.express / graph_objects validation per request)
+def stimulus_frame(snapshot, selected_city, description):
+    # Background image and size of the S1 frame of a stimulus: the plots, AOIs and similarity metrics use the
+    # S1-frame coordinates, so S1 and S2 of a City Map share one coordinate system
+    dataset = snapshot.dataset
+    image = frame_background(dataset.stimulus_images, dataset.stimulus_transforms, selected_city, description)
+    if not image:
+        return None, None, None
+    frame = reference_image(dataset.stimulus_images, selected_city, description)
+    return image, frame['width'], frame['height']
+
+
+def get_image_path_color(snapshot, selected_city):
+    image, width, height = stimulus_frame(snapshot, selected_city, 'color')
+    if image:
+        # Relative URL of the content-addressed image route (from the image registry of the study)
+        return image.get('url') or image['path'], width, height
     return None, None, None
 
 
-@app.callback(
+def background_images(snapshot, selected_city, description, x_range=None, y_range=None):
+    # Tiles of the visible area (S1-frame coordinates, None: whole image) at the level matching the zoom, or the full
+    # image while its tile pyramid is being built; the image is stretched to the S1 frame
+    image, width, height = stimulus_frame(snapshot, selected_city, description)
+    if not image:
+        return []
+    if not image.get('tiles') or not tile_pyramids.ready(image):
+        return [layout_image(image.get('url') or image['path'], 0, 0, width, height)]
+    scale_x, scale_y = width / image['width'], height / image['height']
+    tiles = visible_tiles(image['width'], image['height'],
+                          [value / scale_x for value in x_range] if x_range else None,
+                          [value / scale_y for value in y_range] if y_range else None)
+    return [layout_image(f"{image['tiles']}/{level}/{column}_{row}.jpg", x * scale_x, y * scale_y,
+                         sizex * scale_x, sizey * scale_y)
+            for level, column, row, x, y, sizex, sizey in tiles]
+
+
+def filtered_sessions(snapshot, selected_city, description, sessions, selected_users, range_slider_value):
+    # Positions of the sessions of a stimulus matching the user filter (bitmap filter index) and the task duration
+    # range (binary search in the sessions sorted by task duration)
+    users = snapshot.filters.selected_users(city_map=selected_city, description=description, users=selected_users)
+    return select_sessions(sessions, users, range_slider_value)
+
+
+def create_gaze_plot(snapshot, selected_city, description, selected_users, range_slider_value, current_theme):
+    label = 'Color Map' if description == 'color' else 'Greyscale Map'
+    get_image_path = get_image_path_color if description == 'color' else get_image_path_grey
+
+    # Define a color map for users
+    colors = px.colors.qualitative.Plotly
+    color_map = {user: colors[i % len(colors)] for i, user in enumerate(snapshot.dataset.users)}
+
+    # Filter data based on the selected filters (city, user and task duration): the users are selected with the
+    # bitmap filter index of the session table, the task duration range with a binary search in the sessions of the
+    # stimulus sorted by duration; the fixations of the sessions are taken as slices of the stimulus
+    sessions = snapshot.dataset.stimulus_sessions(selected_city, description)
+    filtered_df = snapshot.dataset.stimulus_frame(selected_city, description) \
+        .iloc[session_rows(sessions, filtered_sessions(snapshot, selected_city, description, sessions, selected_users,
+                                                       range_slider_value))]
+
+    # Extract Image Information (coordinates are calibrated to the image and transformed to the S1 frame at load time):
+    _, width, height = get_image_path(snapshot, selected_city)
+
+    # Fixation points within map and with a duration only (precomputed quality flags)
+    filtered_df = filtered_df[visible(filtered_df['QualityFlags'])]
+
+    # Fixation markers per user (size by FixationDuration) and the scanpath of each user
+    traces = gaze_traces(filtered_df['user'].to_numpy(),
+                         filtered_df['S1FramePointX'].to_numpy(dtype=float),
+                         filtered_df['S1FramePointY'].to_numpy(dtype=float),
+                         filtered_df['FixationDuration'].to_numpy(dtype=float),
+                         color_map,
+                         ['S1FramePointX', 'S1FramePointY', 'FixationDuration (ms)',
+                          'X Coordinate', 'Y Coordinate', 'Task Duration (sec)'],
+                         filtered_df[['MappedFixationPointX', 'MappedFixationPointY',
+                                      'FixationDuration_aggregated']].to_numpy(dtype=float))
+
+    return {'data': traces,
+            'layout': stimulus_layout(
+                current_theme, f'{label} Observations in {selected_city}',
+                background_images(snapshot, selected_city, description), width, height,
+                # Defined AOIs of this stimulus (editable in the AOI view):
+                shapes=[aoi_to_shape(aoi) for aoi in snapshot.aoi_engine.aois(selected_city, description)],
+                newshape=dict(line=dict(color='red', width=2), fillcolor='rgba(255, 0, 0, 0.1)'))}
+
+
+@server_filter_callback(
     Output('gaze_plot_color', 'figure'),
     [Input('city_dropdown', 'value'),
      Input('dropdown_user_color', 'value'),
      Input('range_slider_color', 'value'),
-     Input('current_theme', 'data')]
+     Input('current_theme', 'data'),
+     Input('aoi_store', 'data'),
+     Input('study_dropdown', 'value')]
 )
-def update_scatter_plot_color(selected_city, selected_users, range_slider_value, current_theme):
+@binary_figures
+def update_scatter_plot_color(selected_city, selected_users, range_slider_value, current_theme, aoi_version, study_id):
     if selected_city:
-        # Define a color map for users
-        unique_users = df['user'].dropna().unique()
-        colors = px.colors.qualitative.Plotly
-        color_map = {user: colors[i % len(colors)] for i, user in enumerate(unique_users)}
-
-        # Filter and sort data based on the selected filters (city and user):
-        filtered_df = df[
-            (df['CityMap'] == selected_city) & (df['description'] == 'color')]
-
-        if selected_users:
-            if isinstance(selected_users, str):
-                selected_users = [selected_users]
-            filtered_df = filtered_df[filtered_df['user'].isin(selected_users)]
-
-        min_duration, max_duration = range_slider_value
-        filtered_df = filtered_df[
-            (filtered_df['FixationDuration_aggregated'] >= min_duration) & (filtered_df['FixationDuration_aggregated'] <= max_duration)]
-
-        # Extract Image Information and normalize data (only applicable for Antwerpen):
-        image_path_color, width, height = get_image_path_color(selected_city)
-        if image_path_color and width and height:
-            # Attention: "Antwerpen_S1_Color" Data are not normalized !!!
-            if selected_city == 'Antwerpen_S1':
-                filtered_df['NormalizedPointX'] = (
-                        filtered_df['MappedFixationPointX'] / 1651.00 * width)
-                filtered_df['NormalizedPointY'] = (
-                        filtered_df['MappedFixationPointY'] / 1200.00 * height)
-            else:
-                filtered_df['NormalizedPointX'] = filtered_df['MappedFixationPointX']
-                filtered_df['NormalizedPointY'] = filtered_df['MappedFixationPointY']
-
-            # Filter for fixation points within map only
-            filtered_df = filtered_df[
-                (filtered_df['NormalizedPointX'] >= 0) & (filtered_df['NormalizedPointX'] <= width) &
-                (filtered_df['NormalizedPointY'] >= 0) & (filtered_df['NormalizedPointY'] <= height)]
-
-        # Set title color based on theme
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        # Create scatter plot using the color map
-        fig = px.scatter(filtered_df,
-                         x='NormalizedPointX',
-                         y='NormalizedPointY',
-                         size='FixationDuration',
-                         color='user',
-                         color_discrete_map=color_map,
-                         labels={
-                             'MappedFixationPointX': 'X Coordinate',
-                             'MappedFixationPointY': 'Y Coordinate',
-                             'FixationDuration': 'FixationDuration (ms)',
-                             'FixationDuration_aggregated': 'Task Duration (sec)'
-                         },
-                         hover_data = {
-                                'user': True,
-                                'MappedFixationPointX': True,
-                                'MappedFixationPointY': True,
-                                'FixationDuration': True,
-                                'FixationDuration_aggregated': True
-                            }
-                         )
-
-        # Add line traces for each user
-        for user in filtered_df['user'].unique():
-            user_df = filtered_df[filtered_df['user'] == user]
-            fig.add_trace(
-                go.Scatter(
-                    x=user_df['NormalizedPointX'],
-                    y=user_df['NormalizedPointY'],
-                    mode='lines',
-                    line=dict(width=2, color=color_map[user]),
-                    name=f"Scanpath for {user}",
-                    hoverinfo='skip'
-                )
-            )
-        fig.update_xaxes(
-            range=[0, width],
-            autorange=False,
-            showgrid=False,
-            showticklabels=True,
-            tickfont=dict(color=title_color, size=9, family='Arial, sans-serif'))
-
-        fig.update_yaxes(
-            range=[height, 0],
-            autorange=False,
-            showgrid=False,
-            showticklabels=True,
-            tickfont=dict(color=title_color, size=9, family='Arial, sans-serif'))
-
-        fig.add_layout_image(
-            dict(
-                source=image_path_color,
-                x=0,
-                sizex=width,
-                y=0,
-                sizey=height,
-                xref="x",
-                yref="y",
-                sizing="stretch",
-                opacity=0.8,
-                layer="below"
-            )
-        )
-
-        fig.update_layout(
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            xaxis_title=None,
-            yaxis_title=None,
-            title={
-                'text': f'<b>Color Map Observations in {selected_city}</b>',
-                'font': {
-                    'size': 12,
-                    'family': 'Arial, sans-serif',
-                    'color': title_color }
-            },
-            margin=dict(l=0, r=5, t=40, b=5),
-            showlegend=False,
-            height=425)
-        return fig
+        return create_gaze_plot(study_snapshot(study_id), selected_city, 'color', selected_users, range_slider_value,
+                                current_theme)
 
     else:
-        fig = px.scatter()
-
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        fig.update_layout(
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            title={'text': f"No City Map selected.<br><br>"
-                           f"To display the <b>Scan Path Visualization</b> on a specific map,<br>"
-                           f"please select a city from the dropdown on the left.",
-                   'y': 0.6,
-                   'x': 0.5,
-                   'xanchor': 'center',
-                   'yanchor': 'middle',
-                   'font': dict(
-                       size=14,
-                       color=title_color,
-                       family='Arial, sans-serif')},
-            showlegend=False,
-            margin=dict(l=0, r=5, t=40, b=5),
-            height=425
-        )
-
-        fig.update_xaxes(showgrid=False, zeroline=False, showline=False, showticklabels=False)
-        fig.update_yaxes(showgrid=False, zeroline=False, showline=False, showticklabels=False)
-
-        return fig
+        return message_figure(current_theme,
+                              f"No City Map selected.<br><br>"
+                              f"To display the <b>Scan Path Visualization</b> on a specific map,<br>"
+                              f"please select a city from the dropdown on the left.")
 
 
 """
@@ -597,664 +782,230 @@ def update_scatter_plot_color(selected_city, selected_users, range_slider_value,
 Section 4:
 4.3 - Definition of Scatter-Plot Grey (Gaze-Plot)
 """
-def get_image_path_grey(selected_city):
-    file_pattern_grey = f'assets/*_{selected_city}_Grey.jpg'
-    matching_files = glob.glob(file_pattern_grey)
-    if matching_files:
-        image_path = matching_files[0]
-        img = Image.open(image_path)
-        width, height = img.size
-        return 'http://127.0.0.1:8050/' + image_path, width, height
+def get_image_path_grey(snapshot, selected_city):
+    image, width, height = stimulus_frame(snapshot, selected_city, 'grey')
+    if image:
+        # Relative URL of the content-addressed image route (from the image registry of the study)
+        return image.get('url') or image['path'], width, height
     return None, None, None
 
-@app.callback(
+
+# Cities of the City Maps (overview map shown on the greyscale side while no City Map is selected):
+cities = [
+    {"name": "Antwerpen", "lat": 51.2194, "lon": 4.4025},
+    {"name": "Berlin", "lat": 52.5200, "lon": 13.4050},
+    {"name": "Bordeaux", "lat": 44.8378, "lon": -0.5792},
+    {"name": "Köln", "lat": 50.9375, "lon": 6.9603},
+    {"name": "Frankfurt", "lat": 50.1109, "lon": 8.6821},
+    {"name": "Hamburg", "lat": 53.5511, "lon": 9.9937},
+    {"name": "Moskau", "lat": 55.7558, "lon": 37.6173},
+    {"name": "Riga", "lat": 56.9496, "lon": 24.1052},
+    {"name": "Tokyo", "lat": 35.6895, "lon": 139.6917},
+    {"name": "Barcelona", "lat": 41.3851, "lon": 2.1734},
+    {"name": "Bologna", "lat": 44.4949, "lon": 11.3426},
+    {"name": "Brüssel", "lat": 50.8503, "lon": 4.3517},
+    {"name": "Budapest", "lat": 47.4979, "lon": 19.0402},
+    {"name": "Düsseldorf", "lat": 51.2277, "lon": 6.7735},
+    {"name": "Göteborg", "lat": 57.7089, "lon": 11.9746},
+    {"name": "Hong-Kong", "lat": 22.3193, "lon": 114.1694},
+    {"name": "Krakau", "lat": 50.0647, "lon": 19.9450},
+    {"name": "Ljubljana", "lat": 46.0569, "lon": 14.5058},
+    {"name": "New-York", "lat": 40.7128, "lon": -74.0060},
+    {"name": "Paris", "lat": 48.8566, "lon": 2.3522},
+    {"name": "Pisa", "lat": 43.7228, "lon": 10.4017},
+    {"name": "Venedig", "lat": 45.4408, "lon": 12.3155},
+    {"name": "Warschau", "lat": 52.2297, "lon": 21.0122},
+    {"name": "Zürich", "lat": 47.3769, "lon": 8.5417}
+]
+
+
+def create_city_overview(current_theme):
+    return {'data': [{'type': 'scattergeo',
+                      'locationmode': 'ISO-3',
+                      'lon': [city["lon"] for city in cities],
+                      'lat': [city["lat"] for city in cities],
+                      'text': [city["name"] for city in cities],
+                      'mode': 'markers',
+                      'marker': dict(size=6, symbol='circle', color='blue'),
+                      'textposition': 'top right',
+                      'hoverinfo': 'text'}],
+            'layout': layout(current_theme,
+                             title=title('<br><br><b>Available City Maps</b><br>'
+                                         '(zoom out to see cities outside Europe)'),
+                             geo=dict(
+                                 projection_type='natural earth',
+                                 showland=True,
+                                 landcolor='lightgray',
+                                 coastlinecolor='darkgray',
+                                 showcoastlines=True,
+                                 showcountries=True,
+                                 countrycolor='darkgray',
+                                 lonaxis=dict(range=[-10, 40]),  # Longitude range for Europe
+                                 lataxis=dict(range=[35, 65])  # Latitude range for Europe
+                             ),
+                             margin=dict(l=5, r=5, t=100, b=5),
+                             height=424)}
+
+
+@server_filter_callback(
     Output('gaze_plot_grey', 'figure'),
     [Input('city_dropdown', 'value'),
      Input('dropdown_user_grey', 'value'),
      Input('range_slider_grey', 'value'),
-     Input('current_theme', 'data')]
+     Input('current_theme', 'data'),
+     Input('aoi_store', 'data'),
+     Input('study_dropdown', 'value')]
 )
-
-def update_scatter_plot_grey(selected_city, selected_users, range_slider_value, current_theme):
+@binary_figures
+def update_scatter_plot_grey(selected_city, selected_users, range_slider_value, current_theme, aoi_version, study_id):
     if selected_city:
-        # Define a color map for users
-        unique_users = df['user'].dropna().unique()
-        colors = px.colors.qualitative.Plotly
-        color_map = {user: colors[i % len(colors)] for i, user in enumerate(unique_users)}
-
-        # Filter and sort data based on the selected filters (city and user):
-        filtered_df = df[
-            (df['CityMap'] == selected_city) & (df['description'] == 'grey')]
-
-        if selected_users:
-            if isinstance(selected_users, str):
-                selected_users = [selected_users]
-            filtered_df = filtered_df[filtered_df['user'].isin(selected_users)]
-
-        min_duration, max_duration = range_slider_value
-        filtered_df = filtered_df[
-            (filtered_df['FixationDuration_aggregated'] >= min_duration) & (
-                        filtered_df['FixationDuration_aggregated'] <= max_duration)]
-
-        # Extract Image Information:
-        image_path_grey, width, height = get_image_path_grey(selected_city)
-        if image_path_grey and width and height:
-            # Filter for fixation points within map only
-            filtered_df = filtered_df[
-                (filtered_df['MappedFixationPointX'] >= 0) & (filtered_df['MappedFixationPointX'] <= width) &
-                (filtered_df['MappedFixationPointY'] >= 0) & (filtered_df['MappedFixationPointY'] <= height)]
-
-        # Set title color based on theme
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        # Create scatter plot using the color map
-        fig = px.scatter(filtered_df,
-                         x='MappedFixationPointX',
-                         y='MappedFixationPointY',
-                         size='FixationDuration',
-                         color='user',
-                         color_discrete_map=color_map,
-                         labels={
-                             'MappedFixationPointX': 'X Coordinate',
-                             'MappedFixationPointY': 'Y Coordinate',
-                             'FixationDuration': 'FixationDuration (ms)',
-                             'FixationDuration_aggregated': 'Task Duration (sec)'
-                         },
-                         hover_data = {
-                                'user': True,
-                                'MappedFixationPointX': True,
-                                'MappedFixationPointY': True,
-                                'FixationDuration': True,
-                                'FixationDuration_aggregated': True
-                            }
-        )
-
-        # Add line traces for each user
-        for user in filtered_df['user'].unique():
-            user_df = filtered_df[filtered_df['user'] == user]
-            fig.add_trace(
-                go.Scatter(
-                    x=user_df['MappedFixationPointX'],
-                    y=user_df['MappedFixationPointY'],
-                    mode='lines',
-                    line=dict(width=2, color=color_map[user]),
-                    name=f"Scanpath for {user}",
-                    hoverinfo='skip'
-                )
-            )
-
-        fig.update_xaxes(
-            range=[0, width],
-            autorange=False,
-            showgrid=False,
-            showticklabels=True,
-            tickfont=dict(color=title_color, size=9, family='Arial, sans-serif'))
-
-        fig.update_yaxes(
-            range=[height, 0],
-            autorange=False,
-            showgrid=False,
-            showticklabels=True,
-            tickfont=dict(color=title_color, size=9, family='Arial, sans-serif'))
-
-        # Add Background Image
-        fig.add_layout_image(
-            dict(
-                source=image_path_grey,
-                x=0,
-                sizex=width,
-                y=0,
-                sizey=height,
-                xref="x",
-                yref="y",
-                sizing="stretch",
-                opacity=0.8,
-                layer="below"
-            )
-        )
-
-        fig.update_layout(
-            plot_bgcolor='rgba(0, 0, 0, 0)',  # Set background color to transparent
-            paper_bgcolor='rgba(0, 0, 0, 0)',  # Set paper color to transparent
-            xaxis_title=None,
-            yaxis_title=None,
-            title={
-                'text': f'<b>Greyscale Map Observations in {selected_city}</b>',
-                'font': {
-                    'size': 12,
-                    'family': 'Arial, sans-serif',
-                    'color': title_color }
-            },
-            margin=dict(l=0, r=5, t=40, b=5),
-            showlegend=False,
-            height=425)
-        return fig
+        return create_gaze_plot(study_snapshot(study_id), selected_city, 'grey', selected_users, range_slider_value,
+                                current_theme)
 
     else:
-        title_color = 'black' if current_theme == 'light' else 'white'
-        cities = [
-            {"name": "Antwerpen", "lat": 51.2194, "lon": 4.4025},
-            {"name": "Berlin", "lat": 52.5200, "lon": 13.4050},
-            {"name": "Bordeaux", "lat": 44.8378, "lon": -0.5792},
-            {"name": "Köln", "lat": 50.9375, "lon": 6.9603},
-            {"name": "Frankfurt", "lat": 50.1109, "lon": 8.6821},
-            {"name": "Hamburg", "lat": 53.5511, "lon": 9.9937},
-            {"name": "Moskau", "lat": 55.7558, "lon": 37.6173},
-            {"name": "Riga", "lat": 56.9496, "lon": 24.1052},
-            {"name": "Tokyo", "lat": 35.6895, "lon": 139.6917},
-            {"name": "Barcelona", "lat": 41.3851, "lon": 2.1734},
-            {"name": "Bologna", "lat": 44.4949, "lon": 11.3426},
-            {"name": "Brüssel", "lat": 50.8503, "lon": 4.3517},
-            {"name": "Budapest", "lat": 47.4979, "lon": 19.0402},
-            {"name": "Düsseldorf", "lat": 51.2277, "lon": 6.7735},
-            {"name": "Göteborg", "lat": 57.7089, "lon": 11.9746},
-            {"name": "Hong-Kong", "lat": 22.3193, "lon": 114.1694},
-            {"name": "Krakau", "lat": 50.0647, "lon": 19.9450},
-            {"name": "Ljubljana", "lat": 46.0569, "lon": 14.5058},
-            {"name": "New-York", "lat": 40.7128, "lon": -74.0060},
-            {"name": "Paris", "lat": 48.8566, "lon": 2.3522},
-            {"name": "Pisa", "lat": 43.7228, "lon": 10.4017},
-            {"name": "Venedig", "lat": 45.4408, "lon": 12.3155},
-            {"name": "Warschau", "lat": 52.2297, "lon": 21.0122},
-            {"name": "Zürich", "lat": 47.3769, "lon": 8.5417}
-        ]
-
-        lats = [city["lat"] for city in cities]
-        lons = [city["lon"] for city in cities]
-        names = [city["name"] for city in cities]
-
-        fig = go.Figure()
-
-        fig.add_trace(go.Scattergeo(
-            locationmode='ISO-3',
-            lon=lons,
-            lat=lats,
-            text=names,
-            mode='markers',
-            marker=dict(
-                size=6,
-                symbol='circle',
-                color='blue'
-            ),
-            textposition='top right',
-            hoverinfo='text'
-        ))
-
-        fig.update_layout(
-            title=dict(
-                text='<br><br><b>Available City Maps</b><br>'
-                     '(zoom out to see cities outside Europe)',
-                font=dict(size=12, family='Arial, sans-serif', color=title_color),
-            ),
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            geo=dict(
-                projection_type='natural earth',
-                showland=True,
-                landcolor='lightgray',
-                coastlinecolor='darkgray',
-                showcoastlines=True,
-                showcountries=True,
-                countrycolor='darkgray',
-                lonaxis=dict(range=[-10, 40]),  # Longitude range for Europe
-                lataxis=dict(range=[35, 65])  # Latitude range for Europe
-            ),
-            margin=dict(l=5, r=5, t=100, b=5),
-            height=424
-        )
-        return fig
+        return create_city_overview(current_theme)
 
 """
 -----------------------------------------------------------------------------------------
 Section 4:
 4.4 - Definition of Density Heat-Map Color
 """
-@app.callback(
+def create_heatmap(snapshot, selected_city, description, selected_users, range_slider_value, current_theme):
+    label = 'Color Map' if description == 'color' else 'Greyscale Map'
+    get_image_path = get_image_path_color if description == 'color' else get_image_path_grey
+
+    # Density from the precomputed grids: sum of the session grids matching the filters (user, task duration):
+    grid_entry = snapshot.dataset.density_grid(selected_city, description)
+    sessions = snapshot.dataset.stimulus_sessions(selected_city, description)
+
+    # Extract Image Information (only fixation points within the map are contained in the grids):
+    _, width, height = get_image_path(snapshot, selected_city)
+
+    if grid_entry is not None:
+        selected = filtered_sessions(snapshot, selected_city, description, sessions, selected_users, range_slider_value)
+        trace = density_trace(grid_entry['x'], grid_entry['y'], select_density(grid_entry, sessions['users'][selected]))
+    else:
+        trace = density_trace()
+
+    return {'data': [trace],
+            'layout': stimulus_layout(current_theme, f'{label} Observations in {selected_city}',
+                                      background_images(snapshot, selected_city, description), width, height)}
+
+
+@server_filter_callback(
     Output('heat_map_color', 'figure'),
     [Input('city_dropdown', 'value'),
      Input('dropdown_user_color', 'value'),
      Input('range_slider_color', 'value'),
-     Input('current_theme', 'data')]
+     Input('current_theme', 'data'),
+     Input('study_dropdown', 'value')]
 )
-
-def update_heatmap_color(selected_city, selected_users, range_slider_value, current_theme):
+@binary_figures
+def update_heatmap_color(selected_city, selected_users, range_slider_value, current_theme, study_id):
     if selected_city:
-        # Filter and sort data based on the selected filters (city and user):
-        filtered_df = df[(df['CityMap'] == selected_city) & (df['description'] == 'color')]
-
-        if selected_users:
-            if isinstance(selected_users, str):
-                selected_users = [selected_users]
-            filtered_df = filtered_df[filtered_df['user'].isin(selected_users)]
-
-        min_duration, max_duration = range_slider_value
-        filtered_df = filtered_df[
-            (filtered_df['FixationDuration_aggregated'] >= min_duration) & (
-                        filtered_df['FixationDuration_aggregated'] <= max_duration)]
-
-        # Extract Image Information and normalize data (only applicable for Antwerpen):
-        image_path_color, width, height = get_image_path_color(selected_city)
-        if image_path_color and width and height:
-            # Attention: "Antwerpen_S1_Color" Data are not normalized !!!
-            if selected_city == 'Antwerpen_S1':
-                filtered_df['NormalizedPointX'] = (
-                        filtered_df['MappedFixationPointX'] / 1651.00 * width)
-                filtered_df['NormalizedPointY'] = (
-                        filtered_df['MappedFixationPointY'] / 1200.00 * height)
-            else:
-                filtered_df['NormalizedPointX'] = filtered_df['MappedFixationPointX']
-                filtered_df['NormalizedPointY'] = filtered_df['MappedFixationPointY']
-
-            # Filter for fixation points within map only
-            filtered_df = filtered_df[
-                (filtered_df['NormalizedPointX'] >= 0) & (filtered_df['NormalizedPointX'] <= width) &
-                (filtered_df['NormalizedPointY'] >= 0) & (filtered_df['NormalizedPointY'] <= height)]
-
-        # Set title color based on theme
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        fig = px.density_contour(filtered_df,
-                                 x='NormalizedPointX',
-                                 y='NormalizedPointY',
-                                 nbinsx=30,
-                                 nbinsy=30)
-
-        fig.update_traces(
-            contours_showlabels=False,
-            contours_coloring="fill",
-            line=dict(
-                smoothing=1.3,
-                color='rgba(0, 0, 0, 0)'
-            ),
-            colorscale=[
-                [0.0, "rgba(0, 128, 0, 0)"],  # Green, but transparent
-                [0.2, "rgba(0, 128, 0, 0.5)"],  # Green with some opacity
-                [0.4, "rgba(173, 255, 47, 0.6)"],  # Yellow-green with moderate opacity
-                [0.6, "rgba(255, 255, 0, 0.7)"],  # Yellow with higher opacity
-                [0.8, "rgba(255, 165, 0, 0.8)"],  # Orange with more opacity
-                [1.0, "rgba(255, 0, 0, 0.9)"]  # Red with full opacity
-            ],
-            showscale=False)
-
-        fig.update_xaxes(
-            range=[0, width],
-            autorange=False,
-            showgrid=False,
-            showticklabels=True,
-            tickfont=dict(color=title_color, size=9, family='Arial, sans-serif'))
-
-        fig.update_yaxes(
-            range=[height, 0],
-            autorange=False,
-            showgrid=False,
-            showticklabels=True,
-            tickfont=dict(color=title_color, size=9, family='Arial, sans-serif'))
-
-        fig.add_layout_image(
-            dict(
-                source=image_path_color,
-                x=0,
-                sizex=width,
-                y=0,
-                sizey=height,
-                xref="x",
-                yref="y",
-                sizing="stretch",
-                opacity=0.8,
-                layer="below"
-            )
-        )
-
-        fig.update_layout(
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            xaxis_title=None,
-            yaxis_title=None,
-            title={
-                'text': f'<b>Color Map Observations in {selected_city}</b>',
-                'font': {
-                    'size': 12,
-                    'family': 'Arial, sans-serif',
-                    'color': title_color}
-            },
-            margin=dict(l=0, r=5, t=40, b=5),
-            showlegend=False,
-            height=425)
-        return fig
+        return create_heatmap(study_snapshot(study_id), selected_city, 'color', selected_users, range_slider_value,
+                              current_theme)
 
     else:
-        fig = px.scatter()
-
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        fig.update_layout(
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            title={
-                'text': f"No City Map selected.<br><br>"
-                        f"To display the <b>Density Visualization</b> on a specific map,<br>"
-                        f"please select a city from the dropdown on the left.",
-                'y': 0.6,
-                'x': 0.5,
-                'xanchor': 'center',
-                'yanchor': 'middle',
-                'font': {
-                    'size': 14,
-                    'color': title_color,
-                    'family': 'Arial, sans-serif'
-                }},
-            showlegend=False,
-            margin=dict(l=0, r=5, t=40, b=5),
-            height=425,
-        )
-
-        fig.update_xaxes(showgrid=False, zeroline=False, showline=False, showticklabels=False)
-        fig.update_yaxes(showgrid=False, zeroline=False, showline=False, showticklabels=False)
-
-        return fig
+        return message_figure(current_theme,
+                              f"No City Map selected.<br><br>"
+                              f"To display the <b>Density Visualization</b> on a specific map,<br>"
+                              f"please select a city from the dropdown on the left.")
 
 """
 -----------------------------------------------------------------------------------------
 Section 4:
 4.5 - Definition of Density Heat-Map Grey
 """
-@app.callback(
+@server_filter_callback(
     Output('heat_map_grey', 'figure'),
     [Input('city_dropdown', 'value'),
      Input('dropdown_user_grey', 'value'),
      Input('range_slider_grey', 'value'),
-     Input('current_theme', 'data')]
+     Input('current_theme', 'data'),
+     Input('study_dropdown', 'value')]
 )
-
-def update_heatmap_grey(selected_city, selected_users, range_slider_value, current_theme):
+@binary_figures
+def update_heatmap_grey(selected_city, selected_users, range_slider_value, current_theme, study_id):
     if selected_city:
-        # Filter and sort data based on the selected filters (city and user):
-        filtered_df = df[(df['CityMap'] == selected_city) & (df['description'] == 'grey')]
-
-        if selected_users:
-            if isinstance(selected_users, str):
-                selected_users = [selected_users]
-            filtered_df = filtered_df[filtered_df['user'].isin(selected_users)]
-
-        min_duration, max_duration = range_slider_value
-        filtered_df = filtered_df[
-            (filtered_df['FixationDuration_aggregated'] >= min_duration) & (
-                    filtered_df['FixationDuration_aggregated'] <= max_duration)]
-
-        # Extract Image Information:
-        image_path_grey, width, height = get_image_path_grey(selected_city)
-        if image_path_grey and width and height:
-            # Filter for fixation points within map only
-            filtered_df = filtered_df[
-                (filtered_df['MappedFixationPointX'] >= 0) & (filtered_df['MappedFixationPointX'] <= width) &
-                (filtered_df['MappedFixationPointY'] >= 0) & (filtered_df['MappedFixationPointY'] <= height)]
-
-        # Set title color based on theme
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        fig = px.density_contour(filtered_df,
-                                 x='MappedFixationPointX',
-                                 y='MappedFixationPointY',
-                                 nbinsx=30,
-                                 nbinsy=30)
-
-        fig.update_traces(
-            contours_showlabels=False,
-            contours_coloring="fill",
-            line=dict(
-                smoothing=1.3,
-                color='rgba(0, 0, 0, 0)'  # Set contour line color to transparent
-            ),
-            colorscale=[
-                [0.0, "rgba(0, 128, 0, 0)"],  # Green, but transparent
-                [0.2, "rgba(0, 128, 0, 0.5)"],  # Green with some opacity
-                [0.4, "rgba(173, 255, 47, 0.6)"],  # Yellow-green with moderate opacity
-                [0.6, "rgba(255, 255, 0, 0.7)"],  # Yellow with higher opacity
-                [0.8, "rgba(255, 165, 0, 0.8)"],  # Orange with more opacity
-                [1.0, "rgba(255, 0, 0, 0.9)"]  # Red with full opacity
-            ],
-            showscale=False)
-
-        fig.update_xaxes(
-            range=[0, width],
-            autorange=False,
-            showgrid=False,
-            showticklabels=True,
-            tickfont=dict(color=title_color, size=9, family='Arial, sans-serif'))
-
-        fig.update_yaxes(
-            range=[height, 0],
-            autorange=False,
-            showgrid=False,
-            showticklabels=True,
-            tickfont=dict(color=title_color, size=9, family='Arial, sans-serif'))
-
-        fig.add_layout_image(
-            dict(
-                source=image_path_grey,
-                x=0,
-                sizex=width,
-                y=0,
-                sizey=height,
-                xref="x",
-                yref="y",
-                sizing="stretch",
-                opacity=0.8,
-                layer="below"
-            )
-        )
-
-        fig.update_layout(
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            xaxis_title=None,
-            yaxis_title=None,
-            title={
-                'text': f'<b>Greyscale Map Observations in {selected_city}</b>',
-                'font': {
-                    'size': 12,
-                    'family': 'Arial, sans-serif',
-                    'color': title_color}
-            },
-            margin=dict(l=0, r=5, t=40, b=5),
-            showlegend=False,
-            height=425,)
-        return fig
-
+        return create_heatmap(study_snapshot(study_id), selected_city, 'grey', selected_users, range_slider_value,
+                              current_theme)
 
     else:
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        cities = [
-            {"name": "Antwerpen", "lat": 51.2194, "lon": 4.4025},
-            {"name": "Berlin", "lat": 52.5200, "lon": 13.4050},
-            {"name": "Bordeaux", "lat": 44.8378, "lon": -0.5792},
-            {"name": "Köln", "lat": 50.9375, "lon": 6.9603},
-            {"name": "Frankfurt", "lat": 50.1109, "lon": 8.6821},
-            {"name": "Hamburg", "lat": 53.5511, "lon": 9.9937},
-            {"name": "Moskau", "lat": 55.7558, "lon": 37.6173},
-            {"name": "Riga", "lat": 56.9496, "lon": 24.1052},
-            {"name": "Tokyo", "lat": 35.6895, "lon": 139.6917},
-            {"name": "Barcelona", "lat": 41.3851, "lon": 2.1734},
-            {"name": "Bologna", "lat": 44.4949, "lon": 11.3426},
-            {"name": "Brüssel", "lat": 50.8503, "lon": 4.3517},
-            {"name": "Budapest", "lat": 47.4979, "lon": 19.0402},
-            {"name": "Düsseldorf", "lat": 51.2277, "lon": 6.7735},
-            {"name": "Göteborg", "lat": 57.7089, "lon": 11.9746},
-            {"name": "Hong-Kong", "lat": 22.3193, "lon": 114.1694},
-            {"name": "Krakau", "lat": 50.0647, "lon": 19.9450},
-            {"name": "Ljubljana", "lat": 46.0569, "lon": 14.5058},
-            {"name": "New-York", "lat": 40.7128, "lon": -74.0060},
-            {"name": "Paris", "lat": 48.8566, "lon": 2.3522},
-            {"name": "Pisa", "lat": 43.7228, "lon": 10.4017},
-            {"name": "Venedig", "lat": 45.4408, "lon": 12.3155},
-            {"name": "Warschau", "lat": 52.2297, "lon": 21.0122},
-            {"name": "Zürich", "lat": 47.3769, "lon": 8.5417}
-        ]
-
-        lats = [city["lat"] for city in cities]
-        lons = [city["lon"] for city in cities]
-        names = [city["name"] for city in cities]
-        fig = go.Figure()
-        fig.add_trace(go.Scattergeo(
-            locationmode='ISO-3',
-            lon=lons,
-            lat=lats,
-            text=names,
-            mode='markers',
-            marker=dict(
-                size=6,
-                symbol='circle',
-                color='blue'
-            ),
-            textposition='top right',
-            hoverinfo='text'
-        ))
-
-        fig.update_layout(
-            title=dict(
-                text='<br><br><b>Available City Maps</b><br>'
-                     '(zoom out to see cities outside Europe)',
-                font=dict(size=12, family='Arial, sans-serif', color=title_color),
-            ),
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            geo=dict(
-                projection_type='natural earth',
-                showland=True,
-                landcolor='lightgray',
-                coastlinecolor='darkgray',
-                showcoastlines=True,
-                showcountries=True,
-                countrycolor='darkgray',
-                lonaxis=dict(range=[-10, 40]),  # Longitude range for Europe
-                lataxis=dict(range=[35, 65])  # Latitude range for Europe
-            ),
-            margin=dict(l=5, r=5, t=100, b=5),
-            height=424
-        )
-
-        return fig
+        return create_city_overview(current_theme)
 
 """
 -----------------------------------------------------------------------------------------
 Section 4:
 4.6 - Definition of Box-Plot "Task Duration" (Distribution of Task Duration (A-B) per User, Color, City)
 """
+def create_box_plot(df, column, label, dtick, title_text, current_theme):
+    # Boxes per City (sorted, top to bottom) and Map Type; df: one row per user and stimulus (session table)
+    city_order = sorted(df['City'].unique().tolist())
+    box_colors = {'color': 'blue', 'grey': 'lightgrey'}
+    traces = []
+    for description in df['description'].unique():
+        selected = df[df['description'] == description]
+        traces.append(box_trace(description, selected[column].to_numpy(dtype=float), selected['City'].to_numpy(),
+                                box_colors[description], label))
+
+    # Median text annotations aligned along the right edge
+    medians = df.groupby(['City', 'description'])[column].median().reset_index()
+    max_value = df[column].max()
+    x_offsets = {
+        'color': max_value * 1.05,  # Slightly outside the max x value
+        'grey': max_value * 1.15  # Further outside to avoid overlap
+    }
+    annotations = [dict(x=x_offsets[row.description],
+                        y=row.City,
+                        text=f'{getattr(row, column):.2f}',
+                        showarrow=False,
+                        xanchor='left',
+                        yanchor='middle',
+                        font=dict(size=9, color='grey' if row.description == 'grey' else 'blue'))
+                   for row in medians.itertuples()]
+
+    return {'data': traces,
+            'layout': layout(current_theme,
+                             boxmode='group',
+                             height=525,
+                             xaxis=axis(11, dtick=dtick, showticklabels=True, showline=True, zeroline=False,
+                                        linewidth=0.2, title=title(label, 11)),
+                             yaxis=axis(11, dtick=1, showticklabels=True, zeroline=False, showline=False,
+                                        categoryorder='array', categoryarray=city_order[::-1]),
+                             annotations=annotations,
+                             title=title(title_text),
+                             margin=dict(l=5, r=5, t=40, b=5),
+                             legend=dict(
+                                 title=dict(text=''),
+                                 tracegroupgap=0,
+                                 font=dict(size=10),
+                                 bgcolor='rgba(0, 0, 0, 0)',
+                                 orientation='h',
+                                 yanchor='top',
+                                 y=-0.04,
+                                 xanchor='left',
+                                 x=-0.2
+                             ),
+                             showlegend=True)}
+
+
 @app.callback(
     Output('box_task_duration', 'figure'),
-    [Input('active-button', 'data'),
-     Input('current_theme', 'data')]
+    [Input('current_theme', 'data'),
+     Input('study_dropdown', 'value')]
 )
-def update_box_plot_task_duration(active_button, current_theme):
-    if active_button == 'default_viz':
-        city_order = sorted(df['City'].unique().tolist())
-
-        # Set title color based on theme
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        # Calculate medians for annotations
-        medians = df.groupby(['City', 'description'])['FixationDuration_aggregated'].median().reset_index()
-        max_fixation_duration = df['FixationDuration_aggregated'].max()
-
-        fig = px.box(df,
-                     x='FixationDuration_aggregated',
-                     y='City',
-                     points=False,
-                     color='description',
-                     boxmode='group',
-                     category_orders={'City': city_order},
-                     color_discrete_map={
-                         'color': 'blue',
-                         'grey': 'lightgrey'},
-                     labels={'FixationDuration_aggregated': 'Task Duration [sec.]',
-                             'City': '',
-                             'description': ''})
-
-        fig.update_traces(marker=dict(size=8), line=dict(width=2.0))
-
-        fig.update_xaxes(dtick=100,
-                         showticklabels=True,
-                         tickfont=dict(color=title_color, size=11, family='Arial, sans-serif'),
-                         showgrid=False,
-                         showline=True,
-                         zeroline=False,
-                         linecolor=title_color,
-                         linewidth=0.2)
-
-        fig.update_yaxes(dtick=1,
-                         showgrid=False,
-                         showticklabels=True,
-                         zeroline=False,
-                         showline=False,
-                         tickfont=dict(color=title_color, size=11, family='Arial, sans-serif'))
-
-        # Add median text annotations aligned along the right edge
-        x_offsets = {
-            'color': max_fixation_duration * 1.05,  # Slightly outside the max x value
-            'grey': max_fixation_duration * 1.15  # Further outside to avoid overlap
-        }
-
-        for description in medians['description'].unique():
-            median_data = medians[medians['description'] == description]
-            for _, row in median_data.iterrows():
-                x_value = x_offsets[description]  # Adjusted position
-                y_value = row['City']
-                color = 'grey' if description == 'grey' else 'blue'
-
-                fig.add_annotation(
-                    x=x_value,
-                    y=y_value,
-                    text=f'{row["FixationDuration_aggregated"]:.2f}',
-                    showarrow=False,
-                    xanchor='left',
-                    yanchor='middle',
-                    font=dict(size=9, color=color)
-                )
-
-        fig.update_layout(
-            height=525,
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            yaxis_title=None,
-            xaxis_title={
-                'text': 'Task Duration [sec.]',
-                'font': {
-                    'size': 11,
-                    'family': 'Arial, sans-serif',
-                    'color': title_color}
-            },
-            title={
-                'text': f'<b>Distribution of Task-Duration</b>'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;<i>Median:</i>',
-                'font': {
-                    'size': 12,
-                    'family': 'Arial, sans-serif',
-                    'color': title_color}
-            },
-            margin=dict(l=5, r=5, t=40, b=5),
-            legend=dict(
-                font=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                bgcolor='rgba(0, 0, 0, 0)',
-                orientation='h',
-                yanchor='top',
-                y=-0.04,
-                xanchor='left',
-                x=-0.2
-            ),
-            showlegend=True,
-            )
-
-        return fig
-
-    else:
-        fig = px.scatter()
-        return fig
+@binary_figures
+def update_box_plot_task_duration(current_theme, study_id):
+    return create_box_plot(study_snapshot(study_id).sessions, 'TaskDuration', 'Task Duration [sec.]', 100,
+                           f'<b>Distribution of Task-Duration</b>'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;<i>Median:</i>',
+                           current_theme)
 
 """
 -----------------------------------------------------------------------------------------
@@ -1263,117 +1014,19 @@ Section 4:
 """
 @app.callback(
     Output('box_avg_fix_duration', 'figure'),
-    [Input('active-button', 'data'),
-     Input('current_theme', 'data')]
+    [Input('current_theme', 'data'),
+     Input('study_dropdown', 'value')]
 )
-def update_box_plot_avg_fix_duration(active_button, current_theme):
-    if active_button == 'default_viz':
-        city_order = sorted(df['City'].unique().tolist())
-
-        # Set title color based on theme
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        # Calculate medians for annotations
-        medians = df.groupby(['City', 'description'])['FixationDuration_avg'].median().reset_index()
-        max_fixation_duration = df['FixationDuration_avg'].max()
-
-        fig = px.box(df,
-                     x='FixationDuration_avg',
-                     y='City',
-                     points=False,
-                     color='description',
-                     boxmode='group',
-                     category_orders={'City': city_order},
-                     color_discrete_map={
-                         'color': 'blue',
-                         'grey': 'lightgrey'},
-                     labels={'FixationDuration_avg': 'Avg. Fixation Duration [sec.]',
-                             'City': '',
-                             'description': ''})
-
-        fig.update_traces(marker=dict(size=8), line=dict(width=2.0))
-
-        fig.update_xaxes(dtick=0.2,
-                         showticklabels=True,
-                         tickfont=dict(color=title_color, size=11, family='Arial, sans-serif'),
-                         showgrid=False,
-                         showline=True,
-                         zeroline=False,
-                         linecolor=title_color,
-                         linewidth=0.2)
-
-        fig.update_yaxes(dtick=1,
-                         showgrid=False,
-                         showticklabels=True,
-                         zeroline=False,
-                         showline=False,
-                         tickfont=dict(color=title_color, size=11, family='Arial, sans-serif')
-                         )
-
-        # Add median text annotations aligned along the right edge
-        x_offsets = {
-            'color': max_fixation_duration * 1.05,  # Slightly outside the max x value
-            'grey': max_fixation_duration * 1.15  # Further outside to avoid overlap
-        }
-
-        for description in medians['description'].unique():
-            median_data = medians[medians['description'] == description]
-            for _, row in median_data.iterrows():
-                x_value = x_offsets[description]  # Adjusted position
-                y_value = row['City']
-                color = 'grey' if description == 'grey' else 'blue'
-
-                fig.add_annotation(
-                    x=x_value,
-                    y=y_value,
-                    text=f'{row["FixationDuration_avg"]:.2f}',
-                    showarrow=False,
-                    xanchor='left',
-                    yanchor='middle',
-                    font=dict(size=9, color=color)
-                )
-
-        fig.update_layout(
-            height=525,
-            plot_bgcolor='rgba(0, 0, 0, 0)',
-            paper_bgcolor='rgba(0, 0, 0, 0)',
-            yaxis_title=None,
-            xaxis_title={
-                'text': 'Avg. Fixation Duration [sec.]',
-                'font': {
-                    'size': 11,
-                    'family': 'Arial, sans-serif',
-                    'color': title_color}
-            },
-            title={
-                'text': f'<b>Distribution of Average Fixation Duration</b>'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                        f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                        f'&nbsp;&nbsp;<i>Median:</i>',
-                'font': {
-                    'size': 12,
-                    'family': 'Arial, sans-serif',
-                    'color': title_color}
-            },
-            margin=dict(l=5, r=5, t=40, b=5),
-            legend=dict(
-                font=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                bgcolor='rgba(0, 0, 0, 0)',
-                orientation='h',
-                yanchor='top',
-                y=-0.04,
-                xanchor='left',
-                x=-0.2
-            ),
-            showlegend=True,
-        )
-
-        return fig
-
-    else:
-        fig = px.scatter()
-        return fig
+@binary_figures
+def update_box_plot_avg_fix_duration(current_theme, study_id):
+    return create_box_plot(study_snapshot(study_id).sessions, 'AvgFixationDuration',
+                           'Avg. Fixation Duration [sec.]', 0.2,
+                           f'<b>Distribution of Average Fixation Duration</b>'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                           f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                           f'&nbsp;&nbsp;<i>Median:</i>',
+                           current_theme)
 
 """
 -----------------------------------------------------------------------------------------
@@ -1383,257 +1036,167 @@ Section 4:
 @app.callback(
     Output('hist_taskduration', 'figure'),
      [Input('city_dropdown', 'value'),
-     Input('current_theme', 'data')]
+     Input('current_theme', 'data'),
+     Input('study_dropdown', 'value')]
 )
-def update_histogram_task_duration(selected_city, current_theme):
+@binary_figures
+def update_histogram_task_duration(selected_city, current_theme, study_id):
+    # One row per user and stimulus (session table):
+    df = study_snapshot(study_id).sessions
     title_color = 'black' if current_theme == 'light' else 'white'
+    facet_title = (f'<br><br>'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;color'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
+                   f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;grey')
 
     if selected_city:
         filtered_df = df[df['CityMap'] == selected_city]
-        unique_users_df = filtered_df.drop_duplicates(subset=['user', 'FixationDuration_aggregated'], keep='first')
-        titel = (f'<b>Distribution of Task Duration in {selected_city}</b><br><br>'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;color'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;grey')
-
-        fig = px.histogram(unique_users_df,
-                           x="FixationDuration_aggregated",
-                           color="description",
-                           facet_col='description',
-                           category_orders={"description": ["color", "grey"]},
-                           color_discrete_map={
-                               'color': 'blue',
-                               'grey': 'lightgrey'},
-                           nbins=20,
-                           labels={
-                               "FixationDuration_aggregated": ""
-                           })
+        unique_users_df = filtered_df.drop_duplicates(subset=['user', 'TaskDuration'], keep='first')
+        titel = f'<b>Distribution of Task Duration in {selected_city}</b>' + facet_title
+        nbins = 20
 
     else:
-        unique_users_df = df.drop_duplicates(subset=['user', 'CityMap', 'FixationDuration_aggregated'], keep='first')
-        titel = (f'<b>Distribution of Task Duration in all cities</b><br><br>'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;color'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;'
-                 f'&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;grey')
-
-        fig = px.histogram(unique_users_df,
-                           x="FixationDuration_aggregated",
-                           color="description",
-                           facet_col='description',
-                           category_orders={"description": ["color", "grey"]},
-                           color_discrete_map={
-                               'color': 'blue',
-                               'grey': 'lightgrey'},
-                           nbins=50,
-                           labels={
-                               "FixationDuration_aggregated": ""
-                           })
-
-    fig.update_xaxes(showgrid=False,
-                     showticklabels=True,
-                     tickfont=dict(color=title_color, size=11, family='Arial, sans-serif'),
-                     showline=True,
-                     linecolor=title_color,
-                     zeroline=False)
-
-    fig.update_yaxes(showgrid=False,
-                     showticklabels=False,
-                     tickfont=dict(color=title_color, size=11, family='Arial, sans-serif'),
-                     showline=True,
-                     linecolor=title_color,
-                     zeroline=False)
-
-    fig.update_layout(
-        plot_bgcolor='rgba(0, 0, 0, 0)',
-        paper_bgcolor='rgba(0, 0, 0, 0)',
-        yaxis_title=None,
-        xaxis_title=dict(
-            text='[sec.]',
-            font=dict(size=10, family='Arial, sans-serif', color=title_color)),
-        margin=dict(l=1, r=5, t=30, b=0),
-        showlegend=False,
-        title=dict(
-            text=titel,
-            font=dict(size=12, family='Arial, sans-serif', color=title_color)
-        ),
-        legend_title_text='',
-        height=137)
-
-    fig.update_traces(
-        marker_line_color=title_color,
-        marker_line_width=1
-    )
-
-    fig.for_each_annotation(lambda a: a.update(text=''))
-    fig.for_each_xaxis(lambda axis: axis.update(
-        title_text='[sec.]',
-        title_font=dict(size=10, family='Arial, sans-serif', color=title_color))
-                       )
-    return fig
+        unique_users_df = df.drop_duplicates(subset=['user', 'CityMap', 'TaskDuration'], keep='first')
+        titel = f'<b>Distribution of Task Duration in all cities</b>' + facet_title
+        nbins = 50
+
+    # One facet per Map Type (color left, grey right) with shared bins:
+    traces = [histogram_trace(description,
+                              unique_users_df.loc[unique_users_df['description'] == description,
+                                                  'TaskDuration'].to_numpy(dtype=float),
+                              bar_color, nbins, title_color, xaxis=f'x{suffix}', yaxis=f'y{suffix}')
+              for description, bar_color, suffix in [('color', 'blue', ''), ('grey', 'lightgrey', '2')]]
+    x_axis = axis(11, showticklabels=True, showline=True, zeroline=False, title=title('[sec.]', 10))
+    y_axis = axis(11, showticklabels=False, showline=True, zeroline=False)
+
+    return {'data': traces,
+            'layout': layout(current_theme,
+                             xaxis=dict(x_axis, anchor='y', domain=[0.0, 0.49]),
+                             yaxis=dict(y_axis, anchor='x', domain=[0.0, 1.0]),
+                             xaxis2=dict(x_axis, anchor='y2', domain=[0.51, 1.0], matches='x'),
+                             yaxis2=dict(y_axis, anchor='x2', domain=[0.0, 1.0], matches='y'),
+                             barmode='relative',
+                             margin=dict(l=1, r=5, t=30, b=0),
+                             showlegend=False,
+                             title=title(titel),
+                             height=137)}
 
 """
 -----------------------------------------------------------------------------------------
 Section 4:
 4.9 - Definition of Scatter Plot Color (Correlation between Fixation Duration and Saccade Length)
 """
-@app.callback(
-    Output('scatter_correlation_color', 'figure'),
-    [Input('active-button', 'data'),
-     Input('city_dropdown', 'value'),
-     Input('current_theme', 'data')]
-)
-def update_scatter_correlation_color(active_button, selected_city, current_theme):
-    if active_button == 'scatter_plot':
-        # Set title color based on theme
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        if selected_city:
-            filtered_df = df[(df['CityMap'] == selected_city) & (df['description'] == 'color')]
-            title = (f'<b>Color Map {selected_city}:<br>'
-                     f'Correlation between Saccade Length and Fixation Duration</b>')
-
-            # Drop data where 'SaccadeLength' is null
-            filtered_df = filtered_df.dropna(subset=['FixationDuration', 'SaccadeLength'])
-
-            # Convert FixationDuration to seconds
-            filtered_df['FixationDuration'] = filtered_df['FixationDuration'] / 1000
-
-            min_x = filtered_df['FixationDuration'].min()
-            max_x = filtered_df['FixationDuration'].max()
-            min_y = filtered_df['SaccadeLength'].min()
-            max_y = filtered_df['SaccadeLength'].max()
-
-            color_sequence = ['rgba(94, 204, 244, 1)', 'rgba(0, 0, 255, 1)']
-
-            fig = px.scatter(filtered_df,
-                             x='FixationDuration',
-                             y='SaccadeLength',
-                             category_orders={'TaskDurationCategory': ['<10 sec.', '>=10 sec.']},
-                             color='TaskDurationCategory',
-                             color_discrete_sequence=color_sequence,
-                             labels={'FixationDuration': 'Fixation Duration [sec.]',
-                                     'SaccadeLength': 'Saccade Length',
-                                     'TaskDurationCategory': 'Task Duration Category'})
-
-            fig.update_traces(marker=dict(size=9,
-                                          opacity=0.8,
-                                          line=dict(width=0.3, color=title_color))
-                              )
-
-            fig.update_layout(
-                plot_bgcolor='rgba(0, 0, 0, 0)',
-                paper_bgcolor='rgba(0, 0, 0, 0)',
-                margin=dict(l=50, r=30, t=50, b=50),
-                height=525,
-                title=dict(text=title,
-                           font=dict(size=12, family='Arial, sans-serif', color=title_color)),
-                yaxis_title=dict(text='Saccade Length',
-                                 font=dict(size=11, family='Arial, sans-serif', color=title_color),
-                                 standoff=0),
-                xaxis_title=dict(text='Fixation Duration [sec.]',
-                                 font=dict(size=11, family='Arial, sans-serif', color=title_color)),
-                legend_title=dict(text='Task Duration Category',
-                                  font=dict(size=10, family='Arial, sans-serif', color=title_color)),
-                legend=dict(orientation='h',
-                            font=dict(size=10, family='Arial, sans-serif', color=title_color))
-            )
-
-            fig.update_xaxes(range=[min_x-0.07, max_x+0.09],
-                             showgrid=False,
-                             showticklabels=True,
-                             tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                             showline=True,
-                             zeroline=False,
-                             linecolor=title_color,
-                             zerolinewidth=0.2)
-
-            fig.update_yaxes(range=[min_y-20, max_y+20],
-                             showgrid=False,
-                             showticklabels=True,
-                             tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                             showline=True,
-                             zeroline=False,
-                             linecolor=title_color,
-                             linewidth=0.2)
-
-            return fig
+def create_scatter_correlation(dataset, selected_city, description, feature, duration_scheme, duration_edges_text,
+                               current_theme):
+    title_color = 'black' if current_theme == 'light' else 'white'
+    label = feature_label(feature)
+    map_label = 'Color Map' if description == 'color' else 'Greyscale Map'
 
-        else:
-            filtered_df = df[df['description'] == 'color']
-
-            # Drop data where 'SaccadeLength' is null
-            filtered_df = filtered_df.dropna(subset=['FixationDuration', 'SaccadeLength'])
-
-            # Convert FixationDuration to seconds
-            filtered_df['FixationDuration'] = filtered_df['FixationDuration'] / 1000
-
-            # Create a histogram2dcontour plot
-            fig = go.Figure(go.Histogram2dContour(
-                x=filtered_df['FixationDuration'],
-                y=filtered_df['SaccadeLength'],
-                coloraxis='coloraxis')
-            )
-
-            fig.update_layout(
-                coloraxis=dict(
-                    colorscale='Blues',
-                    colorbar=dict(
-                        title='Scatter Density',
-                        tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                        titlefont=dict(color=title_color, size=10, family='Arial, sans-serif')))
-            )
-
-            fig.update_layout(
-                plot_bgcolor='rgba(0, 0, 0, 0)',
-                paper_bgcolor='rgba(0, 0, 0, 0)',
-                margin=dict(l=50, r=30, t=50, b=50),
-                height=525,
-                title=dict(text=f'<b>Color Maps of all cities:<br>'
-                           f'Correlation between Saccade Length and Fixation Duration</b>',
-                           font=dict(size=12, family='Arial, sans-serif', color=title_color)),
-                xaxis_title=dict(text='Fixation Duration [sec.]',
-                                 font=dict(size=11, family='Arial, sans-serif', color=title_color)),
-                yaxis_title=dict(text='Saccade Length',
-                                 font=dict(size=11, family='Arial, sans-serif', color=title_color))
-            )
-
-            fig.update_xaxes(range=[0.07, 0.6],
-                             showgrid=False,
-                             showticklabels=True,
-                             tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                             showline=False,
-                             zeroline=False,
-                             zerolinecolor=title_color,
-                             linecolor=title_color,
-                             zerolinewidth=0.2)
-
-            fig.update_yaxes(range= [0, 350],
-                             showgrid=False,
-                             showticklabels=True,
-                             tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                             showline=False,
-                             zeroline=False,
-                             zerolinecolor=title_color,
-                             linecolor=title_color,
-                             zerolinewidth=0.2)
-
-            return fig
+    if selected_city:
+        arrays = dataset.stimulus_arrays(selected_city, description, ['FixationDuration', feature])
+
+        # Task Duration Category per session (sorted session index, no recut of the fixations),
+        # repeated for the fixations of the stimulus (grouped by session):
+        edges = duration_edges(dataset.sorted_durations, duration_scheme, parse_duration_edges(duration_edges_text))
+        categories = duration_categories(dataset.stimulus_sessions(selected_city, description), edges)
+        labels = duration_labels(edges)
+
+        # FixationDuration in seconds; data where the selected feature is null is not drawn
+        x = arrays['FixationDuration'].astype(float) / 1000
+        y = arrays[feature].astype(float)
+        valid = ~np.isnan(x) & ~np.isnan(y)
+
+        min_x, max_x = (x[valid].min(), x[valid].max()) if valid.any() else (np.nan, np.nan)
+        min_y, max_y = (y[valid].min(), y[valid].max()) if valid.any() else (np.nan, np.nan)
+
+        colorscale = ([[0, 'rgb(94, 204, 244)'], [1, 'rgb(0, 0, 255)']] if description == 'color' else
+                      [[0, '#333333'], [1, '#808080']])
+        color_sequence = px.colors.sample_colorscale(colorscale,
+                                                     [i / max(len(labels) - 1, 1) for i in range(len(labels))])
+
+        traces = []
+        for code, category in enumerate(labels):
+            selected = valid & (categories == code)
+            if selected.any():
+                traces.append({'type': 'scatter',
+                               'x': x[selected],
+                               'y': y[selected],
+                               'mode': 'markers',
+                               'name': category,
+                               'marker': dict(color=color_sequence[code], size=9, opacity=0.8,
+                                              line=dict(width=0.3, color=title_color)),
+                               'hovertemplate': f'Task Duration Category={category}<br>'
+                                                f'Fixation Duration [sec.]=%{{x}}<br>{label}=%{{y}}<extra></extra>'})
+
+        return {'data': traces,
+                'layout': layout(current_theme,
+                                 margin=dict(l=50, r=30, t=50, b=50),
+                                 height=525,
+                                 title=title(f'<b>{map_label} {selected_city}:<br>'
+                                             f'Correlation between {label} and Fixation Duration</b>'),
+                                 xaxis=axis(10, range=[min_x - 0.07, max_x + 0.09], showticklabels=True,
+                                            showline=True, zeroline=False, zerolinewidth=0.2,
+                                            title=title('Fixation Duration [sec.]', 11)),
+                                 yaxis=axis(10, range=[min_y - 20, max_y + 20], showticklabels=True,
+                                            showline=True, zeroline=False, linewidth=0.2,
+                                            title=title(label, 11, standoff=0)),
+                                 legend=dict(orientation='h', font=dict(size=10),
+                                             title=title('Task Duration Category', 10)))}
 
     else:
-        fig = px.scatter()
-        return fig
+        df = dataset.fixations(['description', 'FixationDuration', feature])
+        filtered_df = df[df['description'] == description]
+
+        # Drop data where the selected feature is null
+        filtered_df = filtered_df.dropna(subset=['FixationDuration', feature])
+
+        # Fixed range for the Saccade Length, 99th percentile for the other features:
+        y_range = [0, 350]
+        if feature != 'SaccadeLength' and not filtered_df.empty:
+            y_range = [0, float(filtered_df[feature].quantile(0.99))]
+
+        # Density of the fixations of all cities (FixationDuration in seconds) as histogram2dcontour
+        return {'data': [{'type': 'histogram2dcontour',
+                          'x': filtered_df['FixationDuration'].to_numpy(dtype=float) / 1000,
+                          'y': filtered_df[feature].to_numpy(dtype=float),
+                          'coloraxis': 'coloraxis'}],
+                'layout': layout(current_theme,
+                                 coloraxis=dict(
+                                     colorscale='Blues' if description == 'color' else 'Greys',
+                                     colorbar=dict(title=title('Scatter Density', 10), tickfont=dict(size=10))),
+                                 margin=dict(l=50, r=30, t=50, b=50),
+                                 height=525,
+                                 title=title(f'<b>{map_label}s of all cities:<br>'
+                                             f'Correlation between {label} and Fixation Duration</b>'),
+                                 xaxis=axis(10, range=[0.07, 0.6], showticklabels=True, showline=False,
+                                            zeroline=False, zerolinewidth=0.2,
+                                            title=title('Fixation Duration [sec.]', 11)),
+                                 yaxis=axis(10, range=y_range, showticklabels=True, showline=False,
+                                            zeroline=False, zerolinewidth=0.2, title=title(label, 11)))}
+
+
+@app.callback(
+    Output('scatter_correlation_color', 'figure'),
+    [Input('city_dropdown', 'value'),
+     Input('current_theme', 'data'),
+     Input('saccade_feature', 'value'),
+     Input('duration_scheme', 'value'),
+     Input('duration_edges', 'value'),
+     Input('study_dropdown', 'value')]
+)
+@binary_figures
+def update_scatter_correlation_color(selected_city, current_theme, saccade_feature, duration_scheme,
+                                     duration_edges_text, study_id):
+    # Y-axis: Saccade Length of the data file or one of the precomputed saccade features
+    feature = saccade_feature if saccade_feature in correlation_features else 'SaccadeLength'
+    return create_scatter_correlation(study_snapshot(study_id).dataset, selected_city, 'color', feature,
+                                      duration_scheme, duration_edges_text, current_theme)
 
 """
 -----------------------------------------------------------------------------------------
@@ -1642,150 +1205,451 @@ Section 4:
 """
 @app.callback(
     Output('scatter_correlation_grey', 'figure'),
-    [Input('active-button', 'data'),
-     Input('city_dropdown', 'value'),
-    Input('current_theme', 'data')]
+    [Input('city_dropdown', 'value'),
+    Input('current_theme', 'data'),
+     Input('saccade_feature', 'value'),
+     Input('duration_scheme', 'value'),
+     Input('duration_edges', 'value'),
+     Input('study_dropdown', 'value')]
 )
-def update_scatter_correlation_grey(active_button, selected_city, current_theme):
-    if active_button == 'scatter_plot':
-        # Set title color based on theme
-        title_color = 'black' if current_theme == 'light' else 'white'
-
-        if selected_city:
-            filtered_df = df[(df['CityMap'] == selected_city) & (df['description'] == 'grey')]
-            title = (f'<b>Greyscale Map {selected_city}:<br>'
-                     f'Correlation between Saccade Length and Fixation Duration</b>')
-
-            # Drop data where 'SaccadeLength' is null
-            filtered_df = filtered_df.dropna(subset=['FixationDuration', 'SaccadeLength'])
-
-            # Convert FixationDuration to seconds
-            filtered_df['FixationDuration'] = filtered_df['FixationDuration'] / 1000
-
-            min_x = filtered_df['FixationDuration'].min()
-            max_x = filtered_df['FixationDuration'].max()
-            min_y = filtered_df['SaccadeLength'].min()
-            max_y = filtered_df['SaccadeLength'].max()
-
-            color_sequence = ['#333333', 'grey']
-
-            fig = px.scatter(filtered_df,
-                             x='FixationDuration',
-                             y='SaccadeLength',
-                             category_orders={'TaskDurationCategory': ['<10 sec.', '>=10 sec.']},
-                             color='TaskDurationCategory',
-                             color_discrete_sequence=color_sequence,
-                             labels={'FixationDuration': 'Fixation Duration [sec.]',
-                                     'SaccadeLength': 'Saccade Length',
-                                     'TaskDurationCategory': 'Task Duration Category'})
-
-            fig.update_traces(marker=dict(size=9,
-                                          opacity=0.8,
-                                          line=dict(width=0.3, color=title_color))
-                              )
-
-            fig.update_layout(
-                plot_bgcolor='rgba(0, 0, 0, 0)',
-                paper_bgcolor='rgba(0, 0, 0, 0)',
-                margin=dict(l=50, r=30, t=50, b=50),
-                height=525,
-                title=dict(text=title,
-                           font=dict(size=12, family='Arial, sans-serif', color=title_color)),
-                yaxis_title=dict(text='Saccade Length',
-                                 font=dict(size=11, family='Arial, sans-serif', color=title_color),
-                                 standoff=0),
-                xaxis_title=dict(text='Fixation Duration [sec.]',
-                                 font=dict(size=11, family='Arial, sans-serif', color=title_color)),
-                legend_title=dict(text='Task Duration Category',
-                                  font=dict(size=10, family='Arial, sans-serif', color=title_color)),
-                legend=dict(orientation='h',
-                            font=dict(size=10, family='Arial, sans-serif', color=title_color))
-            )
-
-            fig.update_xaxes(range=[min_x-0.07, max_x+0.09],
-                             showgrid=False,
-                             showticklabels=True,
-                             tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                             showline=True,
-                             zeroline=False,
-                             linecolor=title_color,
-                             zerolinewidth=0.2)
-
-            fig.update_yaxes(range=[min_y-20, max_y+20],
-                             showgrid=False,
-                             showticklabels=True,
-                             tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                             showline=True,
-                             zeroline=False,
-                             linecolor=title_color,
-                             linewidth=0.2)
-
-            return fig
+@binary_figures
+def update_scatter_correlation_grey(selected_city, current_theme, saccade_feature, duration_scheme,
+                                     duration_edges_text, study_id):
+    # Y-axis: Saccade Length of the data file or one of the precomputed saccade features
+    feature = saccade_feature if saccade_feature in correlation_features else 'SaccadeLength'
+    return create_scatter_correlation(study_snapshot(study_id).dataset, selected_city, 'grey', feature,
+                                      duration_scheme, duration_edges_text, current_theme)
+
+"""
+-----------------------------------------------------------------------------------------
+Section 4:
+4.11 - Definition of AOI-Metrics (Dwell Time, Fixation Count, Time to First Fixation, Revisits)
+"""
+def create_aoi_table(metrics, title):
+    return dash_table.DataTable(
+        columns=[
+            {"name": title, "id": "AOI"},
+            {"name": "Dwell Time", "id": "DwellTime"},
+            {"name": "Fixations", "id": "FixationCount"},
+            {"name": "Time to 1st Fix.", "id": "TimeToFirstFixation"},
+            {"name": "Revisits", "id": "Revisits"},
+            {"name": "Sessions", "id": "Sessions"}
+        ],
+        data=[
+            {"AOI": row['AOI'],
+             "DwellTime": f"{row['DwellTime']:.2f} sec.",
+             "FixationCount": f"{row['FixationCount']:.1f}",
+             "TimeToFirstFixation": f"{row['TimeToFirstFixation']:.2f} sec.",
+             "Revisits": f"{row['Revisits']:.2f}",
+             "Sessions": f"{row['Sessions']}"}
+            for _, row in metrics.iterrows()
+        ],
+        style_cell={
+            'textAlign': 'left',
+            'padding': '4px',
+            'whiteSpace': 'nowrap',
+            'overflow': 'hidden',
+            'textOverflow': 'ellipsis',
+            'font': 'normal 10px Arial'
+        },
+        style_header={
+            'backgroundColor': '#000000',
+            'color': 'white',
+            'textAlign': 'left',
+            'padding': '4px',
+            'font': 'normal 10px Arial'
+        },
+        style_data_conditional=[
+            {
+                'if': {'row_index': 'even'},
+                'backgroundColor': '#E6E6E6',
+                'color': 'black',},
+            {
+                'if': {'row_index': 'odd'},
+                'backgroundColor': '#CBCBCB',
+                'color': 'black',},
+        ]
+    )
+
 
+@app.callback(
+    [Output('aoi_table_color', 'children'),
+     Output('aoi_table_grey', 'children')],
+    [Input('city_dropdown', 'value'),
+     Input('aoi_store', 'data'),
+     Input('study_dropdown', 'value')]
+)
+def update_aoi_tables(selected_city, aoi_version, study_id):
+    snapshot = study_snapshot(study_id)
+    if not selected_city:
+        return html.P('Select a City Map to define AOIs.'), html.P('Select a City Map to define AOIs.')
+
+    tables = []
+    for description, label in [('color', 'Color Map'), ('grey', 'Greyscale Map')]:
+        metrics = snapshot.aoi_engine.metrics(selected_city, description)
+        if metrics.empty:
+            tables.append(html.P(f'No AOIs defined for the {label} yet. '
+                                 f'Draw rectangles or closed paths on the map above.'))
         else:
-            filtered_df = df[df['description'] == 'grey']
-
-            # Drop data where 'SaccadeLength' is null
-            filtered_df = filtered_df.dropna(subset=['FixationDuration', 'SaccadeLength'])
-
-            # Convert FixationDuration to seconds
-            filtered_df['FixationDuration'] = filtered_df['FixationDuration'] / 1000
-
-            # Create a histogram2dcontour plot
-            fig = go.Figure(go.Histogram2dContour(
-                x=filtered_df['FixationDuration'],
-                y=filtered_df['SaccadeLength'],
-                coloraxis='coloraxis')
-            )
-
-            fig.update_layout(
-                coloraxis=dict(
-                    colorscale='Greys',
-                    colorbar=dict(
-                        title='Scatter Density',
-                        tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                        titlefont=dict(color=title_color, size=10, family='Arial, sans-serif')))
-            )
-
-            fig.update_layout(
-                plot_bgcolor='rgba(0, 0, 0, 0)',
-                paper_bgcolor='rgba(0, 0, 0, 0)',
-                margin=dict(l=50, r=30, t=50, b=50),
-                height=525,
-                title=dict(text=f'<b>Greyscale Maps of all cities:<br>'
-                           f'Correlation between Saccade Length and Fixation Duration</b>',
-                           font=dict(size=12, family='Arial, sans-serif', color=title_color)),
-                xaxis_title=dict(text='Fixation Duration [sec.]',
-                                 font=dict(size=11, family='Arial, sans-serif', color=title_color)),
-                yaxis_title=dict(text='Saccade Length',
-                                 font=dict(size=11, family='Arial, sans-serif', color=title_color))
-            )
-
-            fig.update_xaxes(range=[0.07, 0.6],
-                             showgrid=False,
-                             showticklabels=True,
-                             tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                             showline=False,
-                             zeroline=True,
-                             zerolinecolor=title_color,
-                             linecolor=title_color,
-                             zerolinewidth=0.2)
-
-            fig.update_yaxes(range= [0, 350],
-                             showgrid=False,
-                             showticklabels=True,
-                             tickfont=dict(color=title_color, size=10, family='Arial, sans-serif'),
-                             showline=False,
-                             zeroline=False,
-                             zerolinecolor=title_color,
-                             linecolor=title_color,
-                             zerolinewidth=0.2)
-
-            return fig
+            tables.append(create_aoi_table(metrics, f'AOIs {label} {selected_city}'))
+    return tables
+
+"""
+-----------------------------------------------------------------------------------------
+Section 4:
+4.12 - Definition of AOI-Transition Matrix (incl. Stationary and Transition Entropy)
+"""
+def create_transition_matrix(snapshot, selected_city, description, current_theme):
+    label = 'Color Map' if description == 'color' else 'Greyscale Map'
+    matrix = snapshot.transitions.matrix(selected_city, description)
+
+    if matrix is None:
+        return message_figure(current_theme, f'No AOI transitions for the {label} available.', height=300, size=12)
+
+    names = [aoi['name'] or f'AOI {k + 1}' for k, aoi in enumerate(snapshot.aoi_engine.aois(selected_city, description))]
+    summary = snapshot.transitions.summary(selected_city, description)
+    colorscale = 'Blues' if description == 'color' else 'Greys'
+
+    return {'data': [matrix_trace(names, matrix, colorscale, 'from %{y} to %{x}: %{z}<extra></extra>',
+                                  text=matrix, texttemplate='%{text}', showscale=False)],
+            'layout': layout(current_theme,
+                             title=title(f'<b>AOI Transitions {label} {selected_city}</b><br>'
+                                         f'Stationary Entropy: {summary["StationaryEntropy"]:.2f} bit, '
+                                         f'Transition Entropy: {summary["TransitionEntropy"]:.2f} bit'),
+                             xaxis=axis(9, title=title('to AOI', 10)),
+                             yaxis=axis(9, title=title('from AOI', 10), autorange='reversed'),
+                             margin=dict(l=5, r=5, t=60, b=5),
+                             height=300)}
+
+
+@app.callback(
+    [Output('transition_matrix_color', 'figure'),
+     Output('transition_matrix_grey', 'figure')],
+    [Input('city_dropdown', 'value'),
+     Input('aoi_store', 'data'),
+     Input('current_theme', 'data'),
+     Input('study_dropdown', 'value')]
+)
+@binary_figures
+def update_transition_matrices(selected_city, aoi_version, current_theme, study_id):
+    snapshot = study_snapshot(study_id)
+    return (create_transition_matrix(snapshot, selected_city, 'color', current_theme),
+            create_transition_matrix(snapshot, selected_city, 'grey', current_theme))
+
+"""
+-----------------------------------------------------------------------------------------
+Section 4:
+4.13 - Definition of Scanpath-Similarity Matrix (clustered, pairwise between all Users of a stimulus)
+"""
+def create_similarity_matrix(snapshot, selected_city, description, method, current_theme):
+    label = 'Color Map' if description == 'color' else 'Greyscale Map'
+    get_image_path = get_image_path_color if description == 'color' else get_image_path_grey
+    image_path, width, height = get_image_path(snapshot, selected_city) if selected_city else (None, None, None)
+
+    if not (image_path and width and height):
+        return message_figure(current_theme,
+                              f"No City Map selected.<br><br>"
+                              f"To compare the <b>Scanpaths</b> of all users on a specific map,<br>"
+                              f"please select a city from the dropdown on the left.",
+                              height=525)
+    if method == 'aoi' and not snapshot.aoi_engine.aois(selected_city, description):
+        return message_figure(current_theme,
+                              f"No AOIs defined for the {label} yet.<br><br>"
+                              f"Draw rectangles or closed paths on the gaze plot<br>"
+                              f"or choose another comparison method.",
+                              height=525)
+
+    users, matrix = snapshot.similarity.matrix(selected_city, description, method, width, height)
+    # Undefined if no pair of sessions can be compared (e.g. no fixation in an AOI)
+    mean = mean_similarity(matrix)
+    mean_text = f'{mean:.2f}' if pd.notna(mean) else 'n/a'
+    order = cluster_order(matrix)
+    users = [users[i] for i in order]
+    colorscale = 'Blues' if description == 'color' else 'Greys'
+
+    return {'data': [matrix_trace(users, matrix[order][:, order], colorscale,
+                                  '%{y} vs. %{x}: %{z:.2f}<extra></extra>',
+                                  zmin=0, zmax=1, colorbar=colorbar(current_theme, 'Similarity'))],
+            'layout': layout(current_theme,
+                             title=title(f'<b>Scanpath Similarity {label} {selected_city}</b><br>'
+                                         f'{similarity_methods[method]}, Mean Similarity: {mean_text}'),
+                             xaxis=axis(9),
+                             yaxis=axis(9, autorange='reversed'),
+                             margin=dict(l=5, r=5, t=60, b=5),
+                             height=525)}
+
+
+@app.callback(
+    [Output('similarity_matrix_color', 'figure'),
+     Output('similarity_matrix_grey', 'figure')],
+    [Input('city_dropdown', 'value'),
+     Input('similarity_method', 'value'),
+     Input('aoi_store', 'data'),
+     Input('current_theme', 'data'),
+     Input('study_dropdown', 'value')]
+)
+@binary_figures
+def update_similarity_matrices(selected_city, method, aoi_version, current_theme, study_id):
+    method = method or 'grid'
+    snapshot = study_snapshot(study_id)
+    return (create_similarity_matrix(snapshot, selected_city, 'color', method, current_theme),
+            create_similarity_matrix(snapshot, selected_city, 'grey', method, current_theme))
 
+"""
+-----------------------------------------------------------------------------------------
+Section 4:
+4.14 - Definition of Saccade Distribution Plots (Amplitude, Direction, Inter-Fixation Time, Velocity)
+"""
+def create_saccade_distribution(dataset, selected_city, description, feature, current_theme):
+    bar_color = 'rgba(0, 0, 255, 1)' if description == 'color' else 'grey'
+    label = 'Color Map' if description == 'color' else 'Greyscale Map'
+
+    # The features are columns of the prepared data; only the histogram is computed per request:
+    if selected_city:
+        filtered_df = dataset.stimulus_frame(selected_city, description)
+        scope = f'{label} {selected_city}'
     else:
-        fig = px.scatter()
-        return fig
+        df = dataset.fixations(['description', feature, 'Backtrack'])
+        filtered_df = df[df['description'] == description]
+        scope = f'{label}s of all cities'
+    values = filtered_df[feature].to_numpy(dtype=float)
+    values = values[np.isfinite(values)]
+    backtracks = filtered_df['Backtrack'].mean()
+
+    title_text = f'<b>{scope}:<br>Distribution of {feature_label(feature)}</b>'
+    if pd.notna(backtracks):
+        title_text += f'<br>Backtracks: {backtracks:.0%}'
+    figure_layout = layout(current_theme,
+                           title=title(title_text),
+                           margin=dict(l=50, r=30, t=80, b=50),
+                           height=525)
+
+    if feature == 'SaccadeAngle':
+        # Direction in 24 sectors of 15°, 0° = to the right, counterclockwise:
+        counts, edges = np.histogram(values, bins=24, range=(-180, 180))
+        trace = {'type': 'barpolar', 'r': counts, 'theta': (edges[:-1] + edges[1:]) / 2, 'width': 15,
+                 'marker': {'color': bar_color}, 'hovertemplate': '%{theta:.0f}°: %{r} saccades<extra></extra>'}
+        figure_layout['polar'] = {'angularaxis': axis(10), 'radialaxis': axis(9)}
+    else:
+        # Up to the 99th percentile, so single outliers do not compress the distribution:
+        upper = np.percentile(values, 99) if len(values) else 1
+        counts, edges = np.histogram(values, bins=40, range=(0, upper or 1))
+        trace = {'type': 'bar', 'x': (edges[:-1] + edges[1:]) / 2, 'y': counts, 'width': edges[1] - edges[0],
+                 'marker': {'color': bar_color}, 'hovertemplate': '%{x:.0f}: %{y} saccades<extra></extra>'}
+        figure_layout.update(xaxis=axis(10, title=title(feature_label(feature), 11), showline=True),
+                             yaxis=axis(10, title=title('Saccades', 11), showline=True))
+    return {'data': [trace], 'layout': figure_layout}
+
+
+@app.callback(
+    [Output('saccade_distribution_color', 'figure'),
+     Output('saccade_distribution_grey', 'figure')],
+    [Input('city_dropdown', 'value'),
+     Input('saccade_feature', 'value'),
+     Input('current_theme', 'data'),
+     Input('study_dropdown', 'value')]
+)
+@binary_figures
+def update_saccade_distributions(selected_city, saccade_feature, current_theme, study_id):
+    feature = saccade_feature if saccade_feature in distribution_features else 'SaccadeAmplitude'
+    dataset = study_snapshot(study_id).dataset
+    return (create_saccade_distribution(dataset, selected_city, 'color', feature, current_theme),
+            create_saccade_distribution(dataset, selected_city, 'grey', feature, current_theme))
+
+"""
+-----------------------------------------------------------------------------------------
+Section 4:
+4.15 - Clientside Filter Mode (data bundle per stimulus, filtered in the browser)
+"""
+def filter_bundle(snapshot, selected_city, description, gaze_figure, heat_figure):
+    # Base figures (layout, image, AOIs; the gaze traces are rebuilt in the browser) and the compact stimulus data
+    bundle = {'gaze_figure': dict(encode_figure(gaze_figure), data=[]), 'heat_figure': encode_figure(heat_figure)}
+    if selected_city:
+        _, width, height = stimulus_frame(snapshot, selected_city, description)
+        sessions = snapshot.dataset.stimulus_sessions(selected_city, description)
+        colors = px.colors.qualitative.Plotly
+        color_map = {user: colors[i % len(colors)] for i, user in enumerate(snapshot.dataset.users)}
+        bundle['key'] = f'{snapshot.version}/{selected_city}/{description}/{id(snapshot)}'
+        bundle['data'] = stimulus_bundle(snapshot.dataset.stimulus_frame(selected_city, description), sessions,
+                                         snapshot.dataset.density_grid(selected_city, description),
+                                         width, height)
+        bundle['data']['colors'] = [color_map.get(user, colors[0]) for user in sessions['users']]
+    return bundle
+
+if clientside_filters:
+    @app.callback(
+        [Output('filter_bundle_color', 'data'),
+         Output('filter_bundle_grey', 'data')],
+        [Input('city_dropdown', 'value'),
+         Input('current_theme', 'data'),
+         Input('aoi_store', 'data'),
+         Input('study_dropdown', 'value')]
+    )
+    def update_filter_bundles(selected_city, current_theme, aoi_version, study_id):
+        # Sent once per city selection (and theme, AOI or data change) while a view with the gaze plots or heat maps
+        # is shown (the stores are mounted with these views only); the filters do not reach the server
+        snapshot = study_snapshot(study_id)
+        return [filter_bundle(snapshot, selected_city, 'color',
+                              update_scatter_plot_color(selected_city, None, None, current_theme, aoi_version, study_id),
+                              update_heatmap_color(selected_city, None, None, current_theme, study_id)),
+                filter_bundle(snapshot, selected_city, 'grey',
+                              update_scatter_plot_grey(selected_city, None, None, current_theme, aoi_version, study_id),
+                              update_heatmap_grey(selected_city, None, None, current_theme, study_id))]
+
+    for description in ['color', 'grey']:
+        app.clientside_callback(
+            ClientsideFunction(namespace='filters', function_name='gazePlot'),
+            Output(f'gaze_plot_{description}', 'figure'),
+            [Input(f'filter_bundle_{description}', 'data'),
+             Input(f'dropdown_user_{description}', 'value'),
+             Input(f'range_slider_{description}', 'value')])
+        app.clientside_callback(
+            ClientsideFunction(namespace='filters', function_name='heatMap'),
+            Output(f'heat_map_{description}', 'figure'),
+            [Input(f'filter_bundle_{description}', 'data'),
+             Input(f'dropdown_user_{description}', 'value'),
+             Input(f'range_slider_{description}', 'value')])
+
+"""
+-----------------------------------------------------------------------------------------
+Section 4:
+4.16 - Deep-Zoom Background (tiles of the visible area at the zoom level of the gaze plots and heat maps)
+"""
+def zoom_ranges(relayout_data):
+    # Visible x and y range after a zoom/pan (None: whole axis, e.g. reset), None without a change of the axes
+    ranges = {}
+    for axis_name in ['xaxis', 'yaxis']:
+        if f'{axis_name}.range[0]' in relayout_data and f'{axis_name}.range[1]' in relayout_data:
+            ranges[axis_name] = [relayout_data[f'{axis_name}.range[0]'], relayout_data[f'{axis_name}.range[1]']]
+        elif f'{axis_name}.range' in relayout_data:
+            ranges[axis_name] = relayout_data[f'{axis_name}.range']
+        elif relayout_data.get(f'{axis_name}.autorange'):
+            ranges[axis_name] = None
+    if not ranges:
+        return None
+    return ranges.get('xaxis'), ranges.get('yaxis')
+
+
+def register_zoom_tiles(graph_id, description):
+    # Replaces only the background images of the figure (partial update), the traces stay in the browser
+    @app.callback(
+        Output(graph_id, 'figure', allow_duplicate=True),
+        Input(graph_id, 'relayoutData'),
+        [State('city_dropdown', 'value'),
+         State('study_dropdown', 'value')],
+        prevent_initial_call=True
+    )
+    def update_zoom_tiles(relayout_data, selected_city, study_id):
+        ranges = zoom_ranges(relayout_data or {})
+        if not selected_city or ranges is None:
+            return no_update
+        figure = Patch()
+        figure['layout']['images'] = background_images(study_snapshot(study_id), selected_city, description, *ranges)
+        return figure
+
+for description in ['color', 'grey']:
+    register_zoom_tiles(f'gaze_plot_{description}', description)
+    register_zoom_tiles(f'heat_map_{description}', description)
+
+"""
+-----------------------------------------------------------------------------------------
+Section 5:
+Data Administration (append new sessions and reload the data without server restart)
+"""
+# The admin routes are disabled unless the environment variable DASHBOARD_ADMIN_TOKEN is set;
+# requests send the token in the header 'X-Admin-Token' and select the study with '?study=<id>' (default study).
+def admin_authorized():
+    token = os.environ.get('DASHBOARD_ADMIN_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+# 5.1 - Admin route: POST a ';'-separated session file as 'file'.
+@app.server.route('/admin/ingest', methods=['POST'])
+def admin_ingest():
+    if not admin_authorized():
+        return jsonify(error='forbidden'), 403
+    if catalog.study(request.args.get('study')) is None:
+        return jsonify(error='unknown study'), 404
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify(error='no file uploaded'), 400
+    store = catalog.store(request.args.get('study'))
+    try:
+        affected = store.append(pd.read_csv(upload, sep=';'))
+    except (ValueError, pd.errors.ParserError) as error:
+        return jsonify(error=str(error)), 400
+    return jsonify(stimuli=[f'{city_map} ({description})' for city_map, description in sorted(affected)],
+                   sessions=len(store.current().sessions))
+
+# 5.2 - Drop directories: new session files in 'incoming' (default study) or 'incoming/<study>' are appended
+# within seconds while the study is loaded. Watching starts with the first request, so only the serving
+# process watches the directories.
+@app.server.before_request
+def start_drop_directory_watchers():
+    if not catalog.watching:
+        catalog.start_watchers()
+
+# 5.3 - Reload route: POST rebuilds the data (data file, calibration, appended sessions) in the background.
+# Requests are served from the current snapshot until the new one is published; GET reports the state.
+@app.server.route('/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    if not admin_authorized():
+        return jsonify(error='forbidden'), 403
+    study = catalog.study(request.args.get('study'))
+    if study is None:
+        return jsonify(error='unknown study'), 404
+    store = catalog.store(study.study_id)
+    started = request.method == 'POST' and store.reload(study.load_dataset) is not None
+    return jsonify(started=started, reloading=store.reloading, version=store.current().version,
+                   error=store.last_error), 202 if started else 200
+
+# 5.4 - Stimulus images by content hash ('stimulus-images/<study>/<hash>.jpg', registered images only): cached
+# forever by browsers and proxies (immutable, ETag = hash), with conditional and range requests
+@app.server.route('/stimulus-images/<study_id>/<filename>')
+def stimulus_image(study_id, filename):
+    study = catalog.study(study_id)
+    path = study.image_file(filename) if study is not None else None
+    if path is None:
+        abort(404)
+    response = send_file(os.path.abspath(path), etag=os.path.splitext(filename)[0], max_age=365 * 24 * 3600,
+                         conditional=True)
+    response.cache_control.immutable = True
+    response.accept_ranges = 'bytes'
+    return response
+
+# 5.5 - Deep-zoom tiles ('stimulus-tiles/<study>/<hash>/<level>/<column>_<row>.jpg'): the content hash of the image
+# is part of the URL, so the tiles are cached forever like the images
+@app.server.route('/stimulus-tiles/<study_id>/<image_hash>/<int:level>/<filename>')
+def stimulus_tile(study_id, image_hash, level, filename):
+    study = catalog.study(study_id)
+    image = study.registered_image(image_hash) if study is not None else None
+    path = tile_pyramids.tile_file(image, level, filename) if image is not None else None
+    if path is None:
+        abort(404)
+    response = send_file(os.path.abspath(path), etag=f'{image_hash}-{level}-{os.path.splitext(filename)[0]}',
+                         max_age=365 * 24 * 3600, conditional=True)
+    response.cache_control.immutable = True
+    return response
+
+# 5.6 - Callback fan-out: GET returns the callback requests per trigger (e.g. 'city_dropdown.value') and output since the
+# start or the last POST (reset); shows which callbacks an interaction runs (only those of the visible view, see 3.3.1)
+callback_fanout = count_callbacks(app)
+
+@app.server.route('/admin/fanout', methods=['GET', 'POST'])
+def admin_fanout():
+    if not admin_authorized():
+        return jsonify(error='forbidden'), 403
+    if request.method == 'POST':
+        callback_fanout.reset()
+    return jsonify(callback_fanout.report())
+
+"""
+-----------------------------------------------------------------------------------------
+Section 6:
+Delivery (compressed responses and static assets)
+"""
+# Callback responses above 1.4 kB are compressed (brotli if installed and accepted by the browser, else gzip);
+# CSS/JS of the assets folder are compressed once at startup and referenced with their content hash (immutable caching).
+static_assets = enable_compression(app, 'assets')
 
 if __name__ == '__main__':
     app.run_server(debug=True)
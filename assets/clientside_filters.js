@@ -0,0 +1,137 @@
+/* ------------------- */
+/* Clientside filter mode (DASHBOARD_CLIENTSIDE_FILTERS=1): user and task duration filters of the gaze plots and
+   heat maps run in the browser on the data bundle of the selected stimulus (client_bundle.py), without a request */
+(function () {
+    var typedArrays = {uint16: Uint16Array, uint32: Uint32Array, float64: Float64Array};
+    var decoded = {};
+
+    function decode(array) {
+        var binary = window.atob(array.data);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new typedArrays[array.dtype](bytes.buffer);
+    }
+
+    // Decoded arrays of the bundles (color and grey map of the selected stimulus and snapshot version)
+    function arrays(bundle) {
+        if (!decoded[bundle.key]) {
+            var data = bundle.data;
+            if (Object.keys(decoded).length >= 4) {
+                decoded = {};
+            }
+            decoded[bundle.key] = {
+                taskDurations: decode(data.task_durations),
+                session: decode(data.session),
+                x: decode(data.x),
+                y: decode(data.y),
+                duration: decode(data.duration),
+                gridSessions: data.grids ? decode(data.grid_sessions) : null,
+                grids: data.grids ? decode(data.grids) : null
+            };
+        }
+        return decoded[bundle.key];
+    }
+
+    // Sessions matching the user selection and the task duration range (same rules as the filter index)
+    function selectedSessions(bundle, taskDurations, users, range) {
+        if (typeof users === 'string') {
+            users = [users];
+        }
+        var selected = new Uint8Array(bundle.data.users.length);
+        for (var s = 0; s < selected.length; s++) {
+            var userMatch = !users || users.length === 0 || users.indexOf(bundle.data.users[s]) >= 0;
+            var durationMatch = !range || (taskDurations[s] >= range[0] && taskDurations[s] <= range[1]);
+            selected[s] = userMatch && durationMatch ? 1 : 0;
+        }
+        return selected;
+    }
+
+    function gazePlot(bundle, users, range) {
+        if (!bundle) {
+            return window.dash_clientside.no_update;
+        }
+        if (!bundle.data) {
+            return bundle.gaze_figure;
+        }
+        var data = bundle.data;
+        var values = arrays(bundle);
+        var selected = selectedSessions(bundle, values.taskDurations, users, range);
+
+        // Fixations per selected session (in recording order), coordinates and durations dequantized
+        var points = {};
+        var maxDuration = 0;
+        for (var i = 0; i < values.session.length; i++) {
+            var s = values.session[i];
+            if (!selected[s]) {
+                continue;
+            }
+            if (!points[s]) {
+                points[s] = {x: [], y: [], size: []};
+            }
+            points[s].x.push(values.x[i] * data.x_step);
+            points[s].y.push(values.y[i] * data.y_step);
+            points[s].size.push(values.duration[i]);
+            maxDuration = Math.max(maxDuration, values.duration[i]);
+        }
+
+        // Fixation markers per user (size by FixationDuration, as in the server figure), then the scan paths
+        var markers = [];
+        var lines = [];
+        var sizeref = maxDuration > 0 ? 2 * maxDuration / (20 * 20) : 1;
+        for (var session = 0; session < data.users.length; session++) {
+            if (!points[session]) {
+                continue;
+            }
+            var user = data.users[session];
+            var color = data.colors[session];
+            markers.push({
+                type: 'scatter', mode: 'markers', name: user, legendgroup: user, showlegend: true,
+                x: points[session].x, y: points[session].y,
+                marker: {color: color, size: points[session].size, sizemode: 'area', sizeref: sizeref},
+                hovertemplate: 'user=' + user + '<br>FixationDuration (ms)=%{marker.size}<br>' +
+                    'Task Duration (sec)=' + values.taskDurations[session].toFixed(3) + '<extra></extra>'
+            });
+            lines.push({
+                type: 'scatter', mode: 'lines', name: 'Scanpath for ' + user,
+                x: points[session].x, y: points[session].y,
+                line: {width: 2, color: color}, hoverinfo: 'skip'
+            });
+        }
+        return {data: markers.concat(lines), layout: bundle.gaze_figure.layout};
+    }
+
+    function heatMap(bundle, users, range) {
+        if (!bundle) {
+            return window.dash_clientside.no_update;
+        }
+        if (!bundle.data || !bundle.data.grids) {
+            return bundle.heat_figure;
+        }
+        var values = arrays(bundle);
+        var selected = selectedSessions(bundle, values.taskDurations, users, range);
+        var bins = bundle.data.bins;
+        var cells = bins * bins;
+
+        // Sum of the density grids of the selected sessions
+        var z = [];
+        for (var row = 0; row < bins; row++) {
+            z.push(new Array(bins).fill(0));
+        }
+        for (var g = 0; g < values.gridSessions.length; g++) {
+            if (!selected[values.gridSessions[g]]) {
+                continue;
+            }
+            for (var cell = 0; cell < cells; cell++) {
+                z[Math.floor(cell / bins)][cell % bins] += values.grids[g * cells + cell];
+            }
+        }
+        var trace = Object.assign({}, bundle.heat_figure.data[0], {z: z});
+        return {data: [trace], layout: bundle.heat_figure.layout};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        filters: {gazePlot: gazePlot, heatMap: heatMap}
+    });
+})();
@@ -0,0 +1,50 @@
+import threading
+from flask import request
+
+"""
+-----------------------------------------------------------------------------------------
+Callback-Fan-Out:
+Counts the callback requests of the browser per trigger (changed property, 'initial' for the calls on page load and
+when a view is mounted) and output, to check that an interaction only runs the callbacks of the visible view
+"""
+callback_path = '/_dash-update-component'
+
+
+class FanOutCounter:
+    # trigger -> output -> number of callback requests
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, trigger, output):
+        with self._lock:
+            outputs = self.counts.setdefault(trigger, {})
+            outputs[output] = outputs.get(output, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+
+    def report(self):
+        # Number of callbacks per trigger, with the outputs they updated
+        with self._lock:
+            return {trigger: {'callbacks': sum(outputs.values()), 'outputs': dict(sorted(outputs.items()))}
+                    for trigger, outputs in sorted(self.counts.items())}
+
+
+def count_callbacks(app):
+    # before_request hook on the Flask server of the Dash app; the parsed request body is cached for the callback
+    counter = FanOutCounter()
+    path = app.config.routes_pathname_prefix.rstrip('/') + callback_path
+
+    @app.server.before_request
+    def count_callback_request():
+        if request.method != 'POST' or request.path != path:
+            return
+        body = request.get_json(silent=True) or {}
+        # Outputs with allow_duplicate carry a hash suffix ('figure@<hash>')
+        output = '.'.join(part.split('@')[0] for part in str(body.get('output', '')).split('.'))
+        for trigger in body.get('changedPropIds') or ['initial']:
+            counter.record(trigger, output)
+
+    return counter
@@ -0,0 +1,194 @@
+import glob
+import json
+import os
+import threading
+import time
+import pandas as pd
+from aoi import aoi_path, load_aoi_file
+from dataset import Dataset, PartitionedDataset
+from ingest import incoming_dir, partition_dir, read_partition_store, watch_drop_directory
+from scanpath_similarity import similarity_cache_dir
+from snapshot import Snapshot, SnapshotStore
+from stimulus_registry import (build_image_registry, build_transform_registry, calibration_path, image_url,
+                               load_calibration, load_transform_overrides, transform_path)
+from tile_pyramid import tile_prefix
+from warm_start import load_warm_start, save_warm_start, source_hash, warm_start_dir
+
+"""
+-----------------------------------------------------------------------------------------
+Study-Catalog:
+Several eye-tracking studies in one dashboard, loaded on first access and evicted when idle
+"""
+# One manifest (JSON) per study in catalog_dir, the file name is the study id, all paths relative to the app:
+# {"name": "City Maps 2025", "data_path": "studies/citymaps_2025/fixations.csv",
+#  "assets_dir": "studies/citymaps_2025/images"}
+# data_path can also be a partition directory written by tracker_import.py.
+# Optional: calibration_path, transform_path, aoi_path (default: file of the same name in assets_dir),
+# incoming_dir, partition_dir, similarity_cache_dir, warm_start_path (default: per study below the common directories).
+catalog_dir = 'studies'
+default_study = 'default'
+# Default folder of the stimulus images (all images are served by the content-addressed stimulus-images route):
+dash_assets_dir = 'assets'
+
+
+class Study:
+    # Paths of one study and its snapshot store (opened lazily). Every study has its own image registry,
+    # AOI definitions, similarity cache, partitions and drop directory, so no cache is shared between studies.
+    def __init__(self, study_id, manifest, partition_cache=None):
+        self.study_id = study_id
+        self.name = manifest.get('name', study_id)
+        self.data_path = manifest['data_path']
+        self.assets_dir = manifest.get('assets_dir', dash_assets_dir)
+        self.calibration_path = manifest.get('calibration_path',
+                                             os.path.join(self.assets_dir, os.path.basename(calibration_path)))
+        self.transform_path = manifest.get('transform_path',
+                                           os.path.join(self.assets_dir, os.path.basename(transform_path)))
+        self.aoi_path = manifest.get('aoi_path', os.path.join(self.assets_dir, os.path.basename(aoi_path)))
+        self.incoming_dir = manifest.get('incoming_dir', os.path.join(incoming_dir, study_id))
+        self.partition_dir = manifest.get('partition_dir', os.path.join(partition_dir, study_id))
+        self.similarity_cache_dir = manifest.get('similarity_cache_dir', os.path.join(similarity_cache_dir, study_id))
+        self.warm_start_path = manifest.get('warm_start_path', os.path.join(warm_start_dir, f'{study_id}.pkl'))
+        self.partition_cache = partition_cache
+        self.stimulus_images = None
+        self.stimulus_transforms = None
+        self.store = None
+        self.last_access = 0.0
+        self._watcher_stop = None
+        self._lock = threading.Lock()
+
+    def build_dataset(self):
+        # Data file plus the sessions appended so far (incoming/processed), also used for reloads
+        calibration = load_calibration(self.calibration_path)
+        if self.partition_cache is not None:
+            dataset = PartitionedDataset.build(self.data_path, self.stimulus_images, calibration,
+                                               self.stimulus_transforms, self.partition_cache, self.partition_dir)
+        else:
+            fixations = read_partition_store(self.data_path) if os.path.isdir(self.data_path) else \
+                pd.read_csv(self.data_path, sep=';')
+            dataset = Dataset.build(fixations, self.stimulus_images, calibration, self.stimulus_transforms)
+        for path in sorted(glob.glob(os.path.join(self.incoming_dir, 'processed', '*.csv'))):
+            try:
+                dataset, _ = dataset.append(pd.read_csv(path, sep=';'))
+            except ValueError:  # sessions already contained in the data file
+                pass
+        return dataset
+
+    def load_dataset(self):
+        # Restores the prepared dataset (with image and transform registry) from the warm-start file while data,
+        # calibration, transforms, appended sessions, images and preparation code are unchanged; otherwise
+        # builds it and writes a new warm-start file. The partitioned mode already restarts from its partitions.
+        if self.partition_cache is not None:
+            self.build_registries()
+            return self.build_dataset()
+        processed = sorted(glob.glob(os.path.join(self.incoming_dir, 'processed', '*.csv')))
+        data_files = sorted(glob.glob(os.path.join(self.data_path, '*'))) if os.path.isdir(self.data_path) else \
+            [self.data_path]
+        data_hash = source_hash(data_files + [self.calibration_path, self.transform_path] + processed, self.assets_dir)
+        dataset = load_warm_start(self.warm_start_path, data_hash)
+        if dataset is not None:
+            self.stimulus_images = dataset.stimulus_images
+            self.stimulus_transforms = dataset.stimulus_transforms
+            return dataset
+        self.build_registries()
+        dataset = self.build_dataset()
+        save_warm_start(dataset, self.warm_start_path, data_hash)
+        return dataset
+
+    def build_registries(self):
+        self.stimulus_images = build_image_registry(self.assets_dir)
+        for image in self.stimulus_images.values():
+            image['url'] = image_url(self.study_id, image)
+            image['tiles'] = tile_prefix(self.study_id, image)
+        self.stimulus_transforms = build_transform_registry(self.stimulus_images,
+                                                            load_transform_overrides(self.transform_path))
+
+    def open(self, watch=False):
+        # Loads the study on first access; concurrent first requests wait for the same load. Once loaded (and watched
+        # if requested) the store is returned without taking the lock, read once in case the study is evicted meanwhile
+        store = self.store
+        if store is not None and (not watch or self._watcher_stop is not None):
+            self.last_access = time.monotonic()
+            return store
+        with self._lock:
+            if self.store is None:
+                snapshot = Snapshot.create(self.load_dataset(), load_aoi_file(self.aoi_path),
+                                           cache_dir=self.similarity_cache_dir)
+                self.store = SnapshotStore(snapshot.warm())
+            if watch and self._watcher_stop is None:
+                self._watcher_stop = threading.Event()
+                watch_drop_directory(self.store.append, self.incoming_dir, stop=self._watcher_stop)
+            self.last_access = time.monotonic()
+            return self.store
+
+    def close(self):
+        # Evicts the study; requests still running keep their snapshot
+        with self._lock:
+            if self._watcher_stop is not None:
+                self._watcher_stop.set()
+                self._watcher_stop = None
+            if self.store is not None:
+                self.store.close()
+                self.store = None
+
+    def image_file(self, filename):
+        # Path of a registered stimulus image by the file name of its URL (None if unknown); the registry is kept
+        # when the study is evicted, so cached pages can still load their images
+        for image in (self.stimulus_images or {}).values():
+            if image.get('url', '').rsplit('/', 1)[-1] == filename:
+                return image['path']
+        return None
+
+    def registered_image(self, image_hash):
+        # Registry entry of a stimulus image by its content hash (None if unknown)
+        return next((image for image in (self.stimulus_images or {}).values() if image['hash'] == image_hash), None)
+
+    @property
+    def loaded(self):
+        return self.store is not None
+
+
+class StudyCatalog:
+    # All studies by id; the default study is the data set of this repository
+    def __init__(self, studies, default_id=default_study, idle_timeout=30 * 60):
+        self.studies = studies
+        self.default_id = default_id
+        self.idle_timeout = idle_timeout
+        self.watching = False
+
+    @classmethod
+    def load(cls, default_manifest, directory=catalog_dir, partition_cache=None, idle_timeout=30 * 60):
+        manifests = {default_study: default_manifest}
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            with open(path, encoding='utf-8') as file:
+                manifests[os.path.splitext(os.path.basename(path))[0]] = json.load(file)
+        studies = {study_id: Study(study_id, manifest, partition_cache) for study_id, manifest in manifests.items()}
+        return cls(studies, idle_timeout=idle_timeout)
+
+    def __len__(self):
+        return len(self.studies)
+
+    def options(self):
+        return [{'label': study.name, 'value': study_id} for study_id, study in self.studies.items()]
+
+    def study(self, study_id):
+        return self.studies.get(study_id or self.default_id)
+
+    def store(self, study_id):
+        # Snapshot store of the study (unknown ids fall back to the default study); other idle studies are evicted
+        study = self.study(study_id) or self.studies[self.default_id]
+        store = study.open(watch=self.watching)
+        self.evict_idle(keep=study)
+        return store
+
+    def evict_idle(self, keep=None):
+        now = time.monotonic()
+        for study in self.studies.values():
+            if study is not keep and study.loaded and now - study.last_access > self.idle_timeout:
+                study.close()
+
+    def start_watchers(self):
+        # Drop directories are watched for the loaded studies (and for every study loaded later)
+        self.watching = True
+        for study in self.studies.values():
+            if study.loaded:
+                study.open(watch=True)
@@ -0,0 +1,54 @@
+import base64
+import numpy as np
+from quality import visible
+
+"""
+-----------------------------------------------------------------------------------------
+Client-Bundle:
+Compact data of one stimulus for the clientside filter mode: quantized typed arrays (base64) of the visible
+fixations, session users and task durations and the density grids per session
+(decoded and filtered in the browser by assets/clientside_filters.js)
+"""
+# Coordinates (S1 frame) are quantized to 1/65535 of the frame size (uint16, below 0.05 px on the City Map
+# images), fixation durations to whole ms (uint16, clipped at 65.5 sec.), density counts per grid cell to uint16
+coordinate_levels = 65535
+
+
+def typed_array(values, dtype):
+    # Little-endian typed array as base64 (decoded with atob into the matching JavaScript typed array)
+    values = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<'))
+    return {'dtype': np.dtype(dtype).name, 'data': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def quantize(values, maximum, levels=coordinate_levels):
+    step = (maximum or 1) / levels
+    return np.clip(np.round(np.nan_to_num(values) / step), 0, levels).astype(np.uint16), step
+
+
+def index_dtype(count):
+    return 'uint16' if count <= np.iinfo(np.uint16).max else 'uint32'
+
+
+def stimulus_bundle(frame, sessions, grid_entry, width, height):
+    # frame: fixations of the stimulus grouped by session, sessions: its session index (dataset.session_index)
+    shown = visible(frame['QualityFlags'].to_numpy())
+    session_codes = np.repeat(np.arange(len(sessions['users'])), sessions['counts'])[shown]
+    x, x_step = quantize(frame['S1FramePointX'].to_numpy(dtype=float)[shown], width)
+    y, y_step = quantize(frame['S1FramePointY'].to_numpy(dtype=float)[shown], height)
+    durations = np.clip(np.round(np.nan_to_num(frame['FixationDuration'].to_numpy(dtype=float)[shown])), 0, 65535)
+    bundle = {'users': [str(user) for user in sessions['users']],
+              # Exact task durations (float64), so the slider bounds select the same sessions as on the server
+              'task_durations': typed_array(sessions['task_durations'], 'float64'),
+              'session': typed_array(session_codes, index_dtype(len(sessions['users']))),
+              'x': typed_array(x, 'uint16'), 'x_step': x_step,
+              'y': typed_array(y, 'uint16'), 'y_step': y_step,
+              'duration': typed_array(durations, 'uint16')}
+    if grid_entry is not None:
+        # Grid rows belong to the sessions with visible fixations; their position in the session list:
+        users = np.asarray(bundle['users'])
+        order = np.argsort(users)
+        positions = order[np.searchsorted(users, grid_entry['users'].astype(str), sorter=order)]
+        bundle.update({'grid_sessions': typed_array(positions, index_dtype(len(users))),
+                       'grids': typed_array(np.clip(np.round(grid_entry['grids']), 0, 65535), 'uint16'),
+                       'bins': int(grid_entry['grids'].shape[-1])})
+    return bundle
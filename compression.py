@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # without brotli the responses are compressed with gzip only
+    brotli = None
+
+"""
+-----------------------------------------------------------------------------------------
+Compression:
+Compressed delivery of the dashboard: callback responses (figure JSON) above a size threshold are compressed per request
+(brotli if installed and accepted, else gzip); the CSS and JavaScript files of the assets folder are compressed once at
+startup and served with their content hash in the URL ('?h=<hash>') and immutable caching, the Dash component bundles
+(fingerprinted URLs) are compressed once when first served
+"""
+# Responses below one TCP packet are sent as they are:
+min_size = 1400
+compressible_types = {'application/json', 'text/html', 'text/css', 'application/javascript', 'text/javascript',
+                      'image/svg+xml'}
+static_suffixes = ('.css', '.js')
+# Compression levels: per request fast, once per static file the smallest result
+dynamic_levels = {'gzip': 6, 'br': 5}
+static_levels = {'gzip': 9, 'br': 11}
+immutable = 'public, max-age=31536000, immutable'
+
+
+def encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compress(data, encoding, levels):
+    if encoding == 'br':
+        return brotli.compress(data, quality=levels['br'])
+    return gzip.compress(data, compresslevel=levels['gzip'], mtime=0)
+
+
+def compressed_variants(data):
+    # Content hash and the precompressed bodies of a static file
+    variants = {'identity': data}
+    variants.update({encoding: compress(data, encoding, static_levels) for encoding in encodings()})
+    return {'hash': hashlib.sha256(data).hexdigest()[:16], 'variants': variants}
+
+
+class StaticAssets:
+    # Precompressed CSS/JS files of the assets folder (path relative to the folder -> hash and variants); a file changed
+    # on disk (modification time) is compressed again on its next request
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+        self._lock = threading.Lock()
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith(static_suffixes):
+                    self.entry(os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/'))
+
+    def entry(self, path):
+        full_path = os.path.join(self.directory, path)
+        if not path.endswith(static_suffixes) or not os.path.isfile(full_path):
+            return None
+        modified = os.path.getmtime(full_path)
+        with self._lock:
+            entry = self.files.get(path)
+        if entry is None or entry['modified'] != modified:
+            with open(full_path, 'rb') as file:
+                entry = dict(compressed_variants(file.read()), modified=modified)
+            with self._lock:
+                self.files[path] = entry
+        return entry
+
+    def url_hash(self, path):
+        entry = self.entry(path)
+        return entry['hash'] if entry else None
+
+
+def send_variant(response, entry, encoding):
+    # Replaces the body of a static response by the precompressed variant
+    response.direct_passthrough = False
+    response.set_data(entry['variants'][encoding])
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def enable_compression(app, assets_dir):
+    # after_request hook on the Flask server of the Dash app; returns the precompressed assets
+    server = app.server
+    assets = StaticAssets(assets_dir)
+    assets_prefix = app.config.requests_pathname_prefix + app.config.assets_url_path.strip('/') + '/'
+    asset_url = re.compile('"' + re.escape(assets_prefix) + r'([^"?]+)(\?m=[0-9.]+)?"')
+    component_suites = {}
+    component_lock = threading.Lock()
+
+    def accepted():
+        return request.accept_encodings.best_match(encodings())
+
+    def hashed_url(match):
+        content_hash = assets.url_hash(match.group(1))
+        return f'"{assets_prefix}{match.group(1)}?h={content_hash}"' if content_hash else match.group(0)
+
+    @server.after_request
+    def compress_response(response):
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        path = request.path
+
+        # Static assets: content hash in the URL -> immutable, else revalidation with the hash as ETag
+        if path.startswith(assets_prefix):
+            entry = assets.entry(path[len(assets_prefix):])
+            if entry is None:
+                return response
+            if request.if_none_match.contains(entry['hash']):
+                response = server.response_class(status=304)
+                response.set_etag(entry['hash'])
+                return response
+            response = send_variant(response, entry, accepted() or 'identity')
+            response.set_etag(entry['hash'])
+            response.headers['Cache-Control'] = immutable if request.args.get('h') == entry['hash'] else 'no-cache'
+            return response
+
+        # Dash component bundles: the fingerprinted path changes with the package version, compressed once
+        if '/_dash-component-suites/' in path and response.mimetype in compressible_types:
+            with component_lock:
+                entry = component_suites.get(request.full_path)
+            if entry is None:
+                response.direct_passthrough = False
+                entry = compressed_variants(response.get_data())
+                with component_lock:
+                    component_suites[request.full_path] = entry
+            return send_variant(response, entry, accepted() or 'identity')
+
+        if response.mimetype not in compressible_types or response.direct_passthrough:
+            return response
+
+        # Index page: URLs of the CSS/JS assets with the content hash instead of the modification time
+        if response.mimetype == 'text/html':
+            response.set_data(asset_url.sub(hashed_url, response.get_data(as_text=True)))
+
+        # Callback responses and other JSON/HTML above the threshold, compressed per request
+        encoding = accepted()
+        data = response.get_data()
+        if encoding and len(data) >= min_size:
+            response.set_data(compress(data, encoding, dynamic_levels))
+            response.headers['Content-Encoding'] = encoding
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    return assets
@@ -0,0 +1,517 @@
+import gc
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from ingest import (session_keys, session_table, saccade_features, saccade_feature_columns, partition_dir,
+                    stream_ingest, read_partition_file, write_appended_partition)
+from quality import fixation_flags, mark_missing_variants, visible, flag_counts, quality_summary, add_counts
+from stimulus_registry import apply_calibration, apply_transforms, reference_image
+
+try:
+    import psutil
+except ImportError:  # without psutil the RSS is read from /proc (Linux) or the cached partitions are counted
+    psutil = None
+
+"""
+-----------------------------------------------------------------------------------------
+Dataset:
+Prepared fixation data with session table, partition index, KPI store, quality summary and density grids
+(in memory, or per stimulus from partition files with a memory budget)
+"""
+required_columns = ['StimuliName', 'FixationIndex', 'FixationDuration', 'MappedFixationPointX',
+                    'MappedFixationPointY', 'user', 'description', 'CityMap', 'City', 'SaccadeLength']
+numeric_columns = ['FixationIndex', 'FixationDuration', 'MappedFixationPointX', 'MappedFixationPointY',
+                   'SaccadeLength']
+density_bins = 30
+# Columns of all fixations kept in memory in the memory-budgeted mode (correlation and saccade views of all cities):
+global_columns = ['description', 'FixationDuration', 'SaccadeLength'] + list(saccade_feature_columns)
+# Task duration categories (correlation view): fixed edges in sec. or quantiles of the task durations of all sessions
+duration_schemes = {'threshold': ('<10 / >=10 sec.', 'edges', [10]),
+                    'median': ('Median split', 'quantiles', [0.5]),
+                    'terciles': ('Terciles', 'quantiles', [1 / 3, 2 / 3]),
+                    'quartiles': ('Quartiles', 'quantiles', [0.25, 0.5, 0.75])}
+
+
+def prepare_fixations(df, stimulus_images, calibration, stimulus_transforms):
+    # Enrichment of raw fixation rows (same steps for the initial file and for appended sessions)
+    # Only fixations with a complete session key (user and stimulus) are analysed:
+    if df[session_keys].isna().any(axis=None):
+        df = df.dropna(subset=session_keys).reset_index(drop=True)
+
+    # Saccade features per session (amplitude, direction, inter-fixation time, velocity, backtracks):
+    df = saccade_features(df)
+    # Timestamp [ms] is optional (e.g. in appended files); without it the AOI timings use the fixation durations
+    if 'Timestamp' not in df.columns:
+        df['Timestamp'] = np.nan
+
+    # Add "Task Duration in sec" and "Average Fixation Duration in sec" (per User and Stimulus) to df,
+    # broadcast in place instead of merging copies of the whole frame:
+    fixation_duration = df.groupby(session_keys, sort=False)['FixationDuration']
+    df['FixationDuration_aggregated'] = fixation_duration.transform('sum') / 1000
+    df['FixationDuration_avg'] = fixation_duration.transform('mean') / 1000
+
+    # Calibration to the image size (NormalizedPointX/Y, InBounds) and common S1 frame (S1FramePointX/Y):
+    df = apply_calibration(df, calibration, stimulus_images)
+    df = apply_transforms(df, stimulus_transforms)
+
+    # Validity bit flags per row (quality.py); MissingVariant is set from the session table by the dataset:
+    df['QualityFlags'] = fixation_flags(df)
+    return df
+
+
+def validate_fixations(new_df, existing_sessions, stimulus_images):
+    # Checks a file of new sessions before it is appended; raises ValueError with the reason
+    missing = [column for column in required_columns if column not in new_df.columns]
+    if missing:
+        raise ValueError(f'missing columns: {", ".join(missing)}')
+    if new_df.empty:
+        raise ValueError('file contains no fixations')
+    for column in numeric_columns:
+        converted = pd.to_numeric(new_df[column], errors='coerce')
+        if (converted.isna() & new_df[column].notna()).any():
+            raise ValueError(f'column {column} contains non-numeric values')
+        new_df[column] = converted
+    if 'Timestamp' in new_df.columns:
+        new_df['Timestamp'] = pd.to_numeric(new_df['Timestamp'], errors='coerce')
+    if new_df[session_keys].isna().any(axis=None):
+        raise ValueError('rows without user, CityMap or description')
+    unknown_variants = set(new_df['description']) - {'color', 'grey'}
+    if unknown_variants:
+        raise ValueError(f'unknown description: {", ".join(sorted(map(str, unknown_variants)))}')
+    stimuli = new_df[['CityMap', 'description']].drop_duplicates().itertuples(index=False, name=None)
+    unknown_stimuli = [stimulus for stimulus in stimuli if stimulus not in stimulus_images]
+    if unknown_stimuli:
+        raise ValueError(f'no stimulus image for: {", ".join(f"{c} ({d})" for c, d in unknown_stimuli)}')
+    known = pd.MultiIndex.from_frame(existing_sessions[session_keys])
+    incoming = pd.MultiIndex.from_frame(new_df[session_keys].drop_duplicates())
+    duplicates = incoming[incoming.isin(known)]
+    if len(duplicates):
+        raise ValueError(f'sessions already loaded: {", ".join("/".join(map(str, key)) for key in duplicates[:5])}')
+    return new_df
+
+
+def build_partition_index(df, stimuli=None, offset=0):
+    # Row positions per stimulus, ordered by user and FixationIndex: (CityMap, description) -> positions
+    order = np.lexsort((df['FixationIndex'].to_numpy(), df['user'].astype(str).to_numpy()))
+    groups = df.iloc[order].groupby(['CityMap', 'description'], observed=True, sort=False).indices
+    return {key: order[positions] + offset for key, positions in groups.items()
+            if stimuli is None or key in stimuli}
+
+
+def kpi_components(sessions):
+    # Additive KPI components per stimulus (from the session table), so KPIs of one city or of all cities are sums of rows
+    return sessions.groupby(['CityMap', 'description'], observed=True).agg(
+        Sessions=('TaskDuration', 'size'),
+        TaskDurationSum=('TaskDuration', 'sum'),
+        AvgFixationDurationSum=('AvgFixationDuration', 'sum'),
+        FixationCount=('FixationCount', 'sum'),
+        SaccadeLengthSum=('SaccadeLengthSum', 'sum'),
+        SaccadeCount=('SaccadeCount', 'sum'))
+
+
+def kpi_values(components, city_map=None):
+    # KPIs for color and grey of one City Map (or all cities if None)
+    if city_map is not None:
+        components = components[components.index.get_level_values('CityMap') == city_map]
+    totals = components.groupby(level='description').sum()
+    values = {}
+    for description in ['color', 'grey']:
+        if description in totals.index and totals.loc[description, 'Sessions']:
+            row = totals.loc[description]
+            values[description] = {
+                'AvgTaskDuration': row['TaskDurationSum'] / row['Sessions'],
+                'FixationCount': int(row['FixationCount']),
+                'AvgSaccadeLength': row['SaccadeLengthSum'] / row['SaccadeCount'] if row['SaccadeCount'] else np.nan,
+                'AvgFixationDuration': row['AvgFixationDurationSum'] / row['Sessions']}
+        else:
+            values[description] = {'AvgTaskDuration': np.nan, 'FixationCount': 0,
+                                   'AvgSaccadeLength': np.nan, 'AvgFixationDuration': np.nan}
+    return values
+
+
+def session_index(users, task_durations):
+    # Sessions of the fixations of one stimulus (grouped by session, i.e. ordered by user):
+    # users, first row and number of fixations per session, the task duration of every session
+    # and the sessions sorted by task duration (for range filters)
+    if not len(users):
+        return {'users': users[:0], 'starts': np.empty(0, dtype=np.int64), 'counts': np.empty(0, dtype=np.int64),
+                'task_durations': np.empty(0), 'duration_order': np.empty(0, dtype=np.int64),
+                'sorted_durations': np.empty(0)}
+    starts = np.flatnonzero(np.concatenate([[True], users[1:] != users[:-1]]))
+    counts = np.diff(np.append(starts, len(users)))
+    durations = np.asarray(task_durations, dtype=float)[starts]
+    order = np.argsort(durations, kind='stable')
+    return {'users': users[starts], 'starts': starts, 'counts': counts, 'task_durations': durations,
+            'duration_order': order, 'sorted_durations': durations[order]}
+
+
+def sessions_of_users(sessions, users):
+    # Positions of the sessions of the given users (e.g. selected with the filter index) in the session index
+    return np.flatnonzero(np.isin(np.asarray(sessions['users']).astype(str), np.asarray(users, dtype=str)))
+
+
+def sessions_in_range(sessions, low, high, users=None):
+    # Sessions with low <= task duration <= high: one contiguous range of the duration order (binary search),
+    # returned in session order; optionally only sessions of the given users (e.g. selected with the filter index)
+    first = np.searchsorted(sessions['sorted_durations'], low, side='left')
+    last = np.searchsorted(sessions['sorted_durations'], high, side='right')
+    selected = np.sort(sessions['duration_order'][first:last])
+    if users is not None:
+        selected = selected[np.isin(np.asarray(sessions['users'])[selected].astype(str), np.asarray(users, dtype=str))]
+    return selected
+
+
+def select_sessions(sessions, users, duration_range=None):
+    # Sessions of the given users within the task duration range (None: all durations)
+    if duration_range:
+        return sessions_in_range(sessions, duration_range[0], duration_range[1], users)
+    return sessions_of_users(sessions, users)
+
+
+def session_rows(sessions, selected):
+    # Fixation rows of the selected sessions: their slices of the fixations grouped by session, concatenated
+    counts = sessions['counts'][selected]
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(sessions['starts'][selected] - offsets, counts) + np.arange(counts.sum())
+
+
+def duration_edges(sorted_durations, scheme='threshold', custom_edges=None):
+    # Category edges in sec.: custom edges, fixed edges of the scheme or quantiles read from the sorted task durations
+    if custom_edges:
+        return np.unique(np.asarray(custom_edges, dtype=float))
+    _, kind, values = duration_schemes.get(scheme, duration_schemes['threshold'])
+    if kind == 'edges' or not len(sorted_durations):
+        return np.asarray(values, dtype=float) if kind == 'edges' else np.empty(0)
+    positions = np.round(np.asarray(values) * (len(sorted_durations) - 1)).astype(int)
+    return np.unique(sorted_durations[positions])
+
+
+def duration_labels(edges):
+    names = [f'{edge:g}' if edge == round(edge) else f'{edge:.1f}' for edge in edges]
+    if not names:
+        return ['all sessions']
+    return ([f'<{names[0]} sec.'] + [f'{low}-{high} sec.' for low, high in zip(names[:-1], names[1:])] +
+            [f'>={names[-1]} sec.'])
+
+
+def duration_categories(sessions, edges):
+    # Category of every session (O(sessions)), repeated for the fixations grouped by session
+    return np.repeat(np.searchsorted(edges, sessions['task_durations'], side='right'), sessions['counts'])
+
+
+def density_grids(df, partitions, stimulus_images, stimuli=None):
+    # 2D fixation histograms (density_bins x density_bins over the S1 frame of the City Map) per session of a stimulus
+    grids = {}
+    x_all = df['S1FramePointX'].to_numpy(dtype=float)
+    y_all = df['S1FramePointY'].to_numpy(dtype=float)
+    shown = visible(df['QualityFlags'].to_numpy())
+    users_all = df['user'].to_numpy()
+    for key, rows in partitions.items():
+        if key not in stimulus_images or (stimuli is not None and key not in stimuli):
+            continue
+        image = reference_image(stimulus_images, *key)
+        rows = rows[shown[rows]]
+        users, session_index = np.unique(users_all[rows], return_inverse=True)
+        column = np.clip((x_all[rows] / image['width'] * density_bins).astype(int), 0, density_bins - 1)
+        row = np.clip((y_all[rows] / image['height'] * density_bins).astype(int), 0, density_bins - 1)
+        counts = np.bincount((session_index * density_bins + row) * density_bins + column,
+                             minlength=len(users) * density_bins * density_bins)
+        grids[key] = {'users': users,
+                      'grids': counts.reshape(len(users), density_bins, density_bins).astype('float32'),
+                      'x': (np.arange(density_bins) + 0.5) * image['width'] / density_bins,
+                      'y': (np.arange(density_bins) + 0.5) * image['height'] / density_bins}
+    return grids
+
+
+def select_density(grid_entry, users):
+    # Sum of the session grids of the given users (sessions selected with the filter index)
+    return grid_entry['grids'][np.isin(grid_entry['users'].astype(str), np.asarray(users, dtype=str))].sum(axis=0)
+
+
+class Dataset:
+    # Prepared state of one fixation file. append() returns a new Dataset and recomputes only the affected stimuli.
+    def __init__(self, df, sessions, partitions, kpis, quality, density, stimulus_images, calibration,
+                 stimulus_transforms):
+        self.df = df
+        self.sessions = sessions
+        self.partitions = partitions
+        self.kpis = kpis
+        self.quality = quality
+        self.density = density
+        # Sorted task durations of all sessions (quantile edges) and session index per stimulus (built on first use)
+        self.sorted_durations = np.sort(sessions['TaskDuration'].to_numpy(dtype=float))
+        self.session_indexes = {}
+        self.stimulus_images = stimulus_images
+        self.calibration = calibration
+        self.stimulus_transforms = stimulus_transforms
+        self.users = df['user'].dropna().unique()
+
+    @classmethod
+    def build(cls, raw_df, stimulus_images, calibration, stimulus_transforms):
+        df = prepare_fixations(raw_df, stimulus_images, calibration, stimulus_transforms)
+        sessions = session_table(df)
+        df = mark_missing_variants(df, sessions)
+        partitions = build_partition_index(df)
+        return cls(df, sessions, partitions, kpi_components(sessions), quality_summary(flag_counts(df), sessions),
+                   density_grids(df, partitions, stimulus_images),
+                   stimulus_images, calibration, stimulus_transforms)
+
+    def stimulus_rows(self, city_map, description):
+        return self.partitions.get((city_map, description), np.empty(0, dtype=np.int64))
+
+    # Access used by the callbacks and engines (same for the memory-budgeted PartitionedDataset):
+    def stimulus_frame(self, city_map, description):
+        # Fixations of one stimulus, ordered by user and FixationIndex
+        return self.df.iloc[self.stimulus_rows(city_map, description)]
+
+    def stimulus_arrays(self, city_map, description, columns):
+        rows = self.stimulus_rows(city_map, description)
+        return {column: self.df[column].to_numpy()[rows] for column in columns}
+
+    def density_grid(self, city_map, description):
+        return self.density.get((city_map, description))
+
+    def stimulus_sessions(self, city_map, description):
+        key = (city_map, description)
+        if key not in self.session_indexes:
+            arrays = self.stimulus_arrays(city_map, description, ['user', 'FixationDuration_aggregated'])
+            self.session_indexes[key] = session_index(arrays['user'], arrays['FixationDuration_aggregated'])
+        return self.session_indexes[key]
+
+    def fixations(self, columns):
+        return self.df[columns]
+
+    def append(self, new_df):
+        # Validates and appends complete new sessions; returns (new Dataset, affected stimuli)
+        new_df = validate_fixations(new_df.copy(), self.sessions, self.stimulus_images)
+        new_df = prepare_fixations(new_df, self.stimulus_images, self.calibration, self.stimulus_transforms)
+        new_df = new_df.reindex(columns=self.df.columns.union(new_df.columns, sort=False))
+        affected = set(new_df[['CityMap', 'description']].drop_duplicates().itertuples(index=False, name=None))
+
+        offset = len(self.df)
+        df = pd.concat([self.df, new_df], ignore_index=True)
+        sessions = pd.concat([self.sessions, session_table(new_df)], ignore_index=True) \
+            .sort_values(session_keys, ignore_index=True)
+
+        # Partition index: positions of the new rows are merged into the affected stimuli only, ordered by user and
+        # FixationIndex again (sessions, AOI metrics and similarity read the rows of a session as one slice)
+        partitions = dict(self.partitions)
+        users = df['user'].to_numpy()
+        fixation_index = df['FixationIndex'].to_numpy()
+        for key, positions in build_partition_index(new_df, affected, offset).items():
+            merged = np.concatenate([partitions.get(key, np.empty(0, dtype=np.int64)), positions])
+            partitions[key] = merged[np.lexsort((fixation_index[merged], users[merged].astype(str)))]
+
+        # Quality: counts of the new rows are added; the other variant of a user may now exist for old rows, so the
+        # MissingVariant bit is set again for the rows of the appended City Maps only (read from the partition index)
+        city_maps = {city_map for city_map, _ in affected}
+        df = mark_missing_variants(df, sessions, np.concatenate(
+            [np.empty(0, dtype=np.int64)] +
+            [positions for (city_map, _), positions in partitions.items() if city_map in city_maps]))
+        quality = quality_summary(add_counts(self.quality, flag_counts(new_df)), sessions)
+
+        # KPI store and density grids: recomputed for the affected stimuli, all other entries are shared
+        affected_sessions = sessions.set_index(['CityMap', 'description']).index.isin(list(affected))
+        kpis = pd.concat([self.kpis[~self.kpis.index.isin(list(affected))],
+                          kpi_components(sessions[affected_sessions])]).sort_index()
+        density = dict(self.density)
+        density.update(density_grids(df, {key: partitions[key] for key in affected}, self.stimulus_images))
+
+        dataset = Dataset(df, sessions, partitions, kpis, quality, density,
+                          self.stimulus_images, self.calibration, self.stimulus_transforms)
+        return dataset, affected
+
+
+def process_rss():
+    # Resident set size of this process in bytes (None if it cannot be determined)
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PartitionCache:
+    # Prepared stimulus partitions, least recently used first. After each load, partitions are evicted while the
+    # RSS of the process exceeds the budget (the most recently used partition always stays).
+    # Shared by all datasets (snapshots) of the process, concurrent loads of the same partition wait for each other.
+    def __init__(self, memory_budget):
+        self.memory_budget = memory_budget
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def memory_usage(self):
+        rss = process_rss()
+        if rss is None:
+            return sum(entry['bytes'] for entry in self._entries.values())
+        return rss
+
+    def get(self, key, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                entry = load()
+                with self._lock:
+                    self._entries[key] = entry
+                    self._loading.pop(key, None)
+                    self._evict()
+        return entry
+
+    def _evict(self):
+        while len(self._entries) > 1 and self.memory_usage() > self.memory_budget:
+            self._entries.popitem(last=False)
+            gc.collect()
+
+
+def data_file_version(data_path):
+    stat = os.stat(data_path)
+    return hashlib.sha1(f'{os.path.abspath(data_path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:12]
+
+
+def scan_partitions(partition_files, stimulus_images, calibration, stimulus_transforms):
+    # One pass over the partitions (one file in memory at a time): compact frame with the few columns needed over
+    # all fixations (category and float32 columns) and the quality counts per stimulus. Every partition holds
+    # complete sessions, so the saccade features and quality flags can be derived per file.
+    parts = []
+    counts = []
+    for paths in partition_files.values():
+        for path in paths:
+            part = prepare_fixations(read_partition_file(path), stimulus_images, calibration, stimulus_transforms)
+            parts.append(compact_global_columns(part))
+            counts.append(flag_counts(part))
+    if not parts:
+        empty = compact_global_columns(pd.DataFrame(columns=global_columns))
+        return empty, flag_counts(pd.DataFrame(columns=['CityMap', 'description', 'QualityFlags']))
+    return pd.concat(parts, ignore_index=True), pd.concat(counts).groupby(level=[0, 1]).sum()
+
+
+def compact_global_columns(df):
+    compact = {'description': pd.Categorical(df['description'].astype(str), categories=['color', 'grey'])}
+    for column in global_columns[1:]:
+        compact[column] = df[column].astype('float32')
+    return pd.DataFrame(compact)
+
+
+class PartitionedDataset:
+    # Memory-budgeted variant of Dataset: the fixations stay in one partition file per stimulus (written once per
+    # version of the data file by ingest.stream_ingest) and are prepared when a stimulus is first needed.
+    # Global views use the session table, the KPI store and the compact global columns only.
+    def __init__(self, sessions, partition_files, global_fixations, kpis, quality, output_dir, cache, generation,
+                 stimulus_images, calibration, stimulus_transforms):
+        self.sessions = sessions
+        self.partition_files = partition_files
+        self.global_fixations = global_fixations
+        self.kpis = kpis
+        self.quality = quality
+        self.sorted_durations = np.sort(sessions['TaskDuration'].to_numpy(dtype=float))
+        self.output_dir = output_dir
+        self.cache = cache
+        # Cache entries are prepared with the calibration of one build; appends keep the generation
+        self.generation = generation
+        self.stimulus_images = stimulus_images
+        self.calibration = calibration
+        self.stimulus_transforms = stimulus_transforms
+        self.users = sessions['user'].unique()
+
+    @classmethod
+    def build(cls, data_path, stimulus_images, calibration, stimulus_transforms, cache, output_dir=partition_dir):
+        # data_path is a fixation file, or a partition directory written by an import (tracker_import)
+        if not os.path.isdir(data_path):
+            output_dir = os.path.join(output_dir, data_file_version(data_path))
+        else:
+            output_dir = data_path
+        if os.path.exists(os.path.join(output_dir, 'partitions.csv')):
+            sessions = pd.read_csv(os.path.join(output_dir, 'sessions.csv'), sep=';')
+            partitions = pd.read_csv(os.path.join(output_dir, 'partitions.csv'), sep=';')
+        else:
+            sessions, partitions = stream_ingest(data_path, output_dir)
+        partition_files = {(row['CityMap'], row['description']): (row['path'],) for _, row in partitions.iterrows()}
+        global_fixations, counts = scan_partitions(partition_files, stimulus_images, calibration, stimulus_transforms)
+        return cls(sessions, partition_files, global_fixations, kpi_components(sessions),
+                   quality_summary(counts, sessions), output_dir, cache, uuid.uuid4().hex,
+                   stimulus_images, calibration, stimulus_transforms)
+
+    def _entry(self, city_map, description):
+        paths = self.partition_files.get((city_map, description))
+        if not paths:
+            return None
+        # The files of the other variant are part of the key: sessions appended there change the MissingVariant flags
+        other = self.partition_files.get((city_map, 'grey' if description == 'color' else 'color'), ())
+        return self.cache.get((self.generation, paths, other), lambda: self._load(paths))
+
+    def _load(self, paths):
+        frame = pd.concat([read_partition_file(path) for path in paths], ignore_index=True)
+        frame = prepare_fixations(frame, self.stimulus_images, self.calibration, self.stimulus_transforms)
+        frame = mark_missing_variants(frame, self.sessions)
+        order = np.lexsort((frame['FixationIndex'].to_numpy(), frame['user'].astype(str).to_numpy()))
+        frame = frame.iloc[order].reset_index(drop=True)
+        return {'frame': frame, 'bytes': int(frame.memory_usage(deep=True).sum()), 'density': None,
+                'sessions': session_index(frame['user'].to_numpy(), frame['FixationDuration_aggregated'].to_numpy())}
+
+    def stimulus_frame(self, city_map, description):
+        entry = self._entry(city_map, description)
+        if entry is None:
+            empty = pd.DataFrame({column: pd.Series(dtype='float64' if column in numeric_columns else 'object')
+                                  for column in required_columns})
+            empty = prepare_fixations(empty, self.stimulus_images, self.calibration, self.stimulus_transforms)
+            return mark_missing_variants(empty, self.sessions)
+        return entry['frame']
+
+    def stimulus_arrays(self, city_map, description, columns):
+        frame = self.stimulus_frame(city_map, description)
+        return {column: frame[column].to_numpy() for column in columns}
+
+    def density_grid(self, city_map, description):
+        key = (city_map, description)
+        entry = self._entry(city_map, description)
+        if entry is None or key not in self.stimulus_images:
+            return None
+        if entry['density'] is None:
+            frame = entry['frame']
+            entry['density'] = density_grids(frame, {key: np.arange(len(frame))}, self.stimulus_images)[key]
+        return entry['density']
+
+    def stimulus_sessions(self, city_map, description):
+        entry = self._entry(city_map, description)
+        if entry is None:
+            return session_index(np.empty(0, dtype=object), np.empty(0))
+        return entry['sessions']
+
+    def fixations(self, columns):
+        return self.global_fixations[columns]
+
+    def append(self, new_df):
+        # Validates new sessions and writes them as additional partition files; returns (new dataset, affected)
+        new_df = validate_fixations(new_df.copy(), self.sessions, self.stimulus_images)
+        affected = set(new_df[['CityMap', 'description']].drop_duplicates().itertuples(index=False, name=None))
+        partition_files = dict(self.partition_files)
+        for (city_map, description), part in new_df.groupby(['CityMap', 'description'], sort=False):
+            path = write_appended_partition(part, self.output_dir, city_map, description)
+            partition_files[(city_map, description)] = partition_files.get((city_map, description), ()) + (path,)
+
+        sessions = pd.concat([self.sessions, session_table(new_df)], ignore_index=True) \
+            .sort_values(session_keys, ignore_index=True)
+        prepared = prepare_fixations(new_df.copy(), self.stimulus_images, self.calibration, self.stimulus_transforms)
+        global_fixations = pd.concat([self.global_fixations, compact_global_columns(prepared)], ignore_index=True)
+        quality = quality_summary(add_counts(self.quality, flag_counts(prepared)), sessions)
+        dataset = PartitionedDataset(sessions, partition_files, global_fixations, kpi_components(sessions), quality,
+                                     self.output_dir, self.cache, self.generation,
+                                     self.stimulus_images, self.calibration, self.stimulus_transforms)
+        return dataset, affected
@@ -0,0 +1,213 @@
+import time
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+"""
+-----------------------------------------------------------------------------------------
+Figure-Builder:
+Figures as plain dicts (plotly.js figure format) assembled from precomputed arrays and a shared layout template per
+theme (light/dark), without plotly.express and the property validation of graph_objects per request. The templates are
+validated once at import, the figures of all callbacks with 'python figure_builder.py' (go.Figure on every figure)
+"""
+font_family = 'Arial, sans-serif'
+transparent = 'rgba(0, 0, 0, 0)'
+hidden_axis = {'showgrid': False, 'zeroline': False, 'showline': False, 'showticklabels': False}
+
+# Density colors of the heat maps (transparent where no fixations are):
+density_colorscale = [
+    [0.0, "rgba(0, 128, 0, 0)"],  # Green, but transparent
+    [0.2, "rgba(0, 128, 0, 0.5)"],  # Green with some opacity
+    [0.4, "rgba(173, 255, 47, 0.6)"],  # Yellow-green with moderate opacity
+    [0.6, "rgba(255, 255, 0, 0.7)"],  # Yellow with higher opacity
+    [0.8, "rgba(255, 165, 0, 0.8)"],  # Orange with more opacity
+    [1.0, "rgba(255, 0, 0, 0.9)"]  # Red with full opacity
+]
+
+
+def text_color(theme):
+    return 'black' if theme == 'light' else 'white'
+
+
+def theme_template(theme):
+    # Default plotly template (as used by plotly.express) with transparent backgrounds, no grid and the text color
+    # of the theme for titles, ticks (also of polar plots), legends and color bars; sizes are set per figure
+    color = text_color(theme)
+    text_font = dict(family=font_family, color=color)
+    axis = dict(showgrid=False, tickfont=text_font, title_font=text_font, linecolor=color, zerolinecolor=color)
+    template = go.layout.Template(pio.templates[pio.templates.default])
+    template.layout.update(plot_bgcolor=transparent,
+                           paper_bgcolor=transparent,
+                           title_font=dict(size=12, **text_font),
+                           xaxis=axis,
+                           yaxis=axis,
+                           polar=dict(bgcolor=transparent, angularaxis=dict(tickfont=text_font),
+                                      radialaxis=dict(tickfont=text_font)),
+                           legend=dict(font=text_font, title_font=text_font),
+                           coloraxis_colorbar=dict(tickfont=text_font, title_font=text_font))
+    return template.to_plotly_json()
+
+
+layout_templates = {theme: theme_template(theme) for theme in ['light', 'dark']}
+
+
+def layout(theme, **properties):
+    # The template is shared between all figures of a theme (not copied, never modified)
+    return {'template': layout_templates['light' if theme == 'light' else 'dark'], **properties}
+
+
+def axis(size, **properties):
+    # Axis with tick labels of the given size (font family and color from the template)
+    return {'tickfont': {'size': size}, **properties}
+
+
+def title(text, size=12, **properties):
+    return {'text': text, 'font': {'size': size}, **properties}
+
+
+def empty_figure(theme=None):
+    return {'data': [], 'layout': layout(theme)}
+
+
+def message_figure(theme, text, height=425, size=14):
+    # Centered note instead of a plot (e.g. no City Map selected)
+    return {'data': [], 'layout': layout(theme,
+                                         title=title(text, size, y=0.6, x=0.5, xanchor='center', yanchor='middle'),
+                                         showlegend=False,
+                                         margin=dict(l=0, r=5, t=40, b=5),
+                                         height=height,
+                                         xaxis=hidden_axis,
+                                         yaxis=hidden_axis)}
+
+
+def layout_image(source, x, y, sizex, sizey):
+    # Background image (or tile of it) placed in image coordinates, top left corner at (x, y)
+    return {'source': source, 'x': x, 'sizex': sizex, 'y': y, 'sizey': sizey, 'xref': 'x', 'yref': 'y',
+            'sizing': 'stretch', 'opacity': 0.8, 'layer': 'below'}
+
+
+def stimulus_layout(theme, title_text, images, width, height, **properties):
+    # Plot area in image coordinates (origin top left) with the stimulus image (or its tiles) as background
+    return layout(theme,
+                  xaxis=axis(9, range=[0, width], autorange=False, showticklabels=True),
+                  yaxis=axis(9, range=[height, 0], autorange=False, showticklabels=True),
+                  images=images,
+                  title=title(f'<b>{title_text}</b>'),
+                  margin=dict(l=0, r=5, t=40, b=5),
+                  showlegend=False,
+                  height=425,
+                  **properties)
+
+
+def gaze_traces(users, x, y, sizes, colors, hover_labels, customdata):
+    # Fixation markers per user (in order of appearance; marker area by size, scaled like plotly.express), followed
+    # by the scanpath lines. hover_labels: labels of x, y, size and of the customdata columns
+    x_label, y_label, size_label, *custom_labels = hover_labels
+    hover = (f'<br>{x_label}=%{{x}}<br>{y_label}=%{{y}}<br>{size_label}=%{{marker.size}}'
+             + ''.join(f'<br>{label}=%{{customdata[{k}]}}' for k, label in enumerate(custom_labels))
+             + '<extra></extra>')
+    names, first, codes = np.unique(np.asarray(users).astype(str), return_index=True, return_inverse=True)
+    rows = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[rows], np.arange(len(names) + 1))
+    sizeref = 2 * np.nanmax(sizes) / 20 ** 2 if len(sizes) else 1
+
+    markers, lines = [], []
+    for code in np.argsort(first):
+        user, selected = str(names[code]), rows[bounds[code]:bounds[code + 1]]
+        markers.append({'type': 'scatter', 'mode': 'markers', 'name': user, 'legendgroup': user, 'showlegend': True,
+                        'x': x[selected], 'y': y[selected], 'customdata': customdata[selected],
+                        'marker': {'color': colors[user], 'size': sizes[selected], 'sizemode': 'area',
+                                   'sizeref': sizeref, 'symbol': 'circle'},
+                        'hovertemplate': f'user={user}' + hover})
+        lines.append({'type': 'scatter', 'mode': 'lines', 'name': f'Scanpath for {user}',
+                      'x': x[selected], 'y': y[selected], 'line': {'width': 2, 'color': colors[user]},
+                      'hoverinfo': 'skip'})
+    return markers + lines
+
+
+def density_trace(x=None, y=None, z=None):
+    # Filled contour of a density grid (without lines and scale); empty without a grid
+    trace = {'type': 'contour', 'contours': {'showlabels': False, 'coloring': 'fill'},
+             'line': {'smoothing': 1.3, 'color': transparent}, 'colorscale': density_colorscale, 'showscale': False}
+    if z is not None:
+        trace.update(x=x, y=y, z=z)
+    return trace
+
+
+def box_trace(name, x, y, color, hover_label):
+    # Horizontal box without points, grouped with the boxes of the other traces (boxmode 'group')
+    return {'type': 'box', 'name': name, 'legendgroup': name, 'offsetgroup': name, 'alignmentgroup': 'True',
+            'orientation': 'h', 'x': x, 'y': y, 'boxpoints': False, 'notched': False, 'showlegend': True,
+            'marker': {'color': color, 'size': 8}, 'line': {'width': 2.0},
+            'hovertemplate': f'=%{{y}}<br>{hover_label}=%{{x}}<extra></extra>'}
+
+
+def histogram_trace(name, x, color, nbins, line_color, xaxis='x', yaxis='y'):
+    # Bins shared by all histogram traces of the figure (bingroup), e.g. over facets
+    return {'type': 'histogram', 'name': name, 'legendgroup': name, 'offsetgroup': name, 'alignmentgroup': 'True',
+            'bingroup': 'x', 'nbinsx': nbins, 'orientation': 'v', 'x': x, 'xaxis': xaxis, 'yaxis': yaxis,
+            'marker': {'color': color, 'line': {'color': line_color, 'width': 1}},
+            'hovertemplate': f'description={name}<br>=%{{x}}<br>count=%{{y}}<extra></extra>'}
+
+
+def matrix_trace(labels, z, colorscale, hovertemplate, **properties):
+    # Square matrix with the same labels on both axes (rows: y, columns: x), e.g. AOI transitions or user pairs
+    return {'type': 'heatmap', 'z': z, 'x': labels, 'y': labels, 'colorscale': colorscale,
+            'hovertemplate': hovertemplate, **properties}
+
+
+def colorbar(theme, text, size=10):
+    # Color bar of a trace with title and ticks in the text color of the theme (trace color bars are not themed)
+    font = {'size': size, 'family': font_family, 'color': text_color(theme)}
+    return {'title': {'text': text, 'font': font}, 'tickfont': font}
+
+
+def validate(figure):
+    # Full plotly validation (raises ValueError on invalid properties); not used per request
+    return go.Figure(figure)
+
+
+if __name__ == '__main__':
+    # Validation and server time per callback (figures and JSON response) on the data of the dashboard
+    # (python figure_builder.py); the transition and similarity matrices use four quadrant AOIs of the first City Map
+    from plotly.io.json import to_json_plotly
+    import app
+    city = app.study_snapshot(None).sessions['CityMap'].iloc[0]
+
+    def quadrant_aois(aoi_engine):
+        for description in ['color', 'grey']:
+            _, width, height = app.stimulus_frame(app.study_snapshot(None), city, description)
+            aoi_engine.set_aois(city, description, [
+                {'name': f'Q{k + 1}', 'type': 'rect', 'x0': x * width / 2, 'y0': y * height / 2,
+                 'x1': (x + 1) * width / 2, 'y1': (y + 1) * height / 2}
+                for k, (x, y) in enumerate([(0, 0), (1, 0), (0, 1), (1, 1)])])
+
+    app.catalog.store(None).edit(quadrant_aois)
+    callbacks = {
+        'Gazeplot': (app.update_scatter_plot_color, (city, None, None, 'light', 1, None)),
+        'Heatmap': (app.update_heatmap_color, (city, None, None, 'light', None)),
+        'Gazeplot (no city)': (app.update_scatter_plot_grey, (None, None, None, 'dark', 1, None)),
+        'Boxplot Task Duration': (app.update_box_plot_task_duration, ('light', None)),
+        'Boxplot Fixation Duration': (app.update_box_plot_avg_fix_duration, ('light', None)),
+        'Histogram': (app.update_histogram_task_duration, (city, 'light', None)),
+        'Correlation (City)': (app.update_scatter_correlation_color,
+                               (city, 'light', 'SaccadeLength', 'threshold', '', None)),
+        'Correlation (all cities)': (app.update_scatter_correlation_grey,
+                                     (None, 'dark', 'SaccadeLength', 'threshold', '', None)),
+        'Saccades (Amplitude)': (app.update_saccade_distributions, (city, 'SaccadeAmplitude', 'light', None)),
+        'Saccades (Direction)': (app.update_saccade_distributions, (city, 'SaccadeAngle', 'dark', None)),
+        'AOI Transitions': (app.update_transition_matrices, (city, 1, 'light', None)),
+        'Scanpath Similarity': (app.update_similarity_matrices, (city, 'grid', 1, 'light', None)),
+    }
+    repeat = 20
+    print(f'{"Callback":<28}{"ms":>8}')
+    for name, (callback, args) in callbacks.items():
+        # Callbacks with two outputs (color and grey) return a tuple of figures
+        figures = callback.__wrapped__(*args)
+        for figure in figures if isinstance(figures, tuple) else [figures]:
+            validate(figure)
+        callback(*args)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            to_json_plotly(callback(*args))
+        print(f'{name:<28}{(time.perf_counter() - start) / repeat * 1000:>8.2f}')
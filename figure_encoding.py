@@ -0,0 +1,131 @@
+import base64
+import functools
+import json
+import time
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:  # without orjson the figures are serialized by plotly's JSON encoder
+    orjson = None
+
+"""
+-----------------------------------------------------------------------------------------
+Figure-Encoding:
+Numeric arrays of the figures sent as base64 typed arrays (plotly.js typed array spec: {'dtype', 'bdata', 'shape'})
+in the smallest type that keeps the values (integers: int8..uint32, floats: float32 if exact to 1e-6, else float64);
+the rest of the response is serialized with orjson if it is installed
+"""
+# Arrays with fewer values stay JSON lists (the typed array spec is longer than the list):
+binary_min_length = 16
+float32_tolerance = 1e-6
+integer_types = [('u1', np.uint8), ('i1', np.int8), ('u2', np.uint16), ('i2', np.int16),
+                 ('u4', np.uint32), ('i4', np.int32)]
+
+if orjson is not None:
+    pio.json.config.default_engine = 'orjson'
+
+
+def typed_array(values):
+    # Typed array spec of a numeric array (None if the values are not numeric, ragged or the array is short)
+    try:
+        array = np.asarray(values)
+    except (ValueError, TypeError):
+        return None
+    if array.dtype.kind not in 'iuf' or array.size < binary_min_length:
+        return None
+    if array.dtype.kind in 'iu' or (np.isfinite(array).all() and (array == np.round(array)).all()):
+        low, high = array.min(), array.max()
+        for code, dtype in integer_types:
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                return typed_spec(array.astype(dtype), code)
+    with np.errstate(invalid='ignore', over='ignore'):
+        single = array.astype(np.float32)
+        exact = np.allclose(single, array, rtol=float32_tolerance, atol=0, equal_nan=True)
+    return typed_spec(single, 'f4') if exact else typed_spec(array.astype(np.float64), 'f8')
+
+
+def typed_spec(array, code):
+    # Little-endian bytes as base64; 2D arrays (e.g. heat map z) with their shape
+    data = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+    spec = {'dtype': code, 'bdata': base64.b64encode(data.tobytes()).decode('ascii')}
+    if array.ndim > 1:
+        spec['shape'] = ','.join(map(str, array.shape))
+    return spec
+
+
+def encode_arrays(value):
+    # Replaces the numeric arrays of a trace (also nested, e.g. marker.size) by typed array specs
+    if isinstance(value, dict):
+        return {key: encode_arrays(item) for key, item in value.items()}
+    if isinstance(value, (np.ndarray, list, tuple)):
+        spec = typed_array(value)
+        if spec is not None:
+            return spec
+    return value
+
+
+def encode_figure(figure):
+    # Figure (or figure dict) -> figure dict with binary trace arrays; layouts stay as they are
+    if isinstance(figure, go.Figure):
+        figure = figure.to_dict()
+    if not isinstance(figure, dict) or 'data' not in figure:
+        return figure
+    return dict(figure, data=[encode_arrays(trace) for trace in figure['data']])
+
+
+def binary_figures(function):
+    # Decorator for callbacks returning one figure or a list of figures (Figures or figure dicts)
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        result = function(*args, **kwargs)
+        if isinstance(result, (list, tuple)):
+            return type(result)(encode_figure(item) for item in result)
+        return encode_figure(result)
+    return wrapper
+
+
+def measure(figure, repeat=20):
+    # Payload size and decode time (JSON parse plus typed array decode) of a figure as JSON lists and binary
+    def decode(text):
+        parsed = json.loads(text)
+        for trace in parsed['data']:
+            for item in trace.values():
+                if isinstance(item, dict) and 'bdata' in item:
+                    np.frombuffer(base64.b64decode(item['bdata']), dtype=np.dtype(item['dtype']))
+        return parsed
+
+    result = {}
+    for name, payload in [('json', figure), ('binary', encode_figure(figure))]:
+        text = pio.to_json(payload, validate=False, engine='json')
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decode(text)
+        result[name] = {'bytes': len(text), 'decode_ms': (time.perf_counter() - start) / repeat * 1000}
+    return result
+
+
+if __name__ == '__main__':
+    # Measurement per figure type on the data of the dashboard (python figure_encoding.py)
+    import app
+    city = app.study_snapshot(None).sessions['CityMap'].iloc[0]
+    figures = {
+        'Gazeplot': app.update_scatter_plot_color.__wrapped__(city, None, None, 'light', 1, None),
+        'Heatmap': app.update_heatmap_color.__wrapped__(city, None, None, 'light', None),
+        'Correlation (City)': app.update_scatter_correlation_color.__wrapped__(
+            city, 'light', 'SaccadeLength', 'threshold', '', None),
+        'Correlation (all cities)': app.update_scatter_correlation_color.__wrapped__(
+            None, 'light', 'SaccadeLength', 'threshold', '', None),
+        'Boxplot': app.update_box_plot_task_duration.__wrapped__('light', None),
+        'Histogram': app.update_histogram_task_duration.__wrapped__(city, 'light', None),
+        'Saccade Distribution': app.update_saccade_distributions.__wrapped__(city, 'SaccadeAmplitude', 'light',
+                                                                             None)[0],
+    }
+    print(f'{"Figure":<26}{"JSON bytes":>12}{"binary bytes":>14}{"ratio":>7}{"JSON ms":>9}{"binary ms":>11}')
+    for name, figure in figures.items():
+        result = measure(figure)
+        print(f'{name:<26}{result["json"]["bytes"]:>12}{result["binary"]["bytes"]:>14}'
+              f'{result["json"]["bytes"] / result["binary"]["bytes"]:>7.2f}'
+              f'{result["json"]["decode_ms"]:>9.2f}{result["binary"]["decode_ms"]:>11.2f}')
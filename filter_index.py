@@ -0,0 +1,116 @@
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+
+"""
+-----------------------------------------------------------------------------------------
+Filter-Index:
+Bitmap index over the session table (one bit per session): packed bitsets per CityMap, description, user and
+task duration bucket, combined with bitwise AND; composed bitmaps are cached per filter combination
+"""
+# Composed bitmaps kept per snapshot (least recently used are dropped first):
+max_cached_filters = 512
+
+
+def set_bits(bits, rows):
+    # Sets the bits of the given positions in a packed bitset (in place)
+    np.bitwise_or.at(bits, rows >> 3, (0x80 >> (rows & 7)).astype(np.uint8))
+    return bits
+
+
+def packed_bitsets(values):
+    # One packed bitset per distinct value (np.packbits layout, 1 bit per session): value -> bitset
+    uniques, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    size = (len(codes) + 7) // 8
+    return {value: set_bits(np.zeros(size, dtype=np.uint8), order[bounds[code]:bounds[code + 1]])
+            for code, value in enumerate(uniques)}
+
+
+class BitmapIndex:
+    # Task durations are bucketed by whole seconds (upper edge: a session of 9.2 sec. is in bucket 10); per bucket
+    # the bitset of all sessions up to this bucket is kept (cumulative), so a range is two bitsets. The sessions of the
+    # boundary bucket are compared exactly, so ranges with fractional bounds are exact as well.
+    def __init__(self, sessions):
+        self.size = len(sessions)
+        self.users = sessions['user'].astype(str).to_numpy()
+        self.durations = sessions['TaskDuration'].to_numpy(dtype=float)
+        self.city_maps = packed_bitsets(sessions['CityMap'])
+        self.descriptions = packed_bitsets(sessions['description'])
+        self.user_bits = packed_bitsets(sessions['user'])
+        self.empty = np.packbits(np.zeros(self.size, dtype=bool))
+        self.full = np.packbits(np.ones(self.size, dtype=bool))
+
+        # Sessions ordered by bucket; cumulative bitset per bucket value (missing durations are in no bucket)
+        buckets = np.ceil(np.nan_to_num(self.durations, nan=np.inf))
+        self.order = np.argsort(buckets, kind='stable')
+        sorted_buckets = buckets[self.order]
+        finite = np.isfinite(sorted_buckets)
+        self.bucket_values, self.bucket_starts = np.unique(sorted_buckets[finite], return_index=True)
+        self.bucket_ends = np.append(self.bucket_starts[1:], finite.sum())
+        self.cumulative = []
+        bits = self.empty
+        for start, end in zip(self.bucket_starts, self.bucket_ends):
+            bits = set_bits(bits.copy(), self.order[start:end])
+            self.cumulative.append(bits)
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _up_to_bucket(self, bucket):
+        # Sessions in buckets <= bucket
+        position = np.searchsorted(self.bucket_values, bucket, side='right') - 1
+        return self.cumulative[position] if position >= 0 else self.empty
+
+    def _below(self, value, inclusive):
+        # Sessions with task duration < value (<= value if inclusive): all lower buckets plus the matching sessions
+        # of the boundary bucket
+        bucket = math.ceil(value)
+        bits = self._up_to_bucket(bucket - 1).copy()
+        position = np.searchsorted(self.bucket_values, bucket)
+        if position < len(self.bucket_values) and self.bucket_values[position] == bucket:
+            rows = self.order[self.bucket_starts[position]:self.bucket_ends[position]]
+            durations = self.durations[rows]
+            set_bits(bits, rows[durations <= value if inclusive else durations < value])
+        return bits
+
+    def duration_bits(self, low, high):
+        return self._below(high, True) & ~self._below(low, False)
+
+    def query(self, city_map=None, description=None, users=None, duration_range=None):
+        # Packed bitset of the sessions matching all given filters (None = no filter); cached per combination
+        if isinstance(users, str):
+            users = [users]
+        key = (city_map, description, tuple(sorted(map(str, users))) if users else None,
+               tuple(map(float, duration_range)) if duration_range else None)
+        with self._lock:
+            bits = self._cache.get(key)
+            if bits is not None:
+                self._cache.move_to_end(key)
+                return bits
+        bits = self.full
+        if city_map is not None:
+            bits = bits & self.city_maps.get(str(city_map), self.empty)
+        if description is not None:
+            bits = bits & self.descriptions.get(str(description), self.empty)
+        if users:
+            selected = self.empty
+            for user in users:
+                selected = selected | self.user_bits.get(str(user), self.empty)
+            bits = bits & selected
+        if duration_range:
+            bits = bits & self.duration_bits(*duration_range)
+        with self._lock:
+            self._cache[key] = bits
+            while len(self._cache) > max_cached_filters:
+                self._cache.popitem(last=False)
+        return bits
+
+    def rows(self, bits):
+        # Positions of the selected sessions in the session table
+        return np.flatnonzero(np.unpackbits(bits, count=self.size))
+
+    def selected_users(self, **filters):
+        return self.users[self.rows(self.query(**filters))]
@@ -0,0 +1,229 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from ingest import fixation_columns
+from stimulus_registry import stimulus_columns
+
+"""
+-----------------------------------------------------------------------------------------
+Fixation-Detection:
+Raw gaze samples to fixations (I-VT or I-DT), vectorized per recording (user and stimulus),
+recordings in parallel on a process pool; the output has the schema of the fixation data
+"""
+# Raw gaze samples, ';'-separated, one row per sample:
+# Timestamp [ms];user;StimuliName;GazePointX;GazePointY (pixels on the stimulus, empty if the gaze was lost)
+sample_columns = ['Timestamp', 'user', 'StimuliName', 'GazePointX', 'GazePointY']
+detection_methods = ['ivt', 'idt']
+# Defaults: I-VT velocity threshold in px/s (about 30°/s at 35 px per degree of visual angle) over a window in ms,
+# I-DT dispersion threshold in px (about 1°, (max x - min x) + (max y - min y)), minimal fixation duration in ms
+# and the longest data loss in ms that is interpolated (e.g. blinks are not). Adjacent fixations separated by at most
+# max_gap ms and merge_distance px (about 0.5°) are merged, since noise splits long fixations.
+velocity_threshold = 1000
+velocity_window = 20
+dispersion_threshold = 35
+min_fixation_duration = 60
+max_gap = 75
+merge_distance = 18
+
+
+def sample_runs(mask):
+    # Start and end (exclusive) of every run of True values
+    changes = np.flatnonzero(np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8)))
+    return changes[::2], changes[1::2]
+
+
+def fill_gaps(t, x, y, max_duration):
+    # Linear interpolation of lost samples in gaps up to max_duration; longer gaps stay lost
+    lost = np.isnan(x) | np.isnan(y)
+    if not lost.any() or lost.all():
+        return x, y
+    starts, ends = sample_runs(lost)
+    inner = (starts > 0) & (ends < len(t))
+    short = np.zeros(len(starts), dtype=bool)
+    short[inner] = t[ends[inner]] - t[starts[inner] - 1] <= max_duration
+    fill = np.repeat(short, ends - starts)
+    positions = np.flatnonzero(lost)[fill]
+    x, y = x.copy(), y.copy()
+    x[positions] = np.interp(t[positions], t[~lost], x[~lost])
+    y[positions] = np.interp(t[positions], t[~lost], y[~lost])
+    return x, y
+
+
+def ivt_windows(t, x, y, threshold, window):
+    # I-VT: fixations are runs of samples slower than the threshold. The velocity of a sample is measured between
+    # the samples about window/2 ms before and after it, which suppresses the noise at high sampling rates.
+    before = np.searchsorted(t, t - window / 2, side='left')
+    after = np.searchsorted(t, t + window / 2, side='right') - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        speed = np.hypot(x[after] - x[before], y[after] - y[before]) / (t[after] - t[before]) * 1000
+    speed[np.isnan(x) | np.isnan(y)] = np.nan  # lost samples break a fixation
+    return sample_runs(speed < threshold)
+
+
+class RangeExtremes:
+    # Sparse tables of min and max of x and y: extent of any sample range [start, end) in O(1), vectorized
+    def __init__(self, x, y):
+        self.levels = [(x, x, y, y)]
+        width = 1
+        while 2 * width <= len(x):
+            x_min, x_max, y_min, y_max = self.levels[-1]
+            self.levels.append((np.minimum(x_min[:-width], x_min[width:]), np.maximum(x_max[:-width], x_max[width:]),
+                                np.minimum(y_min[:-width], y_min[width:]), np.maximum(y_max[:-width], y_max[width:])))
+            width *= 2
+
+    def dispersion(self, starts, ends):
+        # (max x - min x) + (max y - min y) per range; NaN if the range contains a lost sample
+        level = np.floor(np.log2(ends - starts)).astype(int)
+        result = np.empty(len(starts), dtype=np.float32)
+        for k in np.unique(level):
+            selected = level == k
+            first, last = starts[selected], ends[selected] - (1 << k)
+            x_min, x_max, y_min, y_max = self.levels[k]
+            result[selected] = (np.maximum(x_max[first], x_max[last]) - np.minimum(x_min[first], x_min[last]) +
+                                np.maximum(y_max[first], y_max[last]) - np.minimum(y_min[first], y_min[last]))
+        return result
+
+
+def idt_windows(t, x, y, threshold, min_duration, sample_period):
+    # I-DT: a window of min_duration with a dispersion below the threshold starts a fixation, which is extended
+    # as long as the dispersion stays below the threshold; the next window starts after the fixation.
+    n = len(t)
+    extremes = RangeExtremes(x.astype(np.float32), y.astype(np.float32))
+    starts = np.arange(n)
+    min_ends = np.searchsorted(t, t + min_duration - sample_period, side='left') + 1
+    possible = min_ends <= n
+    starts, min_ends = starts[possible], min_ends[possible]
+    candidate = extremes.dispersion(starts, min_ends) <= threshold
+    starts, low = starts[candidate], min_ends[candidate]
+
+    # Longest extension of every candidate window: binary search on the end (the dispersion only grows)
+    high = np.full(len(starts), n + 1)
+    searching = high - low > 1
+    while searching.any():
+        middle = (low + high) // 2
+        inside = searching & (extremes.dispersion(starts, middle) <= threshold)
+        low = np.where(inside, middle, low)
+        high = np.where(searching & ~inside, middle, high)
+        searching = high - low > 1
+
+    # Candidate windows overlapping the previous fixation are skipped (one step per fixation, not per sample)
+    fixation_starts, fixation_ends = [], []
+    position = 0
+    while True:
+        k = np.searchsorted(starts, position)
+        if k == len(starts):
+            break
+        fixation_starts.append(starts[k])
+        fixation_ends.append(low[k])
+        position = low[k]
+    return np.array(fixation_starts, dtype=int), np.array(fixation_ends, dtype=int)
+
+
+def detect_recording(t, x, y, method='ivt', velocity=velocity_threshold, dispersion=dispersion_threshold,
+                     min_duration=min_fixation_duration):
+    # Fixations of one recording (samples ordered by time): start, duration and centroid per fixation
+    if len(t) < 2:
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+    sample_period = float(np.median(np.diff(t)))
+    x, y = fill_gaps(t, x, y, max_gap)
+    if method == 'idt':
+        starts, ends = idt_windows(t, x, y, dispersion, min_duration, sample_period)
+    else:
+        starts, ends = ivt_windows(t, x, y, velocity, velocity_window)
+    if not len(starts):
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+
+    # Centroids from cumulative sums (all samples of a fixation are valid)
+    x_cumulative = np.concatenate([[0], np.cumsum(np.nan_to_num(x))])
+    y_cumulative = np.concatenate([[0], np.cumsum(np.nan_to_num(y))])
+    x_sums = x_cumulative[ends] - x_cumulative[starts]
+    y_sums = y_cumulative[ends] - y_cumulative[starts]
+    counts = ends - starts
+    if len(starts) > 1:
+        close = np.hypot(np.diff(x_sums / counts), np.diff(y_sums / counts)) <= merge_distance
+        merge = close & (t[starts[1:]] - t[ends[:-1] - 1] <= max_gap)
+        first = np.flatnonzero(np.concatenate([[True], ~merge]))
+        last = np.concatenate([first[1:], [len(starts)]]) - 1
+        x_sums, y_sums = np.add.reduceat(x_sums, first), np.add.reduceat(y_sums, first)
+        counts = np.add.reduceat(counts, first)
+        starts, ends = starts[first], ends[last]
+
+    duration = t[ends - 1] - t[starts] + sample_period
+    keep = duration >= min_duration
+    return t[starts][keep], duration[keep], (x_sums / counts)[keep], (y_sums / counts)[keep]
+
+
+def detect_fixations(samples, method='ivt', velocity=velocity_threshold, dispersion=dispersion_threshold,
+                     min_duration=min_fixation_duration, max_workers=None):
+    # All recordings of a sample frame; returns fixations in the schema of the fixation data
+    if method not in detection_methods:
+        raise ValueError(f'unknown detection method: {method}')
+    # Samples ordered by recording and time (integer codes instead of sorting the string columns)
+    users, user_names = pd.factorize(samples['user'])
+    stimuli, stimulus_names = pd.factorize(samples['StimuliName'])
+    timestamps = samples['Timestamp'].to_numpy(dtype=float)
+    order = np.lexsort((timestamps, stimuli, users))
+    order = order[(users[order] >= 0) & (stimuli[order] >= 0) & ~np.isnan(timestamps[order])]
+    t = timestamps[order]
+    x = samples['GazePointX'].to_numpy(dtype=float)[order]
+    y = samples['GazePointY'].to_numpy(dtype=float)[order]
+    recording_codes = users[order].astype(np.int64) * len(stimulus_names) + stimuli[order]
+    bounds = np.flatnonzero(np.diff(recording_codes)) + 1
+    firsts = np.concatenate([[0], bounds]) if len(order) else bounds
+    keys = list(zip(user_names[users[order][firsts]], stimulus_names[stimuli[order][firsts]]))
+    slices = [slice(first, last) for first, last in zip(firsts, np.append(firsts[1:], len(order)))]
+
+    arguments = ([t[s] for s in slices], [x[s] for s in slices], [y[s] for s in slices],
+                 repeat(method), repeat(velocity), repeat(dispersion), repeat(min_duration))
+    if max_workers == 1 or len(slices) < 2:
+        results = list(map(detect_recording, *arguments))
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(detect_recording, *arguments,
+                                        chunksize=max(1, len(slices) // (4 * workers))))
+
+    # One frame for all recordings; FixationIndex and SaccadeLength restart with every recording
+    counts = np.array([len(result[0]) for result in results], dtype=int)
+    recording = np.repeat(np.arange(len(results)), counts)
+    if not len(recording):
+        return pd.DataFrame(columns=fixation_columns)
+    start, duration, center_x, center_y = (np.concatenate([result[i] for result in results]) for i in range(4))
+    first = np.concatenate([[True], recording[1:] != recording[:-1]])
+    saccade = np.concatenate([[np.nan], np.hypot(np.diff(center_x), np.diff(center_y))])
+    fixations = pd.DataFrame({
+        'Timestamp': start,
+        'StimuliName': [keys[i][1] for i in recording],
+        'FixationIndex': np.arange(len(recording)) - np.repeat(np.cumsum(counts) - counts, counts) + 1,
+        'FixationDuration': duration,
+        'MappedFixationPointX': center_x,
+        'MappedFixationPointY': center_y,
+        'user': [keys[i][0] for i in recording],
+        'SaccadeLength': np.where(first, np.nan, saccade)})
+    fixations = pd.concat([fixations, stimulus_columns(fixations['StimuliName'])], axis=1)
+    return fixations[fixation_columns]
+
+
+def read_gaze_samples(path, sep=';'):
+    return pd.read_csv(path, sep=sep, usecols=sample_columns,
+                       dtype={'Timestamp': 'float64', 'GazePointX': 'float64', 'GazePointY': 'float64'})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fixation detection (I-VT / I-DT) for raw gaze samples.')
+    parser.add_argument('sample_path')
+    parser.add_argument('--output', required=True, help="';'-separated fixation file (e.g. in 'incoming')")
+    parser.add_argument('--method', choices=detection_methods, default='ivt')
+    parser.add_argument('--velocity-threshold', type=float, default=velocity_threshold)
+    parser.add_argument('--dispersion-threshold', type=float, default=dispersion_threshold)
+    parser.add_argument('--min-duration', type=float, default=min_fixation_duration)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    fixations = detect_fixations(read_gaze_samples(args.sample_path), args.method, args.velocity_threshold,
+                                 args.dispersion_threshold, args.min_duration, args.workers)
+    fixations.to_csv(args.output, sep=';', index=False)
+    print(f'{len(fixations)} fixations of {fixations.groupby(["user", "StimuliName"]).ngroups} recordings '
+          f'written to {args.output}')
@@ -0,0 +1,284 @@
+import argparse
+import glob
+import hashlib
+import os
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # without pyarrow the partitions are written as ';'-separated CSV
+    pa = pq = None
+
+"""
+-----------------------------------------------------------------------------------------
+Ingest:
+Streaming (chunked) import of fixation files with per-session aggregates and per-stimulus partitions
+"""
+session_keys = ['user', 'CityMap', 'description']
+partition_dir = 'cache/partitions'
+incoming_dir = 'incoming'
+# Columns of the fixation data (data file, imports of raw samples and tracker exports):
+fixation_columns = ['Timestamp', 'StimuliName', 'FixationIndex', 'FixationDuration', 'MappedFixationPointX',
+                    'MappedFixationPointY', 'user', 'description', 'CityMap', 'City', 'SaccadeLength']
+# Types of the columns written to the partitions (the same in every chunk; numbers as float64, since a chunk with
+# fractional or missing values would otherwise not fit the integer type inferred from an earlier chunk):
+fixation_dtypes = {'Timestamp': 'float64', 'StimuliName': 'string', 'FixationIndex': 'float64',
+                   'FixationDuration': 'float64', 'MappedFixationPointX': 'float64', 'MappedFixationPointY': 'float64',
+                   'user': 'string', 'description': 'string', 'CityMap': 'string', 'City': 'string',
+                   'SaccadeLength': 'float64'}
+# Saccade features added by saccade_features (float32 columns): column -> (name, unit)
+saccade_feature_columns = {'SaccadeAmplitude': ('Saccade Amplitude', 'px'),
+                           'SaccadeAngle': ('Saccade Direction', '°'),
+                           'InterFixationTime': ('Inter-Fixation Time', 'ms'),
+                           'SaccadeVelocity': ('Saccade Velocity', 'px/s'),
+                           'Backtrack': ('Backtrack', None)}
+
+
+def session_table(df):
+    # Per-session aggregates (one row per user and stimulus) of an in-memory fixation frame
+    partial = partial_aggregates(df)
+    return finalize_sessions(partial)
+
+
+def saccade_features(df):
+    # Saccade into every fixation from the previous fixation of the same session (in recording pixels like the
+    # SaccadeLength of the data file), computed on shifted arrays over all sessions at once:
+    # SaccadeAmplitude [px], SaccadeAngle [° counterclockwise from right, -180..180], InterFixationTime [ms] between
+    # the end of the previous and the start of this fixation (needs Timestamp), SaccadeVelocity [px/s] and
+    # Backtrack (1 if the saccade turns back against the previous saccade by more than 90°).
+    # The first fixation of a session has no saccade (NaN), the second no Backtrack flag.
+    session = df.groupby(session_keys, observed=True, sort=False).ngroup().to_numpy()
+    order = np.lexsort((df['FixationIndex'].to_numpy(), session))
+    same_session = np.zeros(len(df), dtype=bool)
+    same_session[1:] = session[order][1:] == session[order][:-1]
+
+    def step(column):
+        values = df[column].to_numpy(dtype=float)[order]
+        difference = np.full(len(values), np.nan)
+        difference[1:] = values[1:] - values[:-1]
+        return np.where(same_session, difference, np.nan)
+
+    dx = step('MappedFixationPointX')
+    dy = step('MappedFixationPointY')
+    amplitude = np.hypot(dx, dy)
+    angle = np.degrees(np.arctan2(-dy, dx))  # screen y points down
+    if 'Timestamp' in df.columns:
+        interval = step('Timestamp')
+        previous_duration = np.full(len(df), np.nan)
+        previous_duration[1:] = df['FixationDuration'].to_numpy(dtype=float)[order][:-1]
+        inter_fixation_time = interval - previous_duration
+        # Overlapping fixations (start before the end of the previous one) have no valid saccade timing:
+        inter_fixation_time[inter_fixation_time < 0] = np.nan
+    else:
+        inter_fixation_time = np.full(len(df), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        velocity = np.where(inter_fixation_time > 0, amplitude / inter_fixation_time * 1000, np.nan)
+    backtrack = np.full(len(df), np.nan)
+    turn = dx[1:] * dx[:-1] + dy[1:] * dy[:-1]
+    backtrack[1:] = np.where(np.isnan(turn), np.nan, turn < 0)
+
+    features = {'SaccadeAmplitude': amplitude, 'SaccadeAngle': angle, 'InterFixationTime': inter_fixation_time,
+                'SaccadeVelocity': velocity, 'Backtrack': backtrack}
+    for column, values in features.items():
+        restored = np.empty(len(df), dtype='float32')
+        restored[order] = values
+        df[column] = restored
+    return df
+
+
+def partial_aggregates(chunk):
+    # Additive aggregates (sums and counts), so chunks can be combined without keeping any rows
+    chunk = chunk.assign(SaccadeSquared=chunk['SaccadeLength'] ** 2)
+    grouped = chunk.groupby(session_keys, observed=True, sort=False)
+    partial = grouped.agg(City=('City', 'first'),
+                          FixationDurationSum=('FixationDuration', 'sum'),
+                          FixationCount=('FixationDuration', 'count'),
+                          SaccadeLengthSum=('SaccadeLength', 'sum'),
+                          SaccadeSquaredSum=('SaccadeSquared', 'sum'),
+                          SaccadeCount=('SaccadeLength', 'count'),
+                          SaccadeLengthMax=('SaccadeLength', 'max'))
+    return partial
+
+
+def combine_aggregates(total, partial):
+    if total is None:
+        return partial
+    combined = total.reindex(total.index.union(partial.index))
+    partial = partial.reindex(combined.index)
+    for column in ['FixationDurationSum', 'FixationCount', 'SaccadeLengthSum', 'SaccadeSquaredSum', 'SaccadeCount']:
+        combined[column] = combined[column].fillna(0) + partial[column].fillna(0)
+    combined['SaccadeLengthMax'] = np.fmax(combined['SaccadeLengthMax'], partial['SaccadeLengthMax'])
+    combined['City'] = combined['City'].fillna(partial['City'])
+    return combined
+
+
+def finalize_sessions(aggregates):
+    # Task duration and average fixation duration in sec, saccade statistics per session
+    sessions = aggregates.reset_index()
+    sessions['TaskDuration'] = sessions['FixationDurationSum'] / 1000
+    sessions['AvgFixationDuration'] = sessions['FixationDurationSum'] / sessions['FixationCount'] / 1000
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sessions['SaccadeLengthMean'] = sessions['SaccadeLengthSum'] / sessions['SaccadeCount']
+        variance = sessions['SaccadeSquaredSum'] / sessions['SaccadeCount'] - sessions['SaccadeLengthMean'] ** 2
+    sessions['SaccadeLengthStd'] = np.sqrt(variance.clip(lower=0))
+    sessions['FixationCount'] = sessions['FixationCount'].astype('int64')
+    sessions['SaccadeCount'] = sessions['SaccadeCount'].astype('int64')
+    return sessions[session_keys + ['City', 'TaskDuration', 'AvgFixationDuration', 'FixationCount',
+                                    'FixationDurationSum', 'SaccadeCount', 'SaccadeLengthSum', 'SaccadeLengthMean',
+                                    'SaccadeLengthStd', 'SaccadeLengthMax']] \
+        .sort_values(session_keys, ignore_index=True)
+
+
+def partition_name(city_map, description):
+    return f'{city_map}_{description}'
+
+
+def partition_extension():
+    return '.parquet' if pq else '.csv'
+
+
+def read_partition_file(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, sep=';')
+
+
+def read_partition_store(directory):
+    # All fixations of a partition directory (e.g. written by tracker_import) as one frame
+    partitions = pd.read_csv(os.path.join(directory, 'partitions.csv'), sep=';')
+    return pd.concat([read_partition_file(path) for path in partitions['path']], ignore_index=True)
+
+
+def write_appended_partition(part, output_dir, city_map, description):
+    # Rows appended to a stimulus go to an additional file; the name is derived from the content,
+    # so appending the same rows again (e.g. after a restart) reuses the existing file
+    part = part.reset_index(drop=True)
+    digest = hashlib.sha1(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes()).hexdigest()[:12]
+    path = os.path.join(output_dir, f'{partition_name(city_map, description)}_{digest}{partition_extension()}')
+    if not os.path.exists(path):
+        os.makedirs(output_dir, exist_ok=True)
+        if pq:
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=False), path)
+        else:
+            part.to_csv(path, sep=';', index=False)
+    return path
+
+
+class PartitionWriter:
+    # Appends rows to one file per stimulus (Parquet if pyarrow is available, otherwise CSV)
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.extension = partition_extension()
+        self.rows = {}
+        self._writers = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def path(self, city_map, description):
+        return os.path.join(self.output_dir, partition_name(city_map, description) + self.extension)
+
+    def write(self, city_map, description, part):
+        # Every chunk is written with the declared column types, whatever types its reader inferred
+        key = (city_map, description)
+        path = self.path(city_map, description)
+        part = part.reset_index(drop=True).astype({column: dtype for column, dtype in fixation_dtypes.items()
+                                                   if column in part.columns})
+        if pq:
+            table = pa.Table.from_pandas(part, preserve_index=False)
+            if key not in self._writers:
+                self._writers[key] = pq.ParquetWriter(path, table.schema)
+            self._writers[key].write_table(table.cast(self._writers[key].schema))
+        else:
+            part.to_csv(path, sep=';', index=False, mode='a' if key in self.rows else 'w', header=key not in self.rows)
+        self.rows[key] = self.rows.get(key, 0) + len(part)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def index(self):
+        return pd.DataFrame([{'CityMap': city_map, 'description': description,
+                              'path': self.path(city_map, description), 'rows': rows}
+                             for (city_map, description), rows in sorted(self.rows.items())],
+                            columns=['CityMap', 'description', 'path', 'rows'])
+
+
+def stream_ingest(data_path, output_dir=partition_dir, chunksize=500_000, sep=';'):
+    # Reads the fixation file chunk by chunk; peak memory is bounded by the chunk size, not the file size.
+    return ingest_chunks(pd.read_csv(data_path, sep=sep, chunksize=chunksize, dtype=fixation_dtypes), output_dir)
+
+
+def ingest_chunks(chunks, output_dir=partition_dir):
+    # Consumes fixation chunks (CSV reader or tracker export parser) one at a time.
+    # Writes one partition per stimulus, the session table and the partition index to output_dir.
+    writer = PartitionWriter(output_dir)
+    aggregates = None
+    try:
+        for chunk in chunks:
+            chunk = chunk.dropna(subset=session_keys)
+            aggregates = combine_aggregates(aggregates, partial_aggregates(chunk))
+            for (city_map, description), part in chunk.groupby(['CityMap', 'description'], sort=False):
+                writer.write(city_map, description, part)
+    finally:
+        writer.close()
+
+    sessions = finalize_sessions(aggregates) if aggregates is not None else finalize_sessions(
+        partial_aggregates(pd.DataFrame(columns=session_keys + ['City', 'FixationDuration', 'SaccadeLength'])))
+    sessions.to_csv(os.path.join(output_dir, 'sessions.csv'), sep=';', index=False)
+    partitions = writer.index()
+    partitions.to_csv(os.path.join(output_dir, 'partitions.csv'), sep=';', index=False)
+    return sessions, partitions
+
+
+def process_incoming_file(path, handle_file):
+    # Hands one dropped file to handle_file; moves it to processed/ or rejected/ (with the reason) afterwards
+    directory, name = os.path.split(path)
+    try:
+        result = handle_file(pd.read_csv(path, sep=';'))
+    except Exception as error:  # any failure rejects the file, the watcher keeps running
+        os.makedirs(os.path.join(directory, 'rejected'), exist_ok=True)
+        shutil.move(path, os.path.join(directory, 'rejected', name))
+        with open(os.path.join(directory, 'rejected', name + '.error.txt'), 'w', encoding='utf-8') as file:
+            file.write(str(error))
+        return None
+    os.makedirs(os.path.join(directory, 'processed'), exist_ok=True)
+    shutil.move(path, os.path.join(directory, 'processed', name))
+    return result
+
+
+def watch_drop_directory(handle_file, directory=incoming_dir, interval=5, stop=None):
+    # Polls the drop directory for new session files (*.csv) in a daemon thread until the stop event is set.
+    # Files are picked up once their size no longer changes between two polls.
+    sizes = {}
+    stop = stop or threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            for path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+                size = os.path.getsize(path)
+                if sizes.get(path) == size:
+                    sizes.pop(path)
+                    process_incoming_file(path, handle_file)
+                else:
+                    sizes[path] = size
+            stop.wait(interval)
+
+    os.makedirs(directory, exist_ok=True)
+    thread = threading.Thread(target=poll, name='drop-directory-watcher', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Streaming import of a fixation file into per-stimulus partitions.')
+    parser.add_argument('data_path', nargs='?', default='assets/all_fixation_data_cleaned_up.csv')
+    parser.add_argument('--output', default=partition_dir)
+    parser.add_argument('--chunksize', type=int, default=500_000)
+    args = parser.parse_args()
+    sessions, partitions = stream_ingest(args.data_path, args.output, args.chunksize)
+    print(f'{len(sessions)} sessions, {partitions["rows"].sum()} fixations in {len(partitions)} partitions '
+          f'written to {args.output}')
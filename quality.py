@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+"""
+-----------------------------------------------------------------------------------------
+Data-Quality:
+Validity of every fixation as bit flags (one uint8 per row, computed once when the data is prepared)
+and a quality summary per stimulus
+"""
+# Bits of the QualityFlags column:
+quality_flags = {'OutOfBounds': 1,           # calibrated point outside the stimulus image
+                 'NonPositiveDuration': 2,   # FixationDuration <= 0 or missing
+                 'DuplicateIndex': 4,        # FixationIndex occurs more than once in the session
+                 'MissingSaccade': 8,        # SaccadeLength missing although a previous fixation exists
+                 'MissingVariant': 16}       # the user has no session on the other variant (color/grey) of the map
+# Fixations with these flags are not drawn (gaze plots, heat maps):
+hidden_flags = quality_flags['OutOfBounds'] | quality_flags['NonPositiveDuration']
+# Flags counted from the rows; MissingVariant is a property of the session and counted from the session table
+row_flags = ['OutOfBounds', 'NonPositiveDuration', 'DuplicateIndex', 'MissingSaccade']
+
+
+def fixation_flags(df):
+    # Row checks of prepared fixations (InBounds and SaccadeAmplitude are computed before); vectorized over all rows
+    flags = np.zeros(len(df), dtype=np.uint8)
+    flags |= np.where(df['InBounds'].to_numpy(dtype=bool), 0, quality_flags['OutOfBounds']).astype(np.uint8)
+    duration = df['FixationDuration'].to_numpy(dtype=float)
+    flags |= np.where(duration > 0, 0, quality_flags['NonPositiveDuration']).astype(np.uint8)
+    duplicates = df.duplicated(['user', 'CityMap', 'description', 'FixationIndex'], keep=False).to_numpy()
+    flags |= np.where(duplicates, quality_flags['DuplicateIndex'], 0).astype(np.uint8)
+    # The first fixation of a session has no previous fixation (SaccadeAmplitude is missing as well)
+    missing = df['SaccadeLength'].isna().to_numpy() & df['SaccadeAmplitude'].notna().to_numpy()
+    flags |= np.where(missing, quality_flags['MissingSaccade'], 0).astype(np.uint8)
+    return flags
+
+
+def single_variant_sessions(sessions):
+    # Sessions whose user has no session on the other variant of the same City Map
+    variants = sessions.groupby(['user', 'CityMap'], observed=True)['description'].transform('nunique')
+    return (variants < 2).to_numpy()
+
+
+def mark_missing_variants(df, sessions, rows=None):
+    # Sets the MissingVariant bit from the session table (also clears it once the other variant exists), of all rows
+    # or of the given row positions only; the flags of the other rows are kept
+    rows = np.arange(len(df)) if rows is None else np.asarray(rows, dtype=np.int64)
+    single = sessions.loc[single_variant_sessions(sessions), ['user', 'CityMap', 'description']]
+    missing = pd.MultiIndex.from_frame(df[['user', 'CityMap', 'description']].iloc[rows].astype(object)) \
+        .isin(pd.MultiIndex.from_frame(single.astype(object)))
+    flags = df['QualityFlags'].to_numpy(dtype=np.uint8).copy()
+    flags[rows] = (flags[rows] & ~np.uint8(quality_flags['MissingVariant'])) | \
+        np.where(missing, quality_flags['MissingVariant'], 0).astype(np.uint8)
+    df['QualityFlags'] = flags
+    return df
+
+
+def visible(flags):
+    return (np.asarray(flags) & hidden_flags) == 0
+
+
+def flag_counts(df):
+    # Additive counts per stimulus (rows and rows per row flag), so appended sessions are added to the summary
+    flags = df['QualityFlags'].to_numpy(dtype=np.uint8)
+    counts = pd.DataFrame({'Fixations': np.ones(len(df), dtype=np.int64),
+                           'Visible': visible(flags).astype(np.int64),
+                           **{name: ((flags & quality_flags[name]) > 0).astype(np.int64) for name in row_flags}})
+    counts['CityMap'] = df['CityMap'].to_numpy()
+    counts['description'] = df['description'].to_numpy()
+    return counts.groupby(['CityMap', 'description'], observed=True).sum()
+
+
+def quality_summary(counts, sessions):
+    # Counts per stimulus plus the fixations of sessions without the other variant (from the session table)
+    single = sessions[single_variant_sessions(sessions)]
+    missing_variant = single.groupby(['CityMap', 'description'], observed=True)['FixationCount'].sum()
+    summary = counts.drop(columns='MissingVariant', errors='ignore').copy()
+    summary['MissingVariant'] = missing_variant.reindex(summary.index, fill_value=0).astype(np.int64)
+    return summary
+
+
+def add_counts(summary, counts):
+    combined = summary.drop(columns='MissingVariant').add(counts, fill_value=0)
+    return combined.astype(np.int64).sort_index()
+
+
+def quality_values(summary, city_map=None):
+    # Summary of color and grey of one City Map (or all cities if None)
+    if city_map is not None:
+        summary = summary[summary.index.get_level_values('CityMap') == city_map]
+    totals = summary.groupby(level='description').sum()
+    return {description: totals.loc[description].to_dict() if description in totals.index else
+            {column: 0 for column in summary.columns} for description in ['color', 'grey']}
@@ -0,0 +1,223 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+"""
+-----------------------------------------------------------------------------------------
+Scanpath-Similarity:
+Pairwise comparison of all sessions of a stimulus (edit distance and MultiMatch-style vectors)
+"""
+similarity_cache_dir = 'cache/similarity'
+similarity_methods = {
+    'grid': 'String Edit Distance (5x5 Grid)',
+    'aoi': 'String Edit Distance (AOIs)',
+    'multimatch': 'MultiMatch (Vector Comparison)'
+}
+grid_size = 5
+# Bump when the algorithms change, so old cache files are not reused:
+cache_version = 2
+
+
+def edit_distance(a, b):
+    # Levenshtein distance; each DP row is vectorized (insertions resolved with a cumulative minimum)
+    if len(a) == 0 or len(b) == 0:
+        return max(len(a), len(b))
+    offsets = np.arange(len(b) + 1)
+    previous = offsets.astype(float)
+    for i in range(1, len(a) + 1):
+        current = np.empty_like(previous)
+        current[0] = i
+        current[1:] = np.minimum(previous[1:] + 1, previous[:-1] + (b != a[i - 1]))
+        current = np.minimum.accumulate(current - offsets) + offsets
+        previous = current
+    return previous[-1]
+
+
+def edit_similarity(a, b):
+    # Undefined (NaN) for two empty sequences, e.g. sessions without a fixation in an AOI
+    longest = max(len(a), len(b))
+    return 1.0 - edit_distance(a, b) / longest if longest else np.nan
+
+
+def _alignment(cost):
+    # Cheapest monotone path through the cost matrix (moves: down, right, diagonal), one anti-diagonal at a time
+    n, m = cost.shape
+    total = np.full((n + 1, m + 1), np.inf)
+    total[0, 0] = 0
+    for d in range(2, n + m + 1):
+        i = np.arange(max(1, d - m), min(n, d - 1) + 1)
+        j = d - i
+        total[i, j] = cost[i - 1, j - 1] + np.minimum(np.minimum(total[i - 1, j], total[i, j - 1]), total[i - 1, j - 1])
+
+    path = [(n - 1, m - 1)]
+    i, j = n, m
+    while (i, j) != (1, 1):
+        steps = [(i - 1, j - 1), (i - 1, j), (i, j - 1)]
+        i, j = min((step for step in steps if step[0] >= 1 and step[1] >= 1), key=lambda step: total[step])
+        path.append((i - 1, j - 1))
+    return np.array(path[::-1])
+
+
+def multimatch(a, b, diagonal):
+    # MultiMatch-style comparison of two scanpaths given as arrays (x, y, duration) per fixation.
+    # Saccade vectors are aligned by the cheapest path through their difference matrix (without the
+    # simplification step of the original method); returns vector, direction, length, position and
+    # duration similarity (each 0..1).
+    if len(a) < 2 or len(b) < 2:
+        return np.full(5, np.nan)
+    u = np.diff(a[:, :2], axis=0)
+    v = np.diff(b[:, :2], axis=0)
+    cost = np.linalg.norm(u[:, None, :] - v[None, :, :], axis=2)
+    path = _alignment(cost)
+    i, j = path[:, 0], path[:, 1]
+
+    angle = np.abs(np.arctan2(u[i, 1], u[i, 0]) - np.arctan2(v[j, 1], v[j, 0]))
+    angle = np.minimum(angle, 2 * np.pi - angle)
+    duration_a, duration_b = a[i, 2], b[j, 2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        duration = np.abs(duration_a - duration_b) / np.maximum(duration_a, duration_b)
+    return np.array([
+        1 - cost[i, j].mean() / (2 * diagonal),
+        1 - angle.mean() / np.pi,
+        1 - np.abs(np.linalg.norm(u[i], axis=1) - np.linalg.norm(v[j], axis=1)).mean() / diagonal,
+        1 - np.linalg.norm(a[i, :2] - b[j, :2], axis=1).mean() / diagonal,
+        1 - np.nan_to_num(duration).mean()
+    ])
+
+
+def _similarity_rows(sequences, rows, method, diagonal):
+    # Worker: similarities of the given rows against all later sequences (upper triangle)
+    n = len(sequences)
+    block = np.full((len(rows), n), np.nan)
+    for position, i in enumerate(rows):
+        for j in range(i + 1, n):
+            if method == 'multimatch':
+                block[position, j] = np.nanmean(multimatch(sequences[i], sequences[j], diagonal))
+            else:
+                block[position, j] = edit_similarity(sequences[i], sequences[j])
+    return rows, block
+
+
+def sequence_hash(sequences, method, diagonal):
+    digest = hashlib.sha1(f'{cache_version}:{method}:{diagonal:.3f}:{len(sequences)}'.encode())
+    for sequence in sequences:
+        array = np.ascontiguousarray(sequence)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+class ScanpathSimilarity:
+    # N x N similarity matrices per (CityMap, description), computed on a process pool and cached on disk
+    def __init__(self, aoi_engine, cache_dir=similarity_cache_dir, x_col='MappedFixationPointX',
+                 y_col='MappedFixationPointY', max_workers=None):
+        self.aoi_engine = aoi_engine
+        self.cache_dir = cache_dir
+        self.x_col = x_col
+        self.y_col = y_col
+        self.max_workers = max_workers
+        self._executor = None
+        self._memory = {}
+
+    def derive(self, aoi_engine):
+        # Same process pool and result cache (keyed by the sequence hash) for the engine of a new snapshot
+        similarity = ScanpathSimilarity(aoi_engine, self.cache_dir, self.x_col, self.y_col, self.max_workers)
+        similarity._executor = self.executor()
+        similarity._memory = self._memory
+        return similarity
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def sequences(self, city_map, description, method, width, height):
+        # One sequence per session (user): grid cells, AOI codes or raw (x, y, duration) fixations
+        arrays = self.aoi_engine.dataset.stimulus_arrays(city_map, description,
+                                                         ['user', self.x_col, self.y_col, 'FixationDuration'])
+        users = arrays['user']
+        x = np.asarray(arrays[self.x_col], dtype=float)
+        y = np.asarray(arrays[self.y_col], dtype=float)
+
+        if method == 'aoi':
+            values = self.aoi_engine.assignment(city_map, description)
+        elif method == 'grid':
+            column = np.clip((x / width * grid_size).astype(int), 0, grid_size - 1)
+            row = np.clip((y / height * grid_size).astype(int), 0, grid_size - 1)
+            values = row * grid_size + column
+        else:
+            values = np.column_stack([x, y, np.asarray(arrays['FixationDuration'], dtype=float)])
+
+        session_users, starts = np.unique(users, return_index=True)
+        bounds = np.r_[starts, len(users)]
+        sequences = [values[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        if method == 'aoi':
+            sequences = [sequence[sequence >= 0] for sequence in sequences]
+        return list(session_users), sequences
+
+    def matrix(self, city_map, description, method, width, height):
+        users, sequences = self.sequences(city_map, description, method, width, height)
+        diagonal = float(np.hypot(width, height))
+        key = sequence_hash(sequences, method, diagonal)
+        if key in self._memory:
+            return self._memory[key]
+
+        cache_file = os.path.join(self.cache_dir, f'{key}.npz')
+        if os.path.exists(cache_file):
+            with np.load(cache_file, allow_pickle=False) as cached:
+                result = users, cached['matrix']
+            self._memory[key] = result
+            return result
+
+        n = len(sequences)
+        matrix = np.full((n, n), np.nan)
+        if n:
+            # Interleaved row chunks keep the (triangular) work balanced across the workers
+            n_chunks = min(n, 4 * (self.max_workers or os.cpu_count() or 1))
+            futures = [self.executor().submit(_similarity_rows, sequences, list(range(k, n, n_chunks)), method, diagonal)
+                       for k in range(n_chunks)]
+            for future in futures:
+                rows, block = future.result()
+                matrix[rows] = block
+            upper = np.triu_indices(n, 1)
+            matrix.T[upper] = matrix[upper]
+            np.fill_diagonal(matrix, [1.0 if len(sequence) else np.nan for sequence in sequences])
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.savez_compressed(cache_file, matrix=matrix)
+        self._memory[key] = users, matrix
+        return users, matrix
+
+    def summary(self, stimuli, method, image_sizes):
+        # Mean pairwise similarity per stimulus (color vs. grey); image_sizes maps (CityMap, description) to (w, h)
+        records = []
+        for city_map, description in stimuli:
+            width, height = image_sizes[(city_map, description)]
+            users, matrix = self.matrix(city_map, description, method, width, height)
+            records.append({'CityMap': city_map, 'description': description,
+                            'MeanSimilarity': mean_similarity(matrix), 'Sessions': len(users)})
+        return pd.DataFrame(records, columns=['CityMap', 'description', 'MeanSimilarity', 'Sessions'])
+
+
+def mean_similarity(matrix):
+    values = matrix[np.triu_indices(len(matrix), 1)]
+    if not np.isfinite(values).any():
+        return np.nan
+    return np.nanmean(values)
+
+
+def cluster_order(matrix):
+    # Spectral seriation: order sessions by the Fiedler vector of the similarity graph
+    if len(matrix) < 3:
+        return np.arange(len(matrix))
+    weights = np.nan_to_num(np.clip(matrix, 0, None))
+    np.fill_diagonal(weights, 0)
+    laplacian = np.diag(weights.sum(axis=1)) - weights
+    _, vectors = np.linalg.eigh(laplacian)
+    return np.argsort(vectors[:, 1])
@@ -0,0 +1,128 @@
+import threading
+from aoi import AOIEngine
+from filter_index import BitmapIndex
+from transitions import TransitionStore
+from scanpath_similarity import ScanpathSimilarity, similarity_cache_dir
+
+"""
+-----------------------------------------------------------------------------------------
+Snapshot:
+Immutable state of the loaded data (fixations, sessions, indexes, caches) with atomic hot-swap
+"""
+
+
+class Snapshot:
+    # One published version of the data: the Dataset (or PartitionedDataset: session table, partition index,
+    # KPI store, density grids), the filter index and the caches derived from it. A snapshot is never modified after it was published;
+    # callbacks take one snapshot per request and read everything from it. AOI edits publish a new snapshot as well.
+    def __init__(self, dataset, aoi_engine, similarity, version, filters=None):
+        self.dataset = dataset
+        self.sessions = dataset.sessions
+        # Bitmap index of the session table (city, variant, user and task duration filters of the detail views)
+        self.filters = BitmapIndex(dataset.sessions) if filters is None else filters
+        self.aoi_engine = aoi_engine
+        self.transitions = TransitionStore(aoi_engine)
+        self.similarity = similarity
+        self.version = version
+
+    @classmethod
+    def create(cls, dataset, aoi_definitions, cache_dir=similarity_cache_dir, x_col='S1FramePointX',
+               y_col='S1FramePointY'):
+        aoi_engine = AOIEngine(dataset, aoi_definitions, x_col=x_col, y_col=y_col)
+        similarity = ScanpathSimilarity(aoi_engine, cache_dir=cache_dir, x_col=x_col, y_col=y_col)
+        return cls(dataset, aoi_engine, similarity, version=1)
+
+    def derive(self, dataset, stimuli=None):
+        # Snapshot of an updated dataset; cached entries of stimuli outside 'stimuli' are carried over
+        # (stimuli=None: everything may have changed, e.g. after a reload)
+        aoi_engine = self.aoi_engine.derive(dataset, stimuli)
+        return Snapshot(dataset, aoi_engine, self.similarity.derive(aoi_engine), self.version + 1)
+
+    def with_aois(self, aoi_engine):
+        # Snapshot of the same data with edited AOIs (filter index shared, transitions recomputed on demand)
+        return Snapshot(self.dataset, aoi_engine, self.similarity.derive(aoi_engine), self.version + 1, self.filters)
+
+    def append(self, new_df):
+        dataset, affected = self.dataset.append(new_df)
+        return self.derive(dataset, affected), affected
+
+    def warm(self):
+        # Fills the AOI and transition caches before the snapshot is published, so the first requests
+        # after a swap do not all recompute them at the same time
+        for (city_map, description), aois in list(self.aoi_engine.definitions.items()):
+            if aois:
+                self.aoi_engine.assignment(city_map, description)
+        self.transitions.result()
+        return self
+
+
+class SnapshotStore:
+    # Holds the current snapshot. Readers call current() without any lock (one reference read);
+    # writers (append, reload, AOI edits) are serialized and publish by swapping the reference (RCU-style).
+    # Requests still running on the previous snapshot finish on it unchanged.
+    def __init__(self, snapshot):
+        self._current = snapshot
+        self._write_lock = threading.Lock()
+        # Frames appended while a reload is being built (None = no reload running):
+        self._pending = None
+        self.last_error = None
+
+    def current(self):
+        return self._current
+
+    @property
+    def reloading(self):
+        return self._pending is not None
+
+    def append(self, new_df):
+        # Appends new sessions; returns the affected stimuli (raises ValueError for invalid files)
+        with self._write_lock:
+            snapshot, affected = self._current.append(new_df)
+            self._current = snapshot.warm()
+            if self._pending is not None:
+                self._pending.append(new_df)
+        return affected
+
+    def close(self):
+        # Releases the worker processes of the similarity engine (study evicted)
+        self._current.similarity.close()
+
+    def edit(self, change):
+        # Change of the user state (AOI definitions), e.g. edit(lambda aoi_engine: ...): applied to a copy of the AOI
+        # engine of the current snapshot, a snapshot with the edited engine is published if the AOIs changed
+        with self._write_lock:
+            aoi_engine = self._current.aoi_engine.copy()
+            result = change(aoi_engine)
+            if aoi_engine.version != self._current.aoi_engine.version:
+                self._current = self._current.with_aois(aoi_engine)
+            return result
+
+    def reload(self, build_dataset):
+        # Builds a new dataset with build_dataset() in a background thread, requests keep being served
+        # from the current snapshot meanwhile. Returns None if a reload is already running.
+        with self._write_lock:
+            if self._pending is not None:
+                return None
+            self._pending = []
+        thread = threading.Thread(target=self._reload, args=(build_dataset,), name='dataset-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def _reload(self, build_dataset):
+        try:
+            dataset = build_dataset()
+        except Exception as error:  # a failed reload keeps the current snapshot
+            with self._write_lock:
+                self._pending = None
+                self.last_error = str(error)
+            return
+        with self._write_lock:
+            # Sessions appended during the build are replayed onto the new data:
+            for new_df in self._pending:
+                try:
+                    dataset, _ = dataset.append(new_df)
+                except ValueError:  # already part of the reloaded data
+                    pass
+            self._pending = None
+            self.last_error = None
+            self._current = self._current.derive(dataset).warm()
@@ -0,0 +1,195 @@
+import glob
+import hashlib
+import os
+import re
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+"""
+-----------------------------------------------------------------------------------------
+Stimulus-Registry:
+Stimulus images and coordinate transforms between the S1 and S2 version of a City Map
+"""
+# Clockwise rotation of the S2 images relative to S1, ';'-separated like the fixation data (stimuli without entry
+# are compared with their S1 image at startup):
+# CityMap;description;Rotation
+# Antwerpen_S2;color;0
+transform_path = 'assets/stimulus_transforms.csv'
+# Calibration of stimuli whose fixations were recorded in another resolution than the image:
+# NormalizedPoint = (MappedFixationPoint - Offset) / SourceSize * ImageSize
+calibration_path = 'assets/stimulus_calibration.csv'
+image_name = re.compile(r'^\d+b?_(?P<city_map>.+_S\d)_(?P<variant>Color|Grey)\.jpg$')
+# Stimulus names of the fixation data: '01_Antwerpen_S1.jpg' (color) and '01b_Antwerpen_S1.jpg' (grey)
+stimulus_name = re.compile(r'^\d+(?P<grey>b?)_(?P<city_map>(?P<city>.+)_S\d)\.\w+$')
+# Stimulus images are served by content hash: 'stimulus-images/<study>/<hash>.jpg' (relative to the dashboard page)
+image_route = 'stimulus-images'
+
+
+def file_hash(path, chunk_size=2 ** 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def build_image_registry(assets_dir='assets'):
+    # Path, size and content hash of every stimulus image, read once: (CityMap, description) -> dict
+    registry = {}
+    for image_path in sorted(glob.glob(os.path.join(assets_dir, '*.jpg'))):
+        match = image_name.match(os.path.basename(image_path))
+        if match:
+            with Image.open(image_path) as img:
+                width, height = img.size
+            description = 'color' if match.group('variant') == 'Color' else 'grey'
+            registry[(match.group('city_map'), description)] = {
+                'path': image_path.replace(os.sep, '/'), 'width': width, 'height': height,
+                'hash': file_hash(image_path)}
+    return registry
+
+
+def image_url(study_id, image):
+    # Changes with the image content, so browsers and proxies can keep the image forever
+    return f'{image_route}/{study_id}/{image["hash"]}{os.path.splitext(image["path"])[1]}'
+
+
+def stimulus_columns(stimuli_names):
+    # CityMap, City and description derived from StimuliName (vectorized, missing for names of another pattern)
+    parts = pd.Series(stimuli_names, dtype=object).astype(str).str.extract(stimulus_name)
+    description = parts['grey'].map({'b': 'grey', '': 'color'})
+    return pd.DataFrame({'CityMap': parts['city_map'], 'City': parts['city'], 'description': description})
+
+
+def load_calibration(path=calibration_path):
+    columns = ['CityMap', 'description', 'SourceWidth', 'SourceHeight', 'OffsetX', 'OffsetY']
+    if not os.path.exists(path):
+        return pd.DataFrame({column: pd.Series(dtype='object' if column in ['CityMap', 'description'] else 'float64')
+                             for column in columns})
+    return pd.read_csv(path, sep=';')[columns]
+
+
+def apply_calibration(df, calibration, image_registry):
+    # Adds NormalizedPointX/Y (pixel coordinates on the stimulus image) and the InBounds mask, once at load time
+    images = pd.DataFrame([{'CityMap': city_map, 'description': description,
+                            'ImageWidth': image['width'], 'ImageHeight': image['height']}
+                           for (city_map, description), image in image_registry.items()],
+                          columns=['CityMap', 'description', 'ImageWidth', 'ImageHeight'])
+    table = images.merge(calibration, on=['CityMap', 'description'], how='left')
+    # Without calibration entry the data already is in image resolution
+    table['SourceWidth'] = table['SourceWidth'].fillna(table['ImageWidth'])
+    table['SourceHeight'] = table['SourceHeight'].fillna(table['ImageHeight'])
+    table[['OffsetX', 'OffsetY']] = table[['OffsetX', 'OffsetY']].fillna(0)
+
+    keys = pd.MultiIndex.from_frame(table[['CityMap', 'description']])
+    position = keys.get_indexer(pd.MultiIndex.from_arrays([df['CityMap'], df['description']]))
+    known = position >= 0
+    parameters = table[['SourceWidth', 'SourceHeight', 'OffsetX', 'OffsetY', 'ImageWidth', 'ImageHeight']] \
+        .to_numpy(dtype=float)
+    parameters = np.vstack([parameters, np.full(6, np.nan)])[position]
+
+    x = df['MappedFixationPointX'].to_numpy(dtype=float)
+    y = df['MappedFixationPointY'].to_numpy(dtype=float)
+    normalized_x = np.where(known, (x - parameters[:, 2]) / parameters[:, 0] * parameters[:, 4], x)
+    normalized_y = np.where(known, (y - parameters[:, 3]) / parameters[:, 1] * parameters[:, 5], y)
+    df['NormalizedPointX'] = normalized_x
+    df['NormalizedPointY'] = normalized_y
+    # Fixations of stimuli without image cannot be checked against bounds and are kept
+    df['InBounds'] = ~known | ((normalized_x >= 0) & (normalized_x <= parameters[:, 4]) &
+                               (normalized_y >= 0) & (normalized_y <= parameters[:, 5]))
+    return df
+
+
+def load_transform_overrides(path=transform_path):
+    if not os.path.exists(path):
+        return {}
+    overrides = pd.read_csv(path, sep=';')
+    return {(row['CityMap'], row['description']): int(row['Rotation']) % 360 for _, row in overrides.iterrows()}
+
+
+def reference_image(image_registry, city_map, description):
+    # S1 image of the same variant (the stimulus itself for S1 or without S1 image); its size is the S1 frame
+    image = image_registry.get((city_map, description))
+    return image_registry.get((re.sub(r'_S\d$', '_S1', city_map), description), image)
+
+
+def thumbnail(path, size):
+    # Grey values of the image reduced to size (JPEGs are decoded at a reduced scale)
+    with Image.open(path) as img:
+        img.draft('L', size)
+        return np.asarray(img.convert('L').resize(size, Image.BILINEAR), dtype=float)
+
+
+def infer_rotation(s1_path, s2_path, size=(128, 96)):
+    # Clockwise rotation of the S2 image relative to S1 from the image content: the S2 image turned back by
+    # 0, 90, 180 and 270° is compared with the S1 image (correlation of the grey values), the best match wins
+    reference = thumbnail(s1_path, size)
+    reference = reference - reference.mean()
+    with Image.open(s2_path) as img:
+        img.draft('L', size)
+        image = img.convert('L')
+    scores = {}
+    for rotation in [0, 90, 180, 270]:
+        candidate = np.asarray(image.rotate(rotation, expand=True).resize(size, Image.BILINEAR), dtype=float)
+        candidate = candidate - candidate.mean()
+        scores[rotation] = (reference * candidate).sum() / (np.sqrt((reference ** 2).sum() * (candidate ** 2).sum())
+                                                            or 1)
+    return max(scores, key=scores.get)
+
+
+def rotation_coefficients(rotation, width, height):
+    # Undo a clockwise rotation of an image of size (width, height):
+    # X = a*x + b*y + c, Y = d*x + e*y + f, plus the size of the resulting (unrotated) frame
+    if rotation == 90:
+        return (0, 1, 0, -1, 0, width), (height, width)
+    if rotation == 180:
+        return (-1, 0, width, 0, -1, height), (width, height)
+    if rotation == 270:
+        return (0, -1, height, 1, 0, 0), (height, width)
+    return (1, 0, 0, 0, 1, 0), (width, height)
+
+
+def build_transform_registry(image_registry, overrides=None):
+    # One affine transform per stimulus into the frame of the S1 image of the same variant; rotations missing in the
+    # overrides are inferred from the image content
+    overrides = overrides or {}
+    records = []
+    for (city_map, description), image in sorted(image_registry.items()):
+        reference = reference_image(image_registry, city_map, description)
+        rotation = overrides.get((city_map, description))
+        if rotation is None:
+            rotation = 0 if reference is image else infer_rotation(reference['path'], image['path'])
+
+        (a, b, c, d, e, f), (frame_width, frame_height) = rotation_coefficients(rotation, image['width'], image['height'])
+        scale_x = reference['width'] / frame_width
+        scale_y = reference['height'] / frame_height
+        records.append({'CityMap': city_map, 'description': description, 'Rotation': rotation,
+                        'a': a * scale_x, 'b': b * scale_x, 'c': c * scale_x,
+                        'd': d * scale_y, 'e': e * scale_y, 'f': f * scale_y})
+    return pd.DataFrame(records, columns=['CityMap', 'description', 'Rotation', 'a', 'b', 'c', 'd', 'e', 'f'])
+
+
+def apply_transforms(df, transform_registry, x_col='NormalizedPointX', y_col='NormalizedPointY'):
+    # Adds S1FramePointX/Y: coordinates of every fixation in the S1 frame of its City Map (vectorized)
+    keys = pd.MultiIndex.from_frame(transform_registry[['CityMap', 'description']])
+    position = keys.get_indexer(pd.MultiIndex.from_arrays([df['CityMap'], df['description']]))
+    coefficients = transform_registry[['a', 'b', 'c', 'd', 'e', 'f']].to_numpy(dtype=float)
+    # Stimuli without image keep their coordinates (identity transform)
+    coefficients = np.vstack([coefficients, [1, 0, 0, 0, 1, 0]])[position]
+
+    x = df[x_col].to_numpy(dtype=float)
+    y = df[y_col].to_numpy(dtype=float)
+    df['S1FramePointX'] = (coefficients[:, 0] * x + coefficients[:, 1] * y + coefficients[:, 2]).astype('float32')
+    df['S1FramePointY'] = (coefficients[:, 3] * x + coefficients[:, 4] * y + coefficients[:, 5]).astype('float32')
+    return df
+
+
+def frame_background(image_registry, transform_registry, city_map, description):
+    # Image shown behind the S1-frame coordinates of a stimulus: the stimulus itself stretched to the frame, or the
+    # S1 image of the variant if the stimulus is rotated (layout images of plotly cannot be rotated)
+    image = image_registry.get((city_map, description))
+    rotation = transform_registry.loc[(transform_registry['CityMap'] == city_map) &
+                                      (transform_registry['description'] == description), 'Rotation']
+    if image is None or rotation.empty or rotation.iloc[0] == 0:
+        return image
+    return reference_image(image_registry, city_map, description)
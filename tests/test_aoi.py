@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aoi import AOIEngine, load_aoi_file, save_aoi_file
+from dataset import Dataset
+from stimulus_registry import build_transform_registry, load_calibration
+
+"""
+-----------------------------------------------------------------------------------------
+AOI-Engine:
+Time to first fixation from the recording time, copy-on-write edits and the AOI file
+"""
+stimulus_images = {('Antwerpen_S1', 'color'): {'path': 'assets/01_Antwerpen_S1_Color.jpg', 'width': 1000,
+                                                'height': 800, 'hash': '0'}}
+left = {'name': 'Left', 'type': 'rect', 'x0': 0, 'y0': 0, 'x1': 500, 'y1': 800}
+right = {'name': 'Right', 'type': 'rect', 'x0': 500, 'y0': 0, 'x1': 1000, 'y1': 800}
+
+
+def build(tmp_path):
+    # Two sessions: P1 starts left and moves right after a pause of 1 sec. (saccade and blink), P2 has no timestamps
+    raw = pd.DataFrame({
+        'Timestamp': [5000, 5300, 6500, np.nan, np.nan],
+        'StimuliName': '01_Antwerpen_S1.jpg', 'FixationIndex': [1, 2, 3, 1, 2],
+        'FixationDuration': [200, 200, 300, 400, 100],
+        'MappedFixationPointX': [100, 200, 700, 100, 800], 'MappedFixationPointY': 400,
+        'user': ['P1', 'P1', 'P1', 'P2', 'P2'], 'description': 'color', 'CityMap': 'Antwerpen_S1',
+        'City': 'Antwerpen', 'SaccadeLength': 50})
+    return Dataset.build(raw, stimulus_images, load_calibration(str(tmp_path / 'no_calibration.csv')),
+                         build_transform_registry(stimulus_images))
+
+
+def test_time_to_first_fixation_uses_timestamps(tmp_path):
+    engine = AOIEngine(build(tmp_path), {('Antwerpen_S1', 'color'): [left, right]}, 'S1FramePointX', 'S1FramePointY')
+    metrics = engine.metrics('Antwerpen_S1', 'color').set_index('AOI')
+    # P1: 6500 - 5000 ms (not the 0.4 sec. of the previous fixation durations), P2 without timestamps: 0.4 sec.
+    assert metrics.loc['Right', 'TimeToFirstFixation'] == pytest.approx((1.5 + 0.4) / 2)
+    assert metrics.loc['Left', 'TimeToFirstFixation'] == pytest.approx(0)
+
+
+def test_edits_do_not_change_shared_entries(tmp_path):
+    engine = AOIEngine(build(tmp_path), {('Antwerpen_S1', 'color'): [left]}, 'S1FramePointX', 'S1FramePointY')
+    codes = engine.assignment('Antwerpen_S1', 'color')
+    before = codes.copy()
+    entry = engine._cache[('Antwerpen_S1', 'color')]
+    definitions, cache = engine.definitions, engine._cache
+    aois = engine.aois('Antwerpen_S1', 'color')
+    hits = entry['hits'].copy()
+
+    # Snapshot of newer data sharing the cached entry and the definitions, edited afterwards
+    derived = engine.derive(engine.dataset, stimuli=set())
+    for edit in [lambda: derived.update_aoi('Antwerpen_S1', 'color', 0, right),
+                 lambda: derived.update_aoi('Antwerpen_S1', 'color', 1, left),
+                 lambda: derived.remove_aoi('Antwerpen_S1', 'color', 1),
+                 lambda: derived.set_aois('Antwerpen_S1', 'grey', [left])]:
+        edit()
+        np.testing.assert_array_equal(entry['hits'], hits)
+        np.testing.assert_array_equal(entry['codes'], before)
+        assert aois == [left]
+        assert engine.definitions is definitions and definitions == {('Antwerpen_S1', 'color'): [left]}
+        assert engine._cache is cache and list(cache) == [('Antwerpen_S1', 'color')]
+    np.testing.assert_array_equal(derived.assignment('Antwerpen_S1', 'color'), np.where(before >= 0, -1, 0))
+
+
+def test_aoi_file_round_trip(tmp_path):
+    path = str(tmp_path / 'aoi_definitions.json')
+    definitions = {('Antwerpen_S1', 'color'): [left, {'name': 'Station', 'type': 'polygon',
+                                                      'points': [[1.0, 2.0], [30.0, 2.0], [10.0, 40.0]]}]}
+    save_aoi_file(definitions, path)
+    assert load_aoi_file(path) == definitions
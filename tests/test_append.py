@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aoi import AOIEngine
+from dataset import Dataset, PartitionCache, PartitionedDataset
+from scanpath_similarity import ScanpathSimilarity
+from stimulus_registry import build_transform_registry, load_calibration
+
+"""
+-----------------------------------------------------------------------------------------
+Append:
+Sessions appended to a loaded dataset give the same per-session sequences and AOI metrics as a dataset built
+from all sessions at once
+"""
+stimulus_images = {('Antwerpen_S1', 'color'): {'path': 'assets/01_Antwerpen_S1_Color.jpg', 'width': 1000,
+                                                'height': 800, 'hash': '0'},
+                   ('Antwerpen_S1', 'grey'): {'path': 'assets/01b_Antwerpen_S1_Grey.jpg', 'width': 1000,
+                                               'height': 800, 'hash': '1'}}
+aoi_definitions = {('Antwerpen_S1', 'color'): [{'name': 'Left', 'type': 'rect', 'x0': 0, 'y0': 0, 'x1': 500, 'y1': 800},
+                                               {'name': 'Top', 'type': 'rect', 'x0': 500, 'y0': 0, 'x1': 1000,
+                                                'y1': 400}]}
+# Appended users sort before (A00) and between (P4: after P10) the users of the loaded data
+loaded_users = ['P1', 'P10', 'P7']
+appended_users = ['A00', 'P4']
+
+
+def fixations(users, seed):
+    # Complete sessions of both variants with increasing timestamps (recording start differs per session)
+    rng = np.random.default_rng(seed)
+    rows = []
+    for user in users:
+        for description in ['color', 'grey']:
+            count = int(rng.integers(20, 50))
+            durations = rng.integers(100, 400, count).astype(float)
+            timestamps = rng.uniform(1000, 5000) + np.cumsum(durations + rng.integers(20, 60, count))
+            rows.append(pd.DataFrame({
+                'Timestamp': timestamps, 'StimuliName': '01_Antwerpen_S1.jpg' if description == 'color'
+                else '01b_Antwerpen_S1.jpg', 'FixationIndex': np.arange(1, count + 1), 'FixationDuration': durations,
+                'MappedFixationPointX': rng.uniform(0, 1000, count), 'MappedFixationPointY': rng.uniform(0, 800, count),
+                'user': user, 'description': description, 'CityMap': 'Antwerpen_S1', 'City': 'Antwerpen',
+                'SaccadeLength': rng.uniform(10, 200, count)}))
+    # Rows of the file are not grouped by session
+    return pd.concat(rows, ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def build(kind, raw, tmp_path):
+    tmp_path.mkdir()
+    calibration = load_calibration(str(tmp_path / 'no_calibration.csv'))
+    transforms = build_transform_registry(stimulus_images)
+    if kind == 'memory':
+        return Dataset.build(raw, stimulus_images, calibration, transforms)
+    path = tmp_path / 'fixations.csv'
+    raw.to_csv(path, sep=';', index=False)
+    return PartitionedDataset.build(str(path), stimulus_images, calibration, transforms, PartitionCache(2 ** 40),
+                                    str(tmp_path / 'partitions'))
+
+
+def sequences_by_user(dataset, description):
+    engine = AOIEngine(dataset, aoi_definitions, x_col='NormalizedPointX', y_col='NormalizedPointY')
+    similarity = ScanpathSimilarity(engine, x_col='NormalizedPointX', y_col='NormalizedPointY')
+    users, sequences = similarity.sequences('Antwerpen_S1', description, 'multimatch', 1000, 800)
+    return dict(zip(users, sequences))
+
+
+@pytest.mark.parametrize('kind', ['memory', 'partitioned'])
+def test_append_keeps_sessions_grouped(kind, tmp_path):
+    loaded, appended = fixations(loaded_users, 1), fixations(appended_users, 2)
+    full = build(kind, pd.concat([loaded, appended], ignore_index=True), tmp_path / 'full')
+    dataset, affected = build(kind, loaded, tmp_path / 'loaded').append(appended)
+    assert affected == {('Antwerpen_S1', 'color'), ('Antwerpen_S1', 'grey')}
+
+    for description in ['color', 'grey']:
+        # One sequence per session with all fixations of the user, in FixationIndex order
+        expected, actual = sequences_by_user(full, description), sequences_by_user(dataset, description)
+        assert sorted(actual) == sorted(loaded_users + appended_users)
+        for user, sequence in expected.items():
+            np.testing.assert_allclose(actual[user], sequence)
+
+        sessions = dataset.stimulus_sessions('Antwerpen_S1', description)
+        counts = dict(zip(sessions['users'], sessions['counts']))
+        raw = pd.concat([loaded, appended])
+        raw = raw[raw['description'] == description]
+        assert counts == raw.groupby('user').size().to_dict()
+
+    # AOI timings of the appended data equal those of the data loaded at once
+    metrics = AOIEngine(dataset, aoi_definitions, 'NormalizedPointX', 'NormalizedPointY').metrics('Antwerpen_S1', 'color')
+    reference = AOIEngine(full, aoi_definitions, 'NormalizedPointX', 'NormalizedPointY').metrics('Antwerpen_S1', 'color')
+    pd.testing.assert_frame_equal(metrics, reference)
+    assert (metrics['TimeToFirstFixation'] >= 0).all()
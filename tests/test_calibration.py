@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from stimulus_registry import apply_calibration, load_calibration
+
+"""
+-----------------------------------------------------------------------------------------
+Calibration:
+Fixations of stimuli recorded in another resolution are scaled (and shifted) to image pixels; stimuli without
+calibration entry are already in image resolution
+"""
+image_registry = {('Antwerpen_S1', 'color'): {'path': 'a.jpg', 'width': 1000, 'height': 800, 'hash': '0'},
+                  ('Berlin_S1', 'color'): {'path': 'b.jpg', 'width': 1000, 'height': 800, 'hash': '1'}}
+
+
+def test_calibration_table(tmp_path):
+    path = tmp_path / 'stimulus_calibration.csv'
+    path.write_text('CityMap;description;SourceWidth;SourceHeight;OffsetX;OffsetY\n'
+                    'Antwerpen_S1;color;2000;1000;100;0\n')
+    df = pd.DataFrame({'CityMap': ['Antwerpen_S1', 'Antwerpen_S1', 'Berlin_S1', 'Berlin_S1', 'Köln_S1'],
+                       'description': 'color',
+                       'MappedFixationPointX': [1100, 2200, 500, 1200, 5000],
+                       'MappedFixationPointY': [500, 500, 400, 400, 5000]})
+    df = apply_calibration(df, load_calibration(str(path)), image_registry)
+
+    np.testing.assert_allclose(df['NormalizedPointX'], [500, 1050, 500, 1200, 5000])
+    np.testing.assert_allclose(df['NormalizedPointY'], [400, 400, 400, 400, 5000])
+    # Outside the image after calibration; stimuli without image are kept
+    assert df['InBounds'].tolist() == [True, False, True, False, True]
+
+
+def test_missing_calibration_file(tmp_path):
+    calibration = load_calibration(str(tmp_path / 'missing.csv'))
+    assert calibration.empty and calibration['SourceWidth'].dtype == 'float64'
+    df = pd.DataFrame({'CityMap': ['Antwerpen_S1'], 'description': ['color'],
+                       'MappedFixationPointX': [999.0], 'MappedFixationPointY': [1.0]})
+    df = apply_calibration(df, calibration, image_registry)
+    assert df[['NormalizedPointX', 'NormalizedPointY']].values.tolist() == [[999.0, 1.0]]
@@ -0,0 +1,42 @@
+from dash import Dash, dcc, html, Input, Output
+from callback_fanout import count_callbacks
+
+"""
+-----------------------------------------------------------------------------------------
+Callback-Fan-Out:
+Callback requests of the browser are counted per trigger and output, calls on page load or mount as 'initial'
+"""
+
+
+def test_requests_are_counted_per_trigger_and_output():
+    app = Dash(__name__)
+    app.layout = html.Div([dcc.Dropdown(id='city', options=['Berlin_S1'], value=None), html.Div(id='table'),
+                           dcc.Graph(id='plot')])
+
+    @app.callback(Output('table', 'children'), Input('city', 'value'))
+    def table(city):
+        return city
+
+    @app.callback(Output('plot', 'figure', allow_duplicate=True), Input('city', 'value'), prevent_initial_call=True)
+    def plot(city):
+        return {}
+
+    counter = count_callbacks(app)
+    client = app.server.test_client()
+    table_output = {'id': 'table', 'property': 'children'}
+    city_input = {'id': 'city', 'property': 'value', 'value': 'Berlin_S1'}
+    plot_key = next(key for key in app.callback_map if key.startswith('plot.figure'))
+    requests = [{'output': 'table.children', 'outputs': table_output, 'inputs': [city_input], 'changedPropIds': []},
+                {'output': 'table.children', 'outputs': table_output, 'inputs': [city_input],
+                 'changedPropIds': ['city.value']},
+                {'output': plot_key, 'outputs': {'id': 'plot', 'property': plot_key.split('.', 1)[1]},
+                 'inputs': [city_input], 'changedPropIds': ['city.value']}]
+    for body in requests:
+        assert client.post('/_dash-update-component', json=body).status_code == 200
+    client.get('/_dash-layout')
+
+    # The hash of allow_duplicate outputs is dropped, other routes are not counted
+    assert counter.report() == {'city.value': {'callbacks': 2, 'outputs': {'plot.figure': 1, 'table.children': 1}},
+                                'initial': {'callbacks': 1, 'outputs': {'table.children': 1}}}
+    counter.reset()
+    assert counter.report() == {}
@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+import time
+import pandas as pd
+from catalog import Study, StudyCatalog
+
+"""
+-----------------------------------------------------------------------------------------
+Study-Catalog:
+Studies are loaded on first access with their own images and caches, unknown ids fall back to the default study
+and idle studies are evicted
+"""
+
+
+def write_study(tmp_path, study_id, users):
+    # Data file, one stimulus image and the cache directories of a study below tmp_path/study_id
+    directory = tmp_path / study_id
+    (directory / 'images').mkdir(parents=True)
+    os.symlink(os.path.abspath('assets/01_Antwerpen_S1_Color.jpg'), directory / 'images' / '01_Antwerpen_S1_Color.jpg')
+    pd.DataFrame({'Timestamp': 1000, 'StimuliName': '01_Antwerpen_S1.jpg', 'FixationIndex': 1,
+                  'FixationDuration': 200, 'MappedFixationPointX': 100, 'MappedFixationPointY': 100, 'user': users,
+                  'description': 'color', 'CityMap': 'Antwerpen_S1', 'City': 'Antwerpen', 'SaccadeLength': 50}) \
+        .to_csv(directory / 'fixations.csv', sep=';', index=False)
+    return {'name': study_id.title(), 'data_path': str(directory / 'fixations.csv'),
+            'assets_dir': str(directory / 'images'), 'incoming_dir': str(directory / 'incoming'),
+            'partition_dir': str(directory / 'partitions'), 'similarity_cache_dir': str(directory / 'similarity'),
+            'warm_start_path': str(directory / 'warm_start.pkl')}
+
+
+def test_studies_are_loaded_lazily_and_evicted(tmp_path):
+    (tmp_path / 'studies').mkdir()
+    with open(tmp_path / 'studies' / 'pilot.json', 'w', encoding='utf-8') as file:
+        json.dump(write_study(tmp_path, 'pilot', ['P1', 'P2', 'P3']), file)
+    catalog = StudyCatalog.load(write_study(tmp_path, 'default', ['P1']), directory=str(tmp_path / 'studies'),
+                                idle_timeout=3600)
+    assert catalog.options() == [{'label': 'Default', 'value': 'default'}, {'label': 'Pilot', 'value': 'pilot'}]
+    assert not any(study.loaded for study in catalog.studies.values())
+
+    pilot = catalog.store('pilot')
+    assert catalog.studies['pilot'].loaded and not catalog.studies['default'].loaded
+    assert sorted(pilot.current().sessions['user']) == ['P1', 'P2', 'P3']
+    assert catalog.store('pilot') is pilot
+    # Unknown ids fall back to the default study, images are registered per study
+    assert sorted(catalog.store('unknown').current().sessions['user']) == ['P1']
+    assert catalog.study('pilot').stimulus_images[('Antwerpen_S1', 'color')]['url'].startswith('stimulus-images/pilot/')
+
+    # Studies idle for longer than the timeout are evicted on the next access of another study
+    catalog.idle_timeout = 0
+    catalog.store('default')
+    assert not catalog.studies['pilot'].loaded and catalog.studies['default'].loaded
+    catalog.study('default').close()
+
+
+def test_concurrent_first_requests_share_one_load(tmp_path, monkeypatch):
+    study = Study('pilot', write_study(tmp_path, 'pilot', ['P1', 'P2']))
+    loads = []
+    load_dataset = Study.load_dataset
+
+    def slow_load(self):
+        loads.append(1)
+        time.sleep(0.05)
+        return load_dataset(self)
+
+    monkeypatch.setattr(Study, 'load_dataset', slow_load)
+    stores = []
+    threads = [threading.Thread(target=lambda: stores.append(study.open())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1 and all(store is stores[0] for store in stores)
+
+    # Requests to the loaded study do not wait for the lock (held here, e.g. by a watcher being started)
+    with study._lock:
+        reader = threading.Thread(target=lambda: stores.append(study.open()))
+        reader.start()
+        reader.join(5)
+        assert not reader.is_alive() and stores[-1] is stores[0]
+    study.close()
@@ -0,0 +1,62 @@
+import gzip
+import json
+import os
+import re
+import dash
+from dash import html
+from compression import enable_compression
+
+"""
+-----------------------------------------------------------------------------------------
+Compression:
+Compressed responses with Content-Encoding and Vary; CSS/JS assets referenced with their content hash and cached
+immutable under the hashed URL
+"""
+
+
+def build_app(tmp_path):
+    (tmp_path / 'style.css').write_text('.banner { color: red; }\n' * 100)
+    app = dash.Dash(__name__, assets_folder=str(tmp_path))
+    app.layout = html.Div('dashboard')
+
+    @app.server.route('/values/<int:count>')
+    def values(count):
+        return app.server.response_class(json.dumps(list(range(count))), mimetype='application/json')
+
+    assets = enable_compression(app, str(tmp_path))
+    return app.server.test_client(), assets
+
+
+def test_callback_responses_are_compressed(tmp_path):
+    client, _ = build_app(tmp_path)
+    response = client.get('/values/1000', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip' and response.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(response.data)) == list(range(1000))
+
+    # Small responses and clients without gzip get the plain body
+    assert 'Content-Encoding' not in client.get('/values/10', headers={'Accept-Encoding': 'gzip'}).headers
+    response = client.get('/values/1000', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers and json.loads(response.data) == list(range(1000))
+
+
+def test_hashed_asset_route(tmp_path):
+    client, assets = build_app(tmp_path)
+    content_hash = assets.url_hash('style.css')
+    index = client.get('/').get_data(as_text=True)
+    assert re.search(rf'/assets/style.css\?h={content_hash}"', index)
+
+    response = client.get(f'/assets/style.css?h={content_hash}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip' and response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert gzip.decompress(response.data) == (tmp_path / 'style.css').read_bytes()
+
+    # Without (or with an old) hash the file is revalidated with the hash as ETag
+    response = client.get('/assets/style.css?h=old')
+    assert response.headers['Cache-Control'] == 'no-cache' and response.headers['ETag'] == f'"{content_hash}"'
+    assert client.get('/assets/style.css', headers={'If-None-Match': f'"{content_hash}"'}).status_code == 304
+
+    # A changed file gets a new hash
+    path = tmp_path / 'style.css'
+    path.write_text('.banner { color: blue; }\n')
+    os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))
+    assert assets.url_hash('style.css') != content_hash
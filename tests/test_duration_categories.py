@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from dataset import duration_categories, duration_edges, duration_labels
+
+"""
+-----------------------------------------------------------------------------------------
+Duration-Categories:
+Edges of the task duration categories (fixed, quantiles or custom), their labels and the category of every fixation
+"""
+# Sorted task durations in sec.; quantiles are the durations at the nearest rank
+durations = np.array([4.0, 6.0, 8.0, 12.0, 15.0, 30.0, 45.0])
+
+
+def test_edges_of_the_schemes():
+    assert duration_edges(durations).tolist() == [10]
+    assert duration_edges(durations, 'median').tolist() == [12]
+    assert duration_edges(durations, 'terciles').tolist() == [8, 15]
+    assert duration_edges(durations, 'quartiles').tolist() == [8, 12, 15]
+    # Custom edges are sorted and unique, quantiles of equal durations collapse
+    assert duration_edges(durations, 'median', custom_edges=[20, 5, 20]).tolist() == [5, 20]
+    assert duration_edges(np.array([7.0, 7.0, 7.0]), 'quartiles').tolist() == [7]
+    assert duration_edges(np.empty(0), 'terciles').size == 0
+    assert duration_edges(durations, 'unknown').tolist() == [10]
+
+
+def test_labels_and_categories():
+    assert duration_labels(np.array([10.0])) == ['<10 sec.', '>=10 sec.']
+    assert duration_labels(np.array([7.5, 15.0])) == ['<7.5 sec.', '7.5-15 sec.', '>=15 sec.']
+    assert duration_labels(np.empty(0)) == ['all sessions']
+
+    # Three sessions with 2, 1 and 3 fixations; a duration equal to an edge belongs to the upper category
+    sessions = pd.DataFrame({'task_durations': [4.0, 10.0, 30.0], 'counts': [2, 1, 3]})
+    assert duration_categories(sessions, np.array([10.0])).tolist() == [0, 0, 1, 1, 1, 1]
+    assert duration_categories(sessions, np.array([8.0, 15.0])).tolist() == [0, 0, 1, 2, 2, 2]
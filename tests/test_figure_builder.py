@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from figure_builder import (axis, box_trace, colorbar, density_trace, gaze_traces, histogram_trace, layout,
+                            layout_image, matrix_trace, message_figure, stimulus_layout, title, validate)
+
+"""
+-----------------------------------------------------------------------------------------
+Figure-Builder:
+The figure dicts of the helpers are valid plotly figures in both themes; gaze traces keep the order of the users
+"""
+
+
+def test_gaze_traces_per_user():
+    users = np.array(['P2', 'P1', 'P2', 'P1', 'P2'])
+    x, y = np.arange(5) * 100.0, np.arange(5) * 50.0
+    traces = gaze_traces(users, x, y, np.array([100, 200, 300, 400, 500]), {'P1': 'red', 'P2': 'blue'},
+                         ['x', 'y', 'Duration', 'Index'], np.arange(5).reshape(5, 1))
+    # Markers of every user in order of appearance, then their scanpath lines
+    assert [trace['name'] for trace in traces] == ['P2', 'P1', 'Scanpath for P2', 'Scanpath for P1']
+    assert traces[0]['x'].tolist() == [0, 200, 400] and traces[3]['y'].tolist() == [50, 150]
+    assert traces[1]['customdata'].tolist() == [[1], [3]] and traces[1]['marker']['color'] == 'red'
+    assert traces[0]['marker']['sizeref'] == pytest.approx(2 * 500 / 20 ** 2)
+    assert 'Index=%{customdata[0]}' in traces[0]['hovertemplate']
+
+
+@pytest.mark.parametrize('theme', ['light', 'dark'])
+def test_figures_are_valid(theme):
+    rng = np.random.default_rng(1)
+    images = [layout_image('stimulus-images/a.jpg', 0, 0, 1000, 800)]
+    figures = [
+        message_figure(theme, 'Please select a City Map'),
+        {'data': gaze_traces(np.array(['P1', 'P2']), np.array([1.0, 2.0]), np.array([3.0, 4.0]), np.array([1, 2]),
+                             {'P1': 'red', 'P2': 'blue'}, ['x', 'y', 'Duration'], np.empty((2, 0)))
+                 + [density_trace(np.arange(3), np.arange(3), rng.uniform(0, 1, (3, 3)))],
+         'layout': stimulus_layout(theme, 'Antwerpen_S1 (color)', images, 1000, 800)},
+        {'data': [density_trace()], 'layout': layout(theme)},
+        {'data': [box_trace('color', rng.uniform(0, 60, 10), ['Antwerpen_S1'] * 10, 'blue', 'Task Duration')],
+         'layout': layout(theme, boxmode='group', xaxis=axis(10, title=title('sec.', 11)))},
+        {'data': [histogram_trace('grey', rng.uniform(0, 60, 10), 'grey', 20, 'black')],
+         'layout': layout(theme, height=300)},
+        {'data': [matrix_trace(['A', 'B'], [[0.5, 0.5], [1, 0]], 'Blues', '%{y} -> %{x}: %{z}<extra></extra>',
+                               colorbar=colorbar(theme, 'Probability'))],
+         'layout': layout(theme, polar={'angularaxis': axis(10)})},
+    ]
+    for figure in figures:
+        validated = validate(figure)
+        assert validated.layout.template.layout.paper_bgcolor == 'rgba(0, 0, 0, 0)'
+    color = 'black' if theme == 'light' else 'white'
+    assert validate(figures[0]).layout.template.layout.title.font.color == color
+    with pytest.raises(ValueError):
+        validate({'data': [dict(density_trace(), smoothing=1.3)], 'layout': layout(theme)})
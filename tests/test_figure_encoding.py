@@ -0,0 +1,55 @@
+import base64
+import numpy as np
+import plotly.graph_objects as go
+from figure_encoding import binary_figures, encode_figure, typed_array
+
+"""
+-----------------------------------------------------------------------------------------
+Figure-Encoding:
+Typed arrays decode to the original values in the smallest type; short, text and ragged arrays stay lists
+"""
+
+
+def decode(spec):
+    # Like plotly.js: little-endian bytes of the dtype, reshaped for 2D arrays
+    array = np.frombuffer(base64.b64decode(spec['bdata']), dtype=np.dtype(spec['dtype']).newbyteorder('<'))
+    return array.reshape([int(size) for size in spec['shape'].split(',')]) if 'shape' in spec else array
+
+
+def test_typed_array_round_trip():
+    rng = np.random.default_rng(0)
+    cases = [(np.arange(100), 'u1'), (np.arange(-50, 50), 'i1'), (np.arange(0, 70000, 1000), 'u4'),
+             (np.arange(-40000, 40000, 1000), 'i4'), (np.arange(20) * 1.0, 'u1'), (np.arange(20) / 4, 'f4'),
+             (rng.uniform(1e39, 1e40, 50), 'f8'), (np.append(np.arange(20) / 2, np.nan), 'f4'),
+             (np.arange(3 * 20).reshape(3, 20) - 100, 'i1')]
+    for values, dtype in cases:
+        spec = typed_array(values.tolist() if values.ndim == 1 else values)
+        assert spec['dtype'] == dtype
+        np.testing.assert_array_equal(decode(spec), values)
+    assert typed_array(np.arange(3 * 20).reshape(3, 20))['shape'] == '3,20'
+
+    # Floats within the float32 tolerance are sent as float32
+    values = rng.uniform(0, 1, 50)
+    spec = typed_array(values)
+    assert spec['dtype'] == 'f4'
+    np.testing.assert_allclose(decode(spec), values, rtol=1e-6)
+
+
+def test_only_long_numeric_arrays_are_encoded():
+    assert typed_array(list(range(10))) is None
+    assert typed_array(['a'] * 20) is None
+    assert typed_array([[1, 2], [3]] * 10) is None
+
+    figure = go.Figure(go.Scatter(x=np.arange(30), y=np.arange(30) / 8, text=['x'] * 30,
+                                  marker={'size': np.full(30, 6), 'color': 'red'}))
+    encoded = encode_figure(figure)
+    trace = encoded['data'][0]
+    np.testing.assert_array_equal(decode(trace['y']), np.arange(30) / 8)
+    assert trace['marker']['size']['dtype'] == 'u1' and trace['marker']['color'] == 'red'
+    assert trace['text'] == ['x'] * 30 and encoded['layout'] == figure.to_dict()['layout']
+
+    # Callbacks with several figure outputs; other outputs pass through
+    callback = binary_figures(lambda: (figure, {'data': [{'x': list(range(20))}]}, 'text'))
+    results = callback()
+    assert isinstance(results, tuple) and results[2] == 'text'
+    assert decode(results[1]['data'][0]['x']).tolist() == list(range(20))
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fixation_detection import detect_fixations
+
+"""
+-----------------------------------------------------------------------------------------
+Fixation-Detection:
+I-VT and I-DT find the fixations of synthetic gaze samples; short data loss is interpolated, long data loss and
+saccades separate fixations
+"""
+
+
+def gaze_samples():
+    # 100 Hz samples with noise of ±2 px. P1: 300 ms at (100, 100), saccade, 200 ms at (600, 400) with 40 ms data loss,
+    # 200 ms data loss, 150 ms at (300, 600); P2: 250 ms at (500, 500)
+    rng = np.random.default_rng(3)
+    segments = [('P1', 300, (100, 100)), ('P1', 30, None), ('P1', 80, (600, 400)), ('P1', 40, 'lost'),
+                ('P1', 80, (600, 400)), ('P1', 200, 'lost'), ('P1', 150, (300, 600)), ('P2', 250, (500, 500))]
+    rows, clock = [], {'P1': 0, 'P2': 0}
+    for user, duration, point in segments:
+        for k in range(duration // 10):
+            if point is None:  # saccade from the previous to the next fixation
+                x, y = 100 + 500 * (k + 1) / 4, 100 + 300 * (k + 1) / 4
+            elif point == 'lost':
+                x, y = np.nan, np.nan
+            else:
+                x, y = np.array(point) + rng.uniform(-2, 2, 2)
+            rows.append({'Timestamp': clock[user], 'user': user, 'StimuliName': '01_Antwerpen_S1.jpg',
+                         'GazePointX': x, 'GazePointY': y})
+            clock[user] += 10
+    return pd.DataFrame(rows).sample(frac=1, random_state=1)
+
+
+@pytest.mark.parametrize('method', ['ivt', 'idt'])
+def test_fixations_of_synthetic_samples(method):
+    fixations = detect_fixations(gaze_samples(), method, max_workers=1)
+    assert fixations.groupby('user').size().to_dict() == {'P1': 3, 'P2': 1}
+    p1 = fixations[fixations['user'] == 'P1']
+    assert p1['FixationIndex'].tolist() == [1, 2, 3]
+    np.testing.assert_allclose(p1[['MappedFixationPointX', 'MappedFixationPointY']],
+                               [[100, 100], [600, 400], [300, 600]], atol=5)
+    np.testing.assert_allclose(p1['FixationDuration'], [300, 200, 150], atol=40)
+    assert np.isnan(p1['SaccadeLength'].iloc[0]) and p1['SaccadeLength'].iloc[1] == pytest.approx(583, abs=5)
+    assert (fixations['CityMap'] == 'Antwerpen_S1').all() and (fixations['description'] == 'color').all()
+
+
+def test_short_fixations_are_dropped():
+    fixations = detect_fixations(gaze_samples(), 'ivt', min_duration=240, max_workers=1)
+    assert fixations['FixationDuration'].min() >= 240 and len(fixations) == 2
+    with pytest.raises(ValueError):
+        detect_fixations(gaze_samples(), 'hmm')
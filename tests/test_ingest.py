@@ -0,0 +1,30 @@
+import numpy as np
+from ingest import read_partition_file, stream_ingest
+
+"""
+-----------------------------------------------------------------------------------------
+Ingest:
+Chunks whose numeric columns are read with different types (integers in the first chunk, fractions or missing
+values later) are written to the partitions with one schema and without loss
+"""
+header = 'Timestamp;StimuliName;FixationIndex;FixationDuration;MappedFixationPointX;MappedFixationPointY;user;' \
+         'description;CityMap;City;SaccadeLength'
+
+
+def test_chunks_with_different_inferred_types(tmp_path):
+    lines = [header]
+    for i in range(10):
+        # First chunk integers only; second chunk with fractions and missing values
+        timestamp = f'{1000 + i * 250}' if i < 5 else f'{1000 + i * 250.5}'
+        index = '' if i == 7 else f'{i + 1}'
+        x = f'{100 + i}' if i < 5 else f'{100.5 + i}'
+        y = '300' if i < 5 else ''
+        lines.append(f'{timestamp};02_Berlin_S1.jpg;{index};200;{x};{y};P1;color;Berlin_S1;Berlin;10')
+    path = tmp_path / 'fixations.csv'
+    path.write_text('\n'.join(lines) + '\n')
+
+    _, partitions = stream_ingest(str(path), str(tmp_path / 'partitions'), chunksize=5)
+    frame = read_partition_file(partitions['path'].iloc[0])
+    np.testing.assert_allclose(frame['Timestamp'], [1000, 1250, 1500, 1750, 2000, 2252.5, 2503, 2753.5, 3004, 3254.5])
+    np.testing.assert_allclose(frame['MappedFixationPointX'][5:], [105.5, 106.5, 107.5, 108.5, 109.5])
+    assert frame['FixationIndex'].isna().sum() == 1 and frame['MappedFixationPointY'].isna().sum() == 5
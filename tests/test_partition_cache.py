@@ -0,0 +1,49 @@
+import threading
+import time
+import dataset
+from dataset import PartitionCache
+
+"""
+-----------------------------------------------------------------------------------------
+Partition-Cache:
+Least recently used partitions are evicted while the memory budget is exceeded; concurrent loads of the same
+partition load it once
+"""
+
+
+def entry(size):
+    return {'bytes': size}
+
+
+def test_least_recently_used_partitions_are_evicted(monkeypatch):
+    # Without RSS (e.g. no /proc) the sizes of the cached partitions are counted
+    monkeypatch.setattr(dataset, 'process_rss', lambda: None)
+    cache = PartitionCache(memory_budget=250)
+    for key in ['a', 'b']:
+        cache.get(key, lambda: entry(100))
+    cache.get('a', lambda: entry(100))
+    cache.get('c', lambda: entry(100))
+    assert list(cache._entries) == ['a', 'c'] and cache.memory_usage() == 200
+
+    # The most recently used partition stays even above the budget
+    cache.get('d', lambda: entry(1000))
+    assert list(cache._entries) == ['d'] and len(cache) == 1
+
+
+def test_concurrent_loads_of_a_partition(monkeypatch):
+    monkeypatch.setattr(dataset, 'process_rss', lambda: None)
+    cache = PartitionCache(memory_budget=10 ** 6)
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)
+        return entry(100)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('a', load))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1 and all(result is results[0] for result in results)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from quality import (quality_flags, fixation_flags, mark_missing_variants, flag_counts, quality_summary,
+                     quality_values, visible)
+
+"""
+-----------------------------------------------------------------------------------------
+Data-Quality:
+Bit flags per fixation, the MissingVariant bit from the session table and the summary per stimulus
+"""
+
+
+def fixations():
+    # P1 color: first fixation, out of bounds, zero duration, duplicate index 3 (twice), missing SaccadeLength;
+    # P1 grey and P2 color: one valid fixation each
+    return pd.DataFrame({
+        'user': ['P1'] * 6 + ['P1', 'P2'], 'CityMap': 'Antwerpen_S1',
+        'description': ['color'] * 6 + ['grey', 'color'], 'FixationIndex': [1, 2, 3, 3, 4, 5, 1, 1],
+        'InBounds': [True, False, True, True, True, True, True, True],
+        'FixationDuration': [200, 200, 0, 200, 200, 200, 200, 200],
+        'SaccadeLength': [np.nan, 50, 50, 50, 50, np.nan, np.nan, np.nan],
+        'SaccadeAmplitude': [np.nan, 50, 50, 50, 50, 50, np.nan, np.nan]})
+
+
+def test_flag_bits():
+    df = fixations()
+    df['QualityFlags'] = fixation_flags(df)
+    assert df['QualityFlags'].dtype == np.uint8
+    assert df['QualityFlags'].tolist() == [0, quality_flags['OutOfBounds'],
+                                           quality_flags['NonPositiveDuration'] | quality_flags['DuplicateIndex'],
+                                           quality_flags['DuplicateIndex'], 0, quality_flags['MissingSaccade'], 0, 0]
+    assert visible(df['QualityFlags']).tolist() == [True, False, False, True, True, True, True, True]
+
+
+def test_missing_variant_and_summary():
+    df = fixations()
+    df['QualityFlags'] = fixation_flags(df)
+    sessions = df.groupby(['user', 'CityMap', 'description'], as_index=False).size() \
+        .rename(columns={'size': 'FixationCount'})
+    df = mark_missing_variants(df, sessions)
+    # P2 has no grey session; the row bits of P1 are kept
+    missing = (df['QualityFlags'] & quality_flags['MissingVariant']) > 0
+    assert missing.tolist() == [False] * 7 + [True]
+    assert df.loc[2, 'QualityFlags'] == quality_flags['NonPositiveDuration'] | quality_flags['DuplicateIndex']
+
+    values = quality_values(quality_summary(flag_counts(df), sessions), 'Antwerpen_S1')
+    assert values['color'] == {'Fixations': 7, 'Visible': 5, 'OutOfBounds': 1, 'NonPositiveDuration': 1,
+                               'DuplicateIndex': 2, 'MissingSaccade': 1, 'MissingVariant': 1}
+    assert values['grey']['Fixations'] == 1 and values['grey']['MissingVariant'] == 0
+
+    # Once P2 has a grey session the bit is cleared again
+    sessions = pd.concat([sessions, pd.DataFrame({'user': ['P2'], 'CityMap': ['Antwerpen_S1'],
+                                                  'description': ['grey'], 'FixationCount': [1]})])
+    assert not (mark_missing_variants(df, sessions)['QualityFlags'] & quality_flags['MissingVariant']).any()
+
+
+def test_missing_variant_of_selected_rows():
+    df = fixations()
+    df['QualityFlags'] = fixation_flags(df)
+    df.loc[0, 'QualityFlags'] |= quality_flags['MissingVariant']
+    sessions = df.groupby(['user', 'CityMap', 'description'], as_index=False).size()
+    # Only the rows of P2 are checked (e.g. the appended City Map), the stale bit of the first row is kept
+    df = mark_missing_variants(df, sessions, [7])
+    missing = (df['QualityFlags'] & quality_flags['MissingVariant']) > 0
+    assert missing.tolist() == [True] + [False] * 6 + [True]
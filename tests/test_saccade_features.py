@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from ingest import saccade_features
+
+"""
+-----------------------------------------------------------------------------------------
+Saccade-Features:
+Amplitude, direction, inter-fixation time, velocity and backtracks of the saccade into every fixation, per session
+and in FixationIndex order, independent of the row order
+"""
+
+
+def test_saccade_features_per_session():
+    # P1: (0, 0) -> (300, 400) -> (0, 400) with 100 ms fixations every 300 ms, P2: a single fixation;
+    # the rows are shuffled across both sessions
+    df = pd.DataFrame({'user': ['P1', 'P2', 'P1', 'P1'], 'CityMap': 'Antwerpen_S1', 'description': 'color',
+                       'FixationIndex': [3, 1, 1, 2], 'Timestamp': [600, 0, 0, 300], 'FixationDuration': 100,
+                       'MappedFixationPointX': [0, 50, 0, 300], 'MappedFixationPointY': [400, 50, 0, 400]})
+    df = saccade_features(df)
+
+    np.testing.assert_allclose(df['SaccadeAmplitude'], [300, np.nan, np.nan, 500])
+    # Counterclockwise from right with the screen y axis pointing down (straight left is ±180°)
+    np.testing.assert_allclose(df['SaccadeAngle'].abs(), [180, np.nan, np.nan, 53.130102], rtol=1e-6)
+    assert df.loc[3, 'SaccadeAngle'] < 0
+    np.testing.assert_allclose(df['InterFixationTime'], [200, np.nan, np.nan, 200])
+    np.testing.assert_allclose(df['SaccadeVelocity'], [1500, np.nan, np.nan, 2500])
+    np.testing.assert_allclose(df['Backtrack'], [1, np.nan, np.nan, np.nan])
+    assert (df[['SaccadeAmplitude', 'Backtrack']].dtypes == 'float32').all()
+
+
+def test_overlapping_fixations_and_missing_timestamps():
+    df = pd.DataFrame({'user': 'P1', 'CityMap': 'Antwerpen_S1', 'description': 'color', 'FixationIndex': [1, 2, 3],
+                       'Timestamp': [0, 50, 400], 'FixationDuration': 100,
+                       'MappedFixationPointX': [0, 100, 200], 'MappedFixationPointY': 0})
+    features = saccade_features(df.copy())
+    # The second fixation starts before the end of the first one: no timing and no velocity
+    np.testing.assert_allclose(features['InterFixationTime'], [np.nan, np.nan, 250])
+    np.testing.assert_allclose(features['SaccadeVelocity'], [np.nan, np.nan, 400])
+    # Same direction twice is no backtrack
+    np.testing.assert_allclose(features['Backtrack'], [np.nan, np.nan, 0])
+
+    features = saccade_features(df.drop(columns='Timestamp'))
+    assert features['InterFixationTime'].isna().all() and features['SaccadeVelocity'].isna().all()
+    np.testing.assert_allclose(features['SaccadeAmplitude'], [np.nan, 100, 100])
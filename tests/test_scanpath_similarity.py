@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aoi import AOIEngine
+from dataset import Dataset
+from scanpath_similarity import ScanpathSimilarity, edit_similarity, mean_similarity, multimatch
+from stimulus_registry import build_transform_registry, load_calibration
+
+"""
+-----------------------------------------------------------------------------------------
+Scanpath-Similarity:
+Pairwise similarity matrices computed on the process pool equal the direct comparison of the sessions; sessions
+without AOI fixations are not comparable (NaN)
+"""
+stimulus_images = {('Antwerpen_S1', 'color'): {'path': 'assets/01_Antwerpen_S1_Color.jpg', 'width': 1000,
+                                                'height': 800, 'hash': '0'}}
+left = {'name': 'Left', 'type': 'rect', 'x0': 0, 'y0': 0, 'x1': 500, 'y1': 800}
+right = {'name': 'Right', 'type': 'rect', 'x0': 500, 'y0': 0, 'x1': 1000, 'y1': 800}
+
+
+def build_similarity(raw, aois, tmp_path, max_workers=1):
+    dataset = Dataset.build(raw, stimulus_images, load_calibration(str(tmp_path / 'no_calibration.csv')),
+                            build_transform_registry(stimulus_images))
+    engine = AOIEngine(dataset, {('Antwerpen_S1', 'color'): aois}, 'S1FramePointX', 'S1FramePointY')
+    return ScanpathSimilarity(engine, str(tmp_path / 'similarity'), 'S1FramePointX', 'S1FramePointY',
+                              max_workers=max_workers)
+
+
+def similarity_matrix(aois, tmp_path):
+    # P1: left, left, right; P2: left, right
+    raw = pd.DataFrame({
+        'Timestamp': [1000, 1300, 1600, 1000, 1300], 'StimuliName': '01_Antwerpen_S1.jpg',
+        'FixationIndex': [1, 2, 3, 1, 2], 'FixationDuration': 200,
+        'MappedFixationPointX': [100, 200, 700, 100, 800], 'MappedFixationPointY': 400,
+        'user': ['P1', 'P1', 'P1', 'P2', 'P2'], 'description': 'color', 'CityMap': 'Antwerpen_S1',
+        'City': 'Antwerpen', 'SaccadeLength': 50})
+    similarity = build_similarity(raw, aois, tmp_path)
+    try:
+        return similarity.matrix('Antwerpen_S1', 'color', 'aoi', 1000, 800)[1]
+    finally:
+        similarity.close()
+
+
+def test_edit_similarity():
+    assert edit_similarity(np.array([0, 0, 1]), np.array([0, 1])) == pytest.approx(2 / 3)
+    assert edit_similarity(np.array([0, 1]), np.array([], dtype=int)) == 0
+    assert np.isnan(edit_similarity(np.array([], dtype=int), np.array([], dtype=int)))
+
+
+def test_sessions_without_aoi_fixations_are_not_comparable(tmp_path):
+    matrix = similarity_matrix([left, right], tmp_path / 'aois')
+    np.testing.assert_allclose(matrix, [[1, 2 / 3], [2 / 3, 1]])
+
+    # Without AOIs all sequences are empty: no similarity of 1.0, the mean is undefined
+    matrix = similarity_matrix([], tmp_path / 'no_aois')
+    assert np.isnan(matrix).all() and np.isnan(mean_similarity(matrix))
+
+
+def test_parallel_matrix_equals_pairwise_comparison(tmp_path):
+    # Eight sessions of random length, compared on the process pool in interleaved row chunks
+    rng = np.random.default_rng(5)
+    counts = rng.integers(3, 15, 8)
+    total = counts.sum()
+    raw = pd.DataFrame({
+        'Timestamp': np.concatenate([np.arange(count) * 300 for count in counts]),
+        'StimuliName': '01_Antwerpen_S1.jpg',
+        'FixationIndex': np.concatenate([np.arange(1, count + 1) for count in counts]),
+        'FixationDuration': rng.integers(100, 400, total),
+        'MappedFixationPointX': rng.uniform(0, 1000, total), 'MappedFixationPointY': rng.uniform(0, 800, total),
+        'user': np.repeat([f'P{k}' for k in range(8)], counts), 'description': 'color', 'CityMap': 'Antwerpen_S1',
+        'City': 'Antwerpen', 'SaccadeLength': 50})
+    similarity = build_similarity(raw, [], tmp_path, max_workers=2)
+    try:
+        for method in ['grid', 'multimatch']:
+            users, matrix = similarity.matrix('Antwerpen_S1', 'color', method, 1000, 800)
+            _, sequences = similarity.sequences('Antwerpen_S1', 'color', method, 1000, 800)
+            for i in range(len(users)):
+                for j in range(i + 1, len(users)):
+                    expected = np.nanmean(multimatch(sequences[i], sequences[j], np.hypot(1000, 800))) \
+                        if method == 'multimatch' else edit_similarity(sequences[i], sequences[j])
+                    assert matrix[i, j] == pytest.approx(expected) and matrix[j, i] == pytest.approx(expected)
+            np.testing.assert_array_equal(np.diag(matrix), 1)
+    finally:
+        similarity.close()
+
+    # Identical scanpaths are similar in every dimension
+    np.testing.assert_allclose(multimatch(sequences[0], sequences[0], np.hypot(1000, 800)), 1)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from dataset import select_sessions, session_index
+from filter_index import BitmapIndex
+
+"""
+-----------------------------------------------------------------------------------------
+Session-Filters:
+Duration ranges resolved by binary search in the sessions of a stimulus, combined with the user filter of the
+bitmap index, select the same sessions as the bitmap index alone
+"""
+
+
+def test_duration_range_matches_bitmap_index():
+    rng = np.random.default_rng(3)
+    users = np.array([f'P{number}' for number in range(40)])
+    durations = np.round(rng.uniform(1, 30, len(users)), 1)
+    sessions_table = pd.DataFrame({'user': users, 'CityMap': 'Berlin_S1', 'description': 'color',
+                                   'TaskDuration': durations})
+    filters = BitmapIndex(sessions_table)
+
+    # Fixations of the stimulus grouped by session (ordered by user as text)
+    counts = rng.integers(1, 6, len(users))
+    order = np.argsort(users)
+    sessions = session_index(np.repeat(users[order], counts[order]), np.repeat(durations[order], counts[order]))
+
+    for low, high in [(1, 30), (5, 10), (9.2, 9.2), (12.5, 20.3), (31, 40)]:
+        for selected_users in [None, ['P3', 'P17', 'P25', 'P8']]:
+            expected = filters.selected_users(city_map='Berlin_S1', description='color', users=selected_users,
+                                              duration_range=(low, high))
+            users_filter = filters.selected_users(city_map='Berlin_S1', description='color', users=selected_users)
+            selected = select_sessions(sessions, users_filter, (low, high))
+            assert sorted(sessions['users'][selected]) == sorted(expected)
+            # Returned in session order, so the fixation slices stay in the order of the stimulus rows
+            assert (np.diff(selected) > 0).all()
@@ -0,0 +1,97 @@
+import threading
+import pandas as pd
+from dataset import Dataset
+from snapshot import Snapshot, SnapshotStore
+from stimulus_registry import build_transform_registry, load_calibration
+
+"""
+-----------------------------------------------------------------------------------------
+Snapshot:
+Appends, reloads and AOI edits publish a new snapshot; the data, AOI definitions and caches of a published snapshot
+never change
+"""
+stimulus_images = {('Antwerpen_S1', 'color'): {'path': 'assets/01_Antwerpen_S1_Color.jpg', 'width': 1000,
+                                                'height': 800, 'hash': '0'},
+                   ('Antwerpen_S1', 'grey'): {'path': 'assets/01b_Antwerpen_S1_Grey.jpg', 'width': 1000,
+                                               'height': 800, 'hash': '1'}}
+color, grey = ('Antwerpen_S1', 'color'), ('Antwerpen_S1', 'grey')
+left = {'name': 'Left', 'type': 'rect', 'x0': 0, 'y0': 0, 'x1': 500, 'y1': 800}
+right = {'name': 'Right', 'type': 'rect', 'x0': 500, 'y0': 0, 'x1': 1000, 'y1': 800}
+
+
+def build_store(tmp_path):
+    # One session per variant, moving from left to right
+    raw = pd.DataFrame({
+        'Timestamp': [1000, 1300, 1600, 1000, 1300, 1600], 'FixationIndex': [1, 2, 3, 1, 2, 3],
+        'StimuliName': ['01_Antwerpen_S1.jpg'] * 3 + ['01b_Antwerpen_S1.jpg'] * 3,
+        'FixationDuration': 200, 'MappedFixationPointX': [100, 200, 700] * 2, 'MappedFixationPointY': 400,
+        'user': 'P1', 'description': ['color'] * 3 + ['grey'] * 3, 'CityMap': 'Antwerpen_S1', 'City': 'Antwerpen',
+        'SaccadeLength': 50})
+    dataset = Dataset.build(raw, stimulus_images, load_calibration(str(tmp_path / 'no_calibration.csv')),
+                            build_transform_registry(stimulus_images))
+    return SnapshotStore(Snapshot.create(dataset, {color: [left]}, cache_dir=str(tmp_path / 'similarity')))
+
+
+def test_aoi_edits_publish_a_new_snapshot(tmp_path):
+    store = build_store(tmp_path)
+    published = store.current()
+    definitions = published.aoi_engine.definitions
+    assert published.transitions.matrix(*color).shape == (1, 1)
+
+    # A request iterating the AOIs of the published snapshot while AOIs are added (also of a new stimulus)
+    reader = iter(definitions.items())
+    next(reader)
+    store.edit(lambda aoi_engine: aoi_engine.update_aoi(*color, 1, right))
+    store.edit(lambda aoi_engine: aoi_engine.set_aois(*grey, [left, right]))
+    list(reader)
+
+    assert published.aoi_engine.definitions is definitions and list(definitions) == [color]
+    assert published.aoi_engine.metrics(*color)['AOI'].tolist() == ['Left']
+    assert published.transitions.matrix(*color).shape == (1, 1)
+
+    edited = store.current()
+    assert edited.version == published.version + 2 and edited.filters is published.filters
+    assert edited.aoi_engine.metrics(*color)['AOI'].tolist() == ['Left', 'Right']
+    assert edited.transitions.matrix(*color).tolist() == [[1, 1], [0, 0]]
+    assert edited.transitions.matrix(*grey).tolist() == [[1, 1], [0, 0]]
+
+    # Relayout events without an AOI change (e.g. zoom) keep the snapshot
+    assert not store.edit(lambda aoi_engine: aoi_engine.apply_relayout(*color, {'xaxis.range[0]': 10}))
+    assert store.current() is edited
+    store.close()
+
+
+def test_append_and_reload_swap_the_snapshot(tmp_path):
+    store = build_store(tmp_path)
+    published = store.current()
+    new_session = pd.DataFrame({
+        'Timestamp': [1000, 1300], 'FixationIndex': [1, 2], 'StimuliName': '01_Antwerpen_S1.jpg',
+        'FixationDuration': 200, 'MappedFixationPointX': [700, 100], 'MappedFixationPointY': 400, 'user': 'P2',
+        'description': 'color', 'CityMap': 'Antwerpen_S1', 'City': 'Antwerpen', 'SaccadeLength': 50})
+
+    # Readers of the published snapshot keep its sessions, the new snapshot has the appended session
+    assert store.append(new_session) == {color}
+    appended = store.current()
+    assert published.sessions['user'].tolist() == ['P1', 'P1']
+    assert sorted(appended.sessions['user']) == ['P1', 'P1', 'P2']
+    assert appended.version == published.version + 1 and appended.aoi_engine.definitions == {color: [left]}
+
+    # A failed reload keeps the current snapshot, a successful one swaps it
+    store.reload(lambda: 1 / 0).join()
+    assert store.current() is appended and 'division by zero' in store.last_error
+    release = threading.Event()
+
+    def build_dataset():
+        release.wait(10)
+        return published.dataset
+
+    thread = store.reload(build_dataset)
+    assert store.reloading and store.reload(build_dataset) is None
+    # Sessions appended while the reload is running are served at once and replayed onto the reloaded data
+    store.append(new_session.assign(user='P3'))
+    assert sorted(store.current().sessions['user']) == ['P1', 'P1', 'P2', 'P3']
+    release.set()
+    thread.join()
+    assert store.last_error is None and not store.reloading
+    assert sorted(store.current().sessions['user']) == ['P1', 'P1', 'P3']
+    store.close()
@@ -0,0 +1,52 @@
+import shutil
+from catalog import Study
+
+"""
+-----------------------------------------------------------------------------------------
+Stimulus-Images:
+Image URLs carry the content hash of the image (cached forever), only registered images are served
+"""
+
+
+def test_image_urls_change_with_the_content(tmp_path):
+    images = tmp_path / 'images'
+    images.mkdir()
+    shutil.copy('assets/01_Antwerpen_S1_Color.jpg', images)
+    shutil.copy('assets/01_Antwerpen_S1_Color.jpg', images / '01b_Antwerpen_S1_Grey.jpg')
+    study = Study('pilot', {'data_path': str(tmp_path / 'fixations.csv'), 'assets_dir': str(images)})
+    study.build_registries()
+    color, grey = study.stimulus_images[('Antwerpen_S1', 'color')], study.stimulus_images[('Antwerpen_S1', 'grey')]
+
+    # Same content, same URL (and one cache entry in the browser)
+    assert color['url'] == grey['url'] == f'stimulus-images/pilot/{color["hash"]}.jpg'
+    assert study.image_file(f'{color["hash"]}.jpg').endswith('.jpg')
+    assert study.registered_image(color['hash']) is not None
+
+    # Only registered images by their hash, no paths of the assets folder
+    assert study.image_file('01_Antwerpen_S1_Color.jpg') is None
+    assert study.image_file('..%2Ffixations.csv') is None and study.registered_image('0' * 16) is None
+
+    # A replaced image gets a new URL
+    shutil.copy('assets/02_Berlin_S1_Color.jpg', images / '01b_Antwerpen_S1_Grey.jpg')
+    study.build_registries()
+    replaced = study.stimulus_images[('Antwerpen_S1', 'grey')]
+    assert replaced['url'] != grey['url'] and study.stimulus_images[('Antwerpen_S1', 'color')]['url'] == color['url']
+    assert study.image_file(f'{replaced["hash"]}.jpg') == replaced['path']
+
+
+def test_image_route_caching():
+    # Route of the dashboard: immutable caching with the hash as ETag, conditional and range requests
+    import app
+    study = app.catalog.study(None)
+    if study.stimulus_images is None:
+        study.build_registries()
+    image = study.stimulus_images[('Antwerpen_S1', 'color')]
+    client = app.app.server.test_client()
+    response = client.get(f'/{image["url"]}')
+    assert response.status_code == 200 and response.headers['ETag'] == f'"{image["hash"]}"'
+    assert 'immutable' in response.headers['Cache-Control'] and 'max-age=31536000' in response.headers['Cache-Control']
+    assert client.get(f'/{image["url"]}', headers={'If-None-Match': f'"{image["hash"]}"'}).status_code == 304
+    with open(image['path'], 'rb') as file:
+        assert client.get(f'/{image["url"]}', headers={'Range': 'bytes=0-99'}).data == file.read(100)
+    assert client.get('/stimulus-images/default/01_Antwerpen_S1_Color.jpg').status_code == 404
+    assert client.get(f'/stimulus-images/unknown/{image["hash"]}.jpg').status_code == 404
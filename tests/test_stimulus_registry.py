@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+from stimulus_registry import (apply_transforms, build_transform_registry, frame_background, infer_rotation,
+                               load_transform_overrides)
+
+"""
+-----------------------------------------------------------------------------------------
+Stimulus-Registry:
+Rotation of S2 images inferred from the image content and mapped back into the S1 frame
+"""
+s1_path = 'assets/02_Berlin_S1_Color.jpg'
+
+
+def rotated_registry(rotation, tmp_path):
+    # S1 image and an S2 image that is the S1 image rotated clockwise and reduced to half the size
+    with Image.open(s1_path) as img:
+        width, height = img.size
+        s2 = img.rotate(-rotation, expand=True)
+    s2 = s2.resize((s2.width // 2, s2.height // 2))
+    s2_path = str(tmp_path / f'02_Berlin_S2_Color_{rotation}.jpg')
+    s2.save(s2_path)
+    return {('Berlin_S1', 'color'): {'path': s1_path, 'width': width, 'height': height, 'hash': '0'},
+            ('Berlin_S2', 'color'): {'path': s2_path, 'width': s2.width, 'height': s2.height, 'hash': '1'}}
+
+
+@pytest.mark.parametrize('rotation', [0, 90, 180, 270])
+def test_rotation_is_inferred_and_undone(rotation, tmp_path):
+    registry = rotated_registry(rotation, tmp_path)
+    assert infer_rotation(s1_path, registry[('Berlin_S2', 'color')]['path']) == rotation
+
+    # A point of the S1 image, recorded on the rotated S2 image, lands on the same S1 position
+    transforms = build_transform_registry(registry)
+    width, height = registry[('Berlin_S1', 'color')]['width'], registry[('Berlin_S1', 'color')]['height']
+    x, y = 400.0, 300.0
+    s2_point = {0: (x, y), 90: (height - y, x), 180: (width - x, height - y), 270: (y, width - x)}[rotation]
+    df = pd.DataFrame({'CityMap': ['Berlin_S2'], 'description': ['color'],
+                       'NormalizedPointX': [s2_point[0] / 2], 'NormalizedPointY': [s2_point[1] / 2]})
+    df = apply_transforms(df, transforms)
+    np.testing.assert_allclose(df[['S1FramePointX', 'S1FramePointY']].to_numpy()[0], [x, y], atol=1)
+
+    # Rotated stimuli are shown on the S1 image (plotly cannot rotate layout images)
+    background = frame_background(registry, transforms, 'Berlin_S2', 'color')
+    assert background is registry[('Berlin_S1' if rotation else 'Berlin_S2', 'color')]
+
+
+def test_shipped_rotations_cover_all_s2_stimuli():
+    overrides = load_transform_overrides()
+    assert len(overrides) == 48
+    assert all(city_map.endswith('_S2') for city_map, _ in overrides)
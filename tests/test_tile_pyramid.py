@@ -0,0 +1,60 @@
+import math
+import os
+import xml.etree.ElementTree as ElementTree
+from PIL import Image
+from tile_pyramid import TilePyramids, build_pyramid, pyramid_levels, tile_size, visible_tiles
+
+"""
+-----------------------------------------------------------------------------------------
+Tile-Pyramid:
+DZI descriptor, levels and tiles of a built pyramid; the visible tiles cover the plot area at the matching level
+"""
+
+
+def test_pyramid_levels_and_tiles(tmp_path):
+    Image.new('RGB', (1000, 600), 'orange').save(tmp_path / 'image.jpg')
+    target = build_pyramid(str(tmp_path / 'image.jpg'), str(tmp_path / 'pyramid'))
+    levels = pyramid_levels(1000, 600)
+    assert len(levels) == 11 and levels[0] == (1, 1) and levels[-2] == (500, 300) and levels[-1] == (1000, 600)
+
+    descriptor = ElementTree.parse(os.path.join(target, 'image.dzi')).getroot()
+    namespace = '{http://schemas.microsoft.com/deepzoom/2008}'
+    assert descriptor.attrib == {'TileSize': str(tile_size), 'Overlap': '0', 'Format': 'jpg'}
+    assert descriptor.find(f'{namespace}Size').attrib == {'Width': '1000', 'Height': '600'}
+
+    for level, (width, height) in enumerate(levels):
+        tiles = os.listdir(os.path.join(target, 'image_files', str(level)))
+        assert len(tiles) == math.ceil(width / tile_size) * math.ceil(height / tile_size)
+    # Edge tiles are cut at the image border
+    with Image.open(os.path.join(target, 'image_files', '10', '3_2.jpg')) as tile:
+        assert tile.size == (1000 - 3 * tile_size, 600 - 2 * tile_size)
+    assert not os.path.exists(f'{target}.{os.getpid()}.tmp')
+
+
+def test_visible_tiles():
+    # The whole image in the plot area: level 10 (1000 x 600 px, at least the 800 px of the viewport),
+    # all of its tiles scaled to image coordinates
+    tiles = visible_tiles(2000, 1200)
+    assert {tile[0] for tile in tiles} == {10} and len(tiles) == 4 * 3
+    assert tiles[0][3:] == (0, 0, 2 * tile_size, 2 * tile_size)
+    assert sum(tile[5] for tile in tiles if tile[2] == 0) == 2000
+
+    # Zoomed into a quarter: full resolution, only the tiles of the visible area
+    tiles = visible_tiles(2000, 1200, x_range=[500, 1000], y_range=[900, 600])
+    assert {tile[0] for tile in tiles} == {11}
+    assert sorted((tile[1], tile[2]) for tile in tiles) == [(column, row) for column in [1, 2, 3] for row in [2, 3]]
+    assert visible_tiles(2000, 1200, x_range=[3000, 4000]) == []
+
+
+def test_pyramids_are_built_once_in_the_background(tmp_path):
+    Image.new('RGB', (300, 200), 'blue').save(tmp_path / 'image.jpg')
+    image = {'path': str(tmp_path / 'image.jpg'), 'hash': 'abc'}
+    pyramids = TilePyramids(str(tmp_path / 'tiles'), max_workers=1)
+    try:
+        assert not pyramids.ready(image) and not pyramids.ready(image) and len(pyramids._builds) == 1
+        pyramids._builds['abc'].result(timeout=60)
+        assert pyramids.ready(image)
+        assert pyramids.tile_file(image, 9, '1_0.jpg') is not None
+        assert pyramids.tile_file(image, 9, '2_0.jpg') is None and pyramids.tile_file(image, 9, '../image.dzi') is None
+    finally:
+        pyramids.close()
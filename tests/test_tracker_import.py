@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from tracker_import import import_tracker_export, read_eyelink_asc, read_tobii_tsv, sequence_sessions
+
+"""
+-----------------------------------------------------------------------------------------
+Tracker-Import:
+Tobii TSV and EyeLink ASC exports to fixations with FixationIndex and SaccadeLength per session, across chunks
+"""
+tobii_export = '\n'.join('\t'.join(row) for row in [
+    ['Recording timestamp', 'Participant name', 'Presented Stimulus name', 'Eye movement type index',
+     'Eye movement type', 'Gaze event duration', 'Fixation point X', 'Fixation point Y'],
+    ['0', 'P1', '01_Antwerpen_S1.jpg', '1', 'Fixation', '200', '100', '100'],
+    ['10', 'P1', '01_Antwerpen_S1.jpg', '1', 'Fixation', '200', '100', '100'],
+    ['20', 'P1', '01_Antwerpen_S1.jpg', '1', 'Fixation', '200', '100', '100'],
+    ['220', 'P1', '01_Antwerpen_S1.jpg', '1', 'Saccade', '30', '', ''],
+    ['250', 'P1', '01_Antwerpen_S1.jpg', '2', 'Fixation', '300', '400', '500'],
+    ['260', 'P1', '01_Antwerpen_S1.jpg', '2', 'Fixation', '300', '400', '500'],
+    ['0', 'P2', '01b_Antwerpen_S1.jpg', '1', 'Fixation', '150', '50', '60'],
+    ['160', 'P2', '01b_Antwerpen_S1.jpg', '', 'Unclassified', '', '', ''],
+]) + '\n'
+eyelink_export = '''** CONVERTED FROM P7.EDF
+MSG 1000 !V IMGLOAD CENTER images\\02_Berlin_S1.jpg 960 540
+SFIX L 1010
+EFIX L 1010 1210 200 300.5 400.0 1000
+EFIX R 1010 1210 200 305.0 401.0 1000
+EFIX L 1240 1540 300 600.5 800.0 1000
+EFIX L 1560 1700 140 . . 1000
+END 1800
+EFIX L 1900 2000 100 10.0 10.0 1000
+MSG 2000 TRIALID 2
+MSG 2001 !V IMGLOAD CENTER images/02b_Berlin_S1.jpg 960 540
+EFIX L 2010 2200 190 100.0 100.0 1000
+'''
+
+
+def test_tobii_fixations_spanning_chunks(tmp_path):
+    path = tmp_path / 'export.tsv'
+    path.write_text(tobii_export)
+    # Chunks of two samples split both fixations of P1
+    fixations = pd.concat(sequence_sessions(read_tobii_tsv(str(path), chunksize=2)), ignore_index=True)
+    assert fixations[['user', 'FixationIndex', 'FixationDuration']].values.tolist() == \
+        [['P1', 1, 200], ['P1', 2, 300], ['P2', 1, 150]]
+    assert fixations['description'].tolist() == ['color', 'color', 'grey']
+    assert (fixations['CityMap'] == 'Antwerpen_S1').all()
+    np.testing.assert_allclose(fixations['SaccadeLength'], [np.nan, 500, np.nan])
+
+
+def test_eyelink_fixations_of_one_eye(tmp_path):
+    path = tmp_path / 'P7.asc'
+    path.write_text(eyelink_export)
+    frames = list(read_eyelink_asc(str(path), chunksize=2))
+    assert len(frames) == 2
+    fixations = pd.concat(sequence_sessions(frames), ignore_index=True)
+    # Left eye only, no fixations outside a recording block, the stimulus changes with the IMGLOAD message
+    assert fixations[['user', 'StimuliName', 'FixationIndex']].values.tolist() == \
+        [['P7', '02_Berlin_S1.jpg', 1], ['P7', '02_Berlin_S1.jpg', 2], ['P7', '02_Berlin_S1.jpg', 3],
+         ['P7', '02b_Berlin_S1.jpg', 1]]
+    assert fixations['Timestamp'].tolist() == [1010, 1240, 1560, 2010]
+    assert np.isnan(fixations.loc[2, 'MappedFixationPointX'])
+    assert fixations.loc[1, 'SaccadeLength'] == np.hypot(300, 400)
+
+
+def test_import_into_partitions(tmp_path):
+    path = tmp_path / 'export.tsv'
+    path.write_text(tobii_export)
+    sessions, partitions = import_tracker_export(str(path), 'tobii', str(tmp_path / 'partitions'))
+    assert len(sessions) == 2 and partitions['rows'].sum() == 3
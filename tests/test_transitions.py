@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aoi import AOIEngine
+from dataset import Dataset
+from stimulus_registry import build_transform_registry, load_calibration
+from transitions import TransitionStore, entropies
+
+"""
+-----------------------------------------------------------------------------------------
+AOI-Transitions:
+Transition counts between consecutive AOI fixations of a session and the gaze-transition entropies
+"""
+stimulus_images = {('Antwerpen_S1', 'color'): {'path': 'assets/01_Antwerpen_S1_Color.jpg', 'width': 1000,
+                                                'height': 800, 'hash': '0'}}
+left = {'name': 'Left', 'type': 'rect', 'x0': 0, 'y0': 0, 'x1': 400, 'y1': 800}
+right = {'name': 'Right', 'type': 'rect', 'x0': 600, 'y0': 0, 'x1': 1000, 'y1': 800}
+
+
+def test_entropies_of_a_transition_matrix():
+    # From Left: once to Left, once to Right; from Right: once to Left
+    stationary, transition = entropies(np.array([[1, 1], [1, 0]]))
+    assert stationary == pytest.approx(-(2 / 3 * np.log2(2 / 3) + 1 / 3 * np.log2(1 / 3)))
+    assert transition == pytest.approx(2 / 3)
+    assert entropies(np.zeros((2, 2))) == (0, 0)
+
+
+def test_transitions_of_hand_built_sequences(tmp_path):
+    # P1: Left, Left, (between the AOIs), Right, Left; P2: Right, Right
+    raw = pd.DataFrame({
+        'Timestamp': np.arange(7) * 300, 'StimuliName': '01_Antwerpen_S1.jpg',
+        'FixationIndex': [1, 2, 3, 4, 5, 1, 2], 'FixationDuration': 200,
+        'MappedFixationPointX': [100, 200, 500, 700, 300, 800, 900], 'MappedFixationPointY': 400,
+        'user': ['P1'] * 5 + ['P2'] * 2, 'description': 'color', 'CityMap': 'Antwerpen_S1', 'City': 'Antwerpen',
+        'SaccadeLength': 50})
+    dataset = Dataset.build(raw, stimulus_images, load_calibration(str(tmp_path / 'no_calibration.csv')),
+                            build_transform_registry(stimulus_images))
+    store = TransitionStore(AOIEngine(dataset, {('Antwerpen_S1', 'color'): [left, right]},
+                                      'S1FramePointX', 'S1FramePointY'))
+
+    # Fixations outside the AOIs are skipped, transitions never cross sessions
+    np.testing.assert_array_equal(store.matrix('Antwerpen_S1', 'color'), [[1, 1], [1, 1]])
+    sessions = store.result()['sessions'].set_index('user')
+    assert sessions['Transitions'].to_dict() == {'P1': 3, 'P2': 1}
+    assert sessions.loc['P2', 'StationaryEntropy'] == 0 and sessions.loc['P2', 'TransitionEntropy'] == 0
+
+    summary = store.summary('Antwerpen_S1', 'color')
+    assert summary['Sessions'] == 2
+    assert summary['TransitionEntropy'] == pytest.approx(1.0)
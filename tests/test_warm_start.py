@@ -0,0 +1,39 @@
+import warm_start
+from warm_start import load_warm_start, save_warm_start, source_hash
+
+"""
+-----------------------------------------------------------------------------------------
+Warm-Start:
+A stored dataset is restored while sources and code are unchanged; a change of either invalidates the file
+"""
+
+
+def test_round_trip_and_invalidation(tmp_path, monkeypatch):
+    data_path, image_dir = tmp_path / 'fixations.csv', tmp_path / 'images'
+    data_path.write_text('user;CityMap\nP1;Antwerpen_S1\n')
+    image_dir.mkdir()
+    (image_dir / '01_Antwerpen_S1_Color.jpg').write_bytes(b'jpg')
+    path = str(tmp_path / 'warm_start' / 'study.pkl')
+    data_hash = source_hash([str(data_path), str(tmp_path / 'missing.csv')], str(image_dir))
+
+    assert load_warm_start(path, data_hash) is None
+    save_warm_start({'sessions': [1, 2, 3]}, path, data_hash)
+    assert load_warm_start(path, data_hash) == {'sessions': [1, 2, 3]}
+
+    # Changed data file, added stimulus image
+    data_path.write_text('user;CityMap\nP2;Antwerpen_S1\n')
+    changed_data = source_hash([str(data_path), str(tmp_path / 'missing.csv')], str(image_dir))
+    (image_dir / '02_Berlin_S1_Color.jpg').write_bytes(b'jpg')
+    changed_images = source_hash([str(data_path), str(tmp_path / 'missing.csv')], str(image_dir))
+    assert len({data_hash, changed_data, changed_images}) == 3
+    assert load_warm_start(path, changed_data) is None
+
+    # Changed preparation code
+    monkeypatch.setattr(warm_start, 'app_version', lambda: 'changed')
+    assert load_warm_start(path, data_hash) is None
+
+
+def test_damaged_file(tmp_path):
+    path = tmp_path / 'study.pkl'
+    path.write_bytes(b'not a pickle')
+    assert load_warm_start(str(path), 'hash') is None
@@ -0,0 +1,137 @@
+import math
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+"""
+-----------------------------------------------------------------------------------------
+Tile-Pyramid:
+Deep-zoom pyramid (DZI layout) per stimulus image: JPEG tiles of 256 px per zoom level, from 1x1 px up to the full
+resolution, built once per image in a background process pool and stored on disk by the content hash of the image.
+The gaze plots and heat maps load only the tiles of the visible area at the level matching the zoom
+"""
+# Shared by all studies: the pyramids are addressed by the content hash of their image
+tile_cache_dir = 'cache/tiles'
+tile_size = 256
+tile_quality = 85
+# Tiles are served as 'stimulus-tiles/<study>/<hash>/<level>/<column>_<row>.jpg' (relative to the dashboard page):
+tile_route = 'stimulus-tiles'
+tile_name = re.compile(r'^\d+_\d+\.jpg$')
+# Plot area of a gaze plot / heat map at full HD (half the page width, height 425 px minus the margins); the level is
+# chosen so that the visible part of the image is shown with at least this resolution:
+viewport_size = (800, 380)
+
+
+def pyramid_levels(width, height):
+    # Size of every level: level 0 is 1x1 px, the last level the full resolution (halved per level, rounded up)
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    return [(math.ceil(width / 2 ** (max_level - level)), math.ceil(height / 2 ** (max_level - level)))
+            for level in range(max_level + 1)]
+
+
+def dzi_descriptor(width, height):
+    # Descriptor of the Deep Zoom format, so the pyramid can also be opened by DZI viewers (e.g. OpenSeadragon)
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{tile_size}" Overlap="0" '
+            f'Format="jpg"><Size Width="{width}" Height="{height}"/></Image>\n')
+
+
+def build_pyramid(image_path, target_dir):
+    # Writes all levels into a temporary directory next to the target and renames it when complete, so a pyramid on
+    # disk is always complete (also if several processes build the same image)
+    temp_dir = f'{target_dir}.{os.getpid()}.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    with Image.open(image_path) as img:
+        image = img.convert('RGB')
+    levels = pyramid_levels(*image.size)
+    for level in range(len(levels) - 1, -1, -1):
+        level_width, level_height = levels[level]
+        # Each level is reduced from the level above (cheaper than from the full resolution)
+        if image.size != (level_width, level_height):
+            image = image.resize((level_width, level_height), Image.LANCZOS)
+        level_dir = os.path.join(temp_dir, 'image_files', str(level))
+        os.makedirs(level_dir)
+        for row in range(math.ceil(level_height / tile_size)):
+            for column in range(math.ceil(level_width / tile_size)):
+                box = (column * tile_size, row * tile_size,
+                       min((column + 1) * tile_size, level_width), min((row + 1) * tile_size, level_height))
+                image.crop(box).save(os.path.join(level_dir, f'{column}_{row}.jpg'), quality=tile_quality)
+    with open(os.path.join(temp_dir, 'image.dzi'), 'w') as file:
+        file.write(dzi_descriptor(*levels[-1]))
+    try:
+        os.replace(temp_dir, target_dir)
+    except OSError:  # built by another process meanwhile
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return target_dir
+
+
+def tile_prefix(study_id, image):
+    # URL of the pyramid of a registered image (tiles below '<level>/<column>_<row>.jpg')
+    return f'{tile_route}/{study_id}/{image["hash"]}'
+
+
+def visible_tiles(width, height, x_range=None, y_range=None, viewport=viewport_size):
+    # Tiles covering the visible area (ranges in image coordinates, None: whole axis) at the lowest level that shows
+    # it with the viewport resolution: (level, column, row, x, y, sizex, sizey) with the position in image coordinates
+    levels = pyramid_levels(width, height)
+    x0, x1 = sorted(x_range) if x_range else (0, width)
+    y0, y1 = sorted(y_range) if y_range else (0, height)
+    x0, x1, y0, y1 = max(x0, 0), min(x1, width), max(y0, 0), min(y1, height)
+    if x1 <= x0 or y1 <= y0:
+        return []
+    scale = min(max(viewport[0] / (x1 - x0), viewport[1] / (y1 - y0)), 1)
+    level = next(level for level, (level_width, _) in enumerate(levels) if level_width >= scale * width)
+    level_width, level_height = levels[level]
+    fx, fy = width / level_width, height / level_height
+
+    columns = range(int(x0 / fx // tile_size), min(math.ceil(x1 / fx / tile_size), math.ceil(level_width / tile_size)))
+    rows = range(int(y0 / fy // tile_size), min(math.ceil(y1 / fy / tile_size), math.ceil(level_height / tile_size)))
+    tiles = []
+    for row in rows:
+        for column in columns:
+            left, top = column * tile_size, row * tile_size
+            tiles.append((level, column, row, left * fx, top * fy,
+                          (min(left + tile_size, level_width) - left) * fx,
+                          (min(top + tile_size, level_height) - top) * fy))
+    return tiles
+
+
+class TilePyramids:
+    # Pyramids on disk by image hash; a missing pyramid is built in the process pool on its first request (once per
+    # process; if the build fails, the plots keep the full image)
+    def __init__(self, directory=tile_cache_dir, max_workers=2):
+        self.directory = directory
+        self.max_workers = max_workers
+        self._executor = None
+        self._builds = {}
+        self._lock = threading.Lock()
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def path(self, image):
+        return os.path.join(self.directory, image['hash'])
+
+    def ready(self, image):
+        # True if the pyramid of the image is complete on disk, otherwise its build is started
+        if os.path.exists(os.path.join(self.path(image), 'image.dzi')):
+            return True
+        with self._lock:
+            if image['hash'] not in self._builds:
+                os.makedirs(self.directory, exist_ok=True)
+                self._builds[image['hash']] = self.executor().submit(build_pyramid, image['path'], self.path(image))
+        return False
+
+    def tile_file(self, image, level, filename):
+        # Path of a tile of a built pyramid (None if unknown)
+        path = os.path.join(self.path(image), 'image_files', str(level), filename)
+        return path if tile_name.match(filename) and os.path.isfile(path) else None
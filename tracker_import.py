@@ -0,0 +1,147 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from ingest import fixation_columns, fixation_dtypes, ingest_chunks, partition_dir
+from stimulus_registry import stimulus_columns, stimulus_name
+
+"""
+-----------------------------------------------------------------------------------------
+Tracker-Import:
+Streaming import of eye-tracker exports (Tobii TSV, EyeLink ASC) into the partitions,
+as generator pipelines: export -> fixation chunks -> FixationIndex / SaccadeLength per session -> partitions
+"""
+# Tobii exports (Studio and Pro Lab) name the columns differently; the first column found in the header is used:
+tobii_columns = {
+    'Timestamp': ['RecordingTimestamp', 'Recording timestamp'],
+    'user': ['ParticipantName', 'Participant name'],
+    'StimuliName': ['MediaName', 'Presented Stimulus name', 'Presented Media name'],
+    'TrackerIndex': ['FixationIndex', 'Eye movement type index'],
+    'EventType': ['GazeEventType', 'Eye movement type'],
+    'FixationDuration': ['GazeEventDuration', 'Gaze event duration'],
+    'MappedFixationPointX': ['MappedFixationPointX', 'FixationPointX (MCSpx)', 'Fixation point X'],
+    'MappedFixationPointY': ['MappedFixationPointY', 'FixationPointY (MCSpx)', 'Fixation point Y'],
+}
+tracker_formats = ['tobii', 'eyelink']
+chunk_rows = 200_000
+
+
+def sequence_sessions(chunks):
+    # FixationIndex (from 1) and SaccadeLength per session (user and stimulus) across the chunks of a stream,
+    # plus CityMap, City and description from the stimulus name.
+    # State between chunks: index and point of the last fixation per session.
+    last = {}
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        chunk = chunk.reset_index(drop=True)
+        groups = chunk.groupby(['user', 'StimuliName'], sort=False)
+        session = groups.ngroup().to_numpy()
+        position = groups.cumcount().to_numpy()
+        x = chunk['MappedFixationPointX'].to_numpy(dtype=float)
+        y = chunk['MappedFixationPointY'].to_numpy(dtype=float)
+        previous_x = groups['MappedFixationPointX'].shift().to_numpy(dtype=float)
+        previous_y = groups['MappedFixationPointY'].shift().to_numpy(dtype=float)
+
+        # Continuation of sessions of earlier chunks (sessions are numbered in the order of their first row)
+        first_rows = np.flatnonzero(position == 0)
+        keys = list(zip(chunk['user'].to_numpy()[first_rows], chunk['StimuliName'].to_numpy()[first_rows]))
+        offsets = np.zeros(len(keys), dtype=np.int64)
+        for row in first_rows:
+            index, previous_x[row], previous_y[row] = last.get(keys[session[row]], (0, np.nan, np.nan))
+            offsets[session[row]] = index
+        chunk['FixationIndex'] = offsets[session] + position + 1
+        chunk['SaccadeLength'] = np.hypot(x - previous_x, y - previous_y)
+        for row in groups.tail(1).index:
+            last[keys[session[row]]] = (chunk.at[row, 'FixationIndex'], x[row], y[row])
+
+        chunk = pd.concat([chunk, stimulus_columns(chunk['StimuliName'])], axis=1)
+        yield chunk[fixation_columns].astype(fixation_dtypes)
+
+
+def read_tobii_tsv(path, chunksize=chunk_rows, timestamp_divisor=1, decimal='.'):
+    # Tobii exports have one row per gaze sample; the rows of a fixation repeat its index, duration and point.
+    # Yields one row per fixation (its first sample) in chunks; fixations spanning two chunks are kept once.
+    header = pd.read_csv(path, sep='\t', nrows=0).columns
+    columns = {}
+    for column, alternatives in tobii_columns.items():
+        found = [alternative for alternative in alternatives if alternative in header]
+        if not found:
+            raise ValueError(f'{os.path.basename(path)}: no column for {column} ({", ".join(alternatives)})')
+        columns[found[0]] = column
+    previous = None
+    for chunk in pd.read_csv(path, sep='\t', usecols=list(columns), chunksize=chunksize, decimal=decimal,
+                             dtype={name: 'string' for name, column in columns.items()
+                                    if column in ['user', 'StimuliName', 'EventType']}):
+        chunk = chunk.rename(columns=columns)
+        chunk = chunk[(chunk['EventType'] == 'Fixation') & chunk['TrackerIndex'].notna()]
+        if chunk.empty:
+            continue
+        keys = chunk[['user', 'StimuliName', 'TrackerIndex']]
+        new = (keys != keys.shift()).fillna(True).any(axis=1).to_numpy()
+        new[0] = tuple(keys.iloc[0]) != previous
+        previous = tuple(keys.iloc[-1])
+        fixations = chunk[new]
+        fixations = fixations.assign(Timestamp=fixations['Timestamp'] / timestamp_divisor)
+        yield fixations[['Timestamp', 'user', 'StimuliName', 'FixationDuration',
+                         'MappedFixationPointX', 'MappedFixationPointY']]
+
+
+def read_eyelink_asc(path, user=None, eye=None, chunksize=chunk_rows):
+    # EyeLink ASC: the stimulus is taken from the last message naming an image of the study
+    # (e.g. 'MSG 1021 !V IMGLOAD CENTER images/01_Antwerpen_S1.jpg 960 540') until the end of the recording block;
+    # fixations from 'EFIX <eye> <start> <end> <duration> <x> <y> <pupil>' of one eye (default: the first one).
+    # The user is the file name unless given. Coordinates are screen pixels (image offsets: stimulus_calibration.csv).
+    user = user or os.path.splitext(os.path.basename(path))[0]
+    stimulus = None
+    rows = []
+    with open(path, encoding='utf-8', errors='replace') as file:
+        for line in file:
+            if line.startswith('MSG'):
+                for token in line.split()[2:]:
+                    name = os.path.basename(token.replace('\\', '/'))
+                    if stimulus_name.match(name):
+                        stimulus = name
+                        break
+            elif line.startswith('EFIX') and stimulus:
+                fields = line.split()
+                eye = eye or fields[1]
+                if fields[1] == eye and len(fields) >= 7:
+                    rows.append((float(fields[2]), stimulus, float(fields[4]),
+                                 float(fields[5]) if fields[5] != '.' else np.nan,
+                                 float(fields[6]) if fields[6] != '.' else np.nan))
+                    if len(rows) >= chunksize:
+                        yield eyelink_frame(rows, user)
+                        rows = []
+            elif line.startswith('END'):
+                stimulus = None
+    if rows:
+        yield eyelink_frame(rows, user)
+
+
+def eyelink_frame(rows, user):
+    frame = pd.DataFrame(rows, columns=['Timestamp', 'StimuliName', 'FixationDuration',
+                                        'MappedFixationPointX', 'MappedFixationPointY'])
+    frame.insert(1, 'user', user)
+    return frame
+
+
+def import_tracker_export(path, tracker_format, output_dir, **options):
+    # Export -> partitions, one chunk in memory at a time; returns (sessions, partitions) like ingest.stream_ingest
+    reader = read_tobii_tsv if tracker_format == 'tobii' else read_eyelink_asc
+    return ingest_chunks(sequence_sessions(reader(path, **options)), output_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Streaming import of a Tobii TSV or EyeLink ASC export.')
+    parser.add_argument('export_path')
+    parser.add_argument('--format', choices=tracker_formats, required=True)
+    parser.add_argument('--output', default=None, help='partition directory (default: cache/partitions/<export>)')
+    parser.add_argument('--user', default=None, help='EyeLink: participant (default: file name)')
+    parser.add_argument('--timestamp-divisor', type=float, default=1, help='Tobii: e.g. 1000 for timestamps in µs')
+    args = parser.parse_args()
+    output = args.output or os.path.join(partition_dir, os.path.splitext(os.path.basename(args.export_path))[0])
+    options = {'user': args.user} if args.format == 'eyelink' else {'timestamp_divisor': args.timestamp_divisor}
+    sessions, partitions = import_tracker_export(args.export_path, args.format, output, **options)
+    print(f'{len(sessions)} sessions, {partitions["rows"].sum()} fixations in {len(partitions)} partitions '
+          f'written to {output}')
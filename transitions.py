@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+"""
+-----------------------------------------------------------------------------------------
+AOI-Transitions:
+Transition matrices and gaze-transition entropy, computed in one pass over all sessions
+"""
+
+
+def entropies(matrices):
+    # Stationary entropy H_s and transition entropy H_t (in bits) for a stack of transition count matrices (..., K, K)
+    counts = np.asarray(matrices, dtype=float)
+    outgoing = counts.sum(axis=-1)
+    total = outgoing.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_i = np.where(total > 0, outgoing / total, 0)
+        p_ij = np.where(outgoing[..., None] > 0, counts / outgoing[..., None], 0)
+        log_p_i = np.where(p_i > 0, np.log2(p_i), 0)
+        log_p_ij = np.where(p_ij > 0, np.log2(p_ij), 0)
+    stationary = -(p_i * log_p_i).sum(axis=-1)
+    transition = -(p_i * (p_ij * log_p_ij).sum(axis=-1)).sum(axis=-1)
+    return stationary, transition
+
+
+def compute_transitions(aoi_engine):
+    # Collect the AOI sequences of all stimuli with AOIs and count all transitions with one bincount
+    definitions = aoi_engine.definitions
+    stimuli = [key for key in sorted(definitions) if definitions[key]]
+    n_states = max([len(definitions[key]) for key in stimuli], default=0)
+    session_keys, session_codes, aoi_codes, stimulus_sessions = [], [], [], {}
+
+    for city_map, description in stimuli:
+        codes = aoi_engine.assignment(city_map, description)
+        users = aoi_engine.dataset.stimulus_arrays(city_map, description, ['user'])['user']
+        in_aoi = codes >= 0
+        session_users, session_index = np.unique(users[in_aoi], return_inverse=True)
+        offset = len(session_keys)
+        stimulus_sessions[(city_map, description)] = slice(offset, offset + len(session_users))
+        session_keys.extend((city_map, description, user) for user in session_users)
+        session_codes.append(session_index + offset)
+        aoi_codes.append(codes[in_aoi])
+
+    n_sessions = len(session_keys)
+    if not n_sessions:
+        return {'sessions': pd.DataFrame(columns=['CityMap', 'description', 'user', 'Transitions',
+                                                  'StationaryEntropy', 'TransitionEntropy']),
+                'matrices': {}, 'session_matrices': np.zeros((0, 0, 0)), 'stimulus_sessions': {}}
+
+    sessions = np.concatenate(session_codes)
+    codes = np.concatenate(aoi_codes)
+
+    # Shifted arrays: a transition is a pair of consecutive in-AOI fixations of the same session
+    same_session = sessions[1:] == sessions[:-1]
+    pairs = (sessions[:-1][same_session] * n_states + codes[:-1][same_session]) * n_states + codes[1:][same_session]
+    session_matrices = np.bincount(pairs, minlength=n_sessions * n_states * n_states) \
+        .reshape(n_sessions, n_states, n_states)
+
+    stationary, transition = entropies(session_matrices)
+    session_table = pd.DataFrame(session_keys, columns=['CityMap', 'description', 'user'])
+    session_table['Transitions'] = session_matrices.sum(axis=(1, 2))
+    session_table['StationaryEntropy'] = stationary
+    session_table['TransitionEntropy'] = transition
+
+    # Aggregation per (CityMap, description), trimmed to the AOIs of the stimulus
+    matrices = {}
+    for key, sessions_slice in stimulus_sessions.items():
+        k = len(definitions[key])
+        matrices[key] = session_matrices[sessions_slice, :k, :k].sum(axis=0)
+
+    return {'sessions': session_table, 'matrices': matrices,
+            'session_matrices': session_matrices, 'stimulus_sessions': stimulus_sessions}
+
+
+class TransitionStore:
+    # Caches the batch result until the AOI definitions change
+    def __init__(self, aoi_engine):
+        self.aoi_engine = aoi_engine
+        self._version = None
+        self._result = None
+
+    def result(self):
+        if self._result is None or self._version != self.aoi_engine.version:
+            self._result = compute_transitions(self.aoi_engine)
+            self._version = self.aoi_engine.version
+        return self._result
+
+    def matrix(self, city_map, description):
+        return self.result()['matrices'].get((city_map, description))
+
+    def summary(self, city_map, description):
+        # Entropies of the aggregated matrix plus the mean over the single sessions
+        matrix = self.matrix(city_map, description)
+        if matrix is None:
+            return None
+        sessions = self.result()['sessions']
+        sessions = sessions[(sessions['CityMap'] == city_map) & (sessions['description'] == description)]
+        stationary, transition = entropies(matrix)
+        return {'StationaryEntropy': float(stationary), 'TransitionEntropy': float(transition),
+                'MeanSessionStationaryEntropy': sessions['StationaryEntropy'].mean(),
+                'MeanSessionTransitionEntropy': sessions['TransitionEntropy'].mean(),
+                'Sessions': len(sessions)}
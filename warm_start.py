@@ -0,0 +1,67 @@
+import glob
+import hashlib
+import os
+import pickle
+
+"""
+-----------------------------------------------------------------------------------------
+Warm-Start:
+Prepared dataset (enriched df, session table, KPI store, partition index, density grids, image registry)
+stored in one versioned file and restored at startup while sources and code are unchanged
+"""
+warm_start_dir = 'cache/warm_start'
+# Bump when the layout of the warm-start file changes:
+warm_start_format = 1
+# Code that prepares the data; a change of any of these files invalidates existing warm-start files:
+preparation_modules = ['dataset.py', 'ingest.py', 'quality.py', 'stimulus_registry.py', 'warm_start.py']
+
+
+def app_version():
+    digest = hashlib.sha1(f'{warm_start_format}'.encode())
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in preparation_modules:
+        with open(os.path.join(base_dir, name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def source_hash(paths, image_dir):
+    # Content hash of the source files (missing files count as empty) and size/mtime of the stimulus images
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(path.encode())
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    digest.update(block)
+    for image_path in sorted(glob.glob(os.path.join(image_dir, '*.jpg'))):
+        stat = os.stat(image_path)
+        digest.update(f'{os.path.basename(image_path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()
+
+
+def save_warm_start(dataset, path, data_hash):
+    # Header and dataset are pickled one after the other, so a stale file is rejected without loading the data.
+    # Written to a temporary file first: other workers never read a half-written file.
+    header = {'format': warm_start_format, 'app_version': app_version(), 'source_hash': data_hash}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(dataset, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+def load_warm_start(path, data_hash):
+    # Returns the stored dataset, or None if there is no valid file for these sources and this code.
+    # Only files written by save_warm_start into the cache directory of the app are loaded (pickle).
+    if not os.path.exists(path):
+        return None
+    expected = {'format': warm_start_format, 'app_version': app_version(), 'source_hash': data_hash}
+    try:
+        with open(path, 'rb') as file:
+            if pickle.load(file) != expected:
+                return None
+            return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):  # damaged or foreign file
+        return None